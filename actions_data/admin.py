@@ -59,6 +59,7 @@ class WebhookEventAdmin(DjangoQLSearchMixin, admin.ModelAdmin):
     search_fields = ("event", "delivery")
     readonly_fields = (
         "payload",
+        "full_payload",
         "delivery",
         "event",
         "hook_id",
@@ -67,6 +68,7 @@ class WebhookEventAdmin(DjangoQLSearchMixin, admin.ModelAdmin):
         "enterprise_version",
         "enterprise_host",
         "created_at",
+        "projection_version",
     )
 
 
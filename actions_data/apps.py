@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 
-from actions_insider.middleware import check_field_limits
+from actions_insider.middleware import check_field_limits, compile_validation_plans
 
 
 class ActionsDataConfig(AppConfig):
@@ -12,6 +12,34 @@ class ActionsDataConfig(AppConfig):
         import sys
 
         if "migrate" not in sys.argv and "makemigrations" not in sys.argv:
-            from django.db.models.signals import pre_save
+            from django.apps import apps
+            from django.db.models.signals import (
+                m2m_changed,
+                post_delete,
+                post_migrate,
+                post_save,
+                pre_save,
+            )
 
+            from actions_data.models import (
+                Installation,
+                OwnerEntity,
+                PullRequest,
+                Repository,
+                Workflow,
+            )
+            from actions_data.models.installation import invalidate_installation_cache
+            from actions_data.models.reference_cache import invalidate_reference_cache
+
+            compile_validation_plans(apps.get_models())
             pre_save.connect(check_field_limits)
+            post_save.connect(invalidate_installation_cache, sender=Installation)
+            post_delete.connect(invalidate_installation_cache, sender=Installation)
+            m2m_changed.connect(
+                invalidate_installation_cache, sender=Installation.users.through
+            )
+            # Flushing the tables, as test cases do, deletes without any signal
+            post_migrate.connect(invalidate_installation_cache, sender=self)
+            for model in (OwnerEntity, Repository, PullRequest, Workflow):
+                post_save.connect(invalidate_reference_cache, sender=model)
+                post_delete.connect(invalidate_reference_cache, sender=model)
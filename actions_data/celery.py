@@ -1,8 +1,11 @@
 import os
 
+import click
 from celery import Celery
 from celery.schedules import crontab
-from celery.signals import beat_init
+from celery.signals import beat_init, celeryd_init, task_postrun
+from django.conf import settings
+from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "actions_insider.settings")
@@ -18,6 +21,56 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Webhook events are processed on their own queue, or on the webhooks.N queues of
+# their repository with WEBHOOK_QUEUES (see actions_data.operations.webhook_routing),
+# so that they never wait behind the long demo and GitHub API tasks.
+DEFAULT_QUEUE = "celery"
+WEBHOOK_QUEUE = "webhooks"
+DEMO_QUEUE = "demo"
+
+# Workers started without -Q consume all of them
+app.conf.task_queues = [Queue(DEFAULT_QUEUE), Queue(WEBHOOK_QUEUE), Queue(DEMO_QUEUE)]
+app.conf.task_routes = {
+    "actions_data.tasks.process_webhook_event": {"queue": WEBHOOK_QUEUE},
+    "actions_data.tasks.process_webhook_events": {"queue": WEBHOOK_QUEUE},
+    "actions_data.tasks.drain_webhook_overflow": {"queue": WEBHOOK_QUEUE},
+    "actions_data.tasks.flush_repository_heartbeats": {"queue": WEBHOOK_QUEUE},
+    "actions_data.tasks.process_organization_data": {"queue": DEMO_QUEUE},
+    "actions_data.tasks.push_demo_data_to_webhook_events": {"queue": DEMO_QUEUE},
+    "actions_data.tasks.link_demo_repos": {"queue": DEMO_QUEUE},
+}
+
+# Worker settings by profile, picked with `celery -A actions_data worker --profile`.
+# Options given on the command line take precedence.
+WORKER_PROFILES = {
+    # Many small tasks: children are never recycled, so that they keep their
+    # imports and database connections from one event to the next
+    "webhooks": {
+        "queues": [WEBHOOK_QUEUE],
+        "worker_concurrency": settings.WEBHOOK_WORKER_CONCURRENCY,
+        "worker_max_tasks_per_child": None,
+        "worker_max_memory_per_child": None,
+        "reuse_database_connections": True,
+    },
+    # Few tasks holding whole organizations in memory: children are recycled
+    # every few tasks, and as soon as they grow too large
+    "demo": {
+        "queues": [DEMO_QUEUE, DEFAULT_QUEUE],
+        "worker_concurrency": settings.DEMO_WORKER_CONCURRENCY,
+        "worker_max_tasks_per_child": settings.CELERY_WORKER_MAX_TASKS_PER_CHILD,
+        "worker_max_memory_per_child": settings.CELERY_WORKER_MAX_MEMORY_PER_CHILD,
+        "worker_prefetch_multiplier": 1,
+    },
+}
+
+app.user_options["worker"].add(
+    click.Option(
+        ["--profile"],
+        type=click.Choice(list(WORKER_PROFILES)),
+        help="Settings and queues of the worker, see WORKER_PROFILES",
+    )
+)
+
 app.conf.beat_schedule = {
     "push-demo-data-every-hour": {
         "task": "actions_data.tasks.push_demo_data_to_webhook_events",
@@ -28,9 +81,49 @@ app.conf.beat_schedule = {
         "task": "actions_data.tasks.link_demo_repos",
         "schedule": crontab(minute="17"),
     },
+    "drain-webhook-overflow-every-minute": {
+        "task": "actions_data.tasks.drain_webhook_overflow",
+        "schedule": crontab(),
+    },
+    "flush-repository-heartbeats-every-minute": {
+        "task": "actions_data.tasks.flush_repository_heartbeats",
+        "schedule": crontab(),
+    },
+    "maintain-webhook-partitions-every-day": {
+        "task": "actions_data.tasks.maintain_webhook_partitions",
+        "schedule": crontab(minute="5", hour="3"),
+    },
 }
 
 
 @beat_init.connect
 def beat_init_handler(**kwargs):
     app.send_task("actions_data.tasks.push_demo_data_to_webhook_events", args=(65,))
+
+
+@celeryd_init.connect
+def apply_worker_profile(instance=None, conf=None, options=None, **kwargs):
+    profile = WORKER_PROFILES.get(options.get("profile"))
+    if profile is None:
+        return
+    for key, value in profile.items():
+        if key.startswith("worker_"):
+            conf[key] = value
+    if not options.get("queues"):
+        instance.app.amqp.queues.select(profile["queues"])
+    if profile.get("reuse_database_connections"):
+        from django.db import connections
+
+        # Connections are checked before each task instead of being closed after
+        # CONN_MAX_AGE, when a child processes events for longer than that
+        for connection in connections.all():
+            connection.settings_dict["CONN_HEALTH_CHECKS"] = True
+
+
+@task_postrun.connect
+def task_postrun_handler(**kwargs):
+    # Worker children may be recycled after any task, add their observations to
+    # the shared metrics before that happens
+    from actions_data.metrics import flush_metrics
+
+    flush_metrics()
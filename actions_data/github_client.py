@@ -65,6 +65,7 @@ class GitHubClient(Generic[T]):
 class UserRepo:
     repo: Repository
     installation: Installation
+    last_webhook_received: datetime | None = None
 
 
 @dataclass
@@ -0,0 +1,85 @@
+import copy
+import time
+
+from django.apps import apps
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from actions_insider.middleware.field_validator import (
+    debug_field_limits,
+    get_validation_plan,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time the pre_save field limit check adds to each save, with the "
+        "compiled validation plan of each model and with the reflection of "
+        "debug_field_limits() it replaces, which also loads the related objects. "
+        "Stored rows are checked, copied for each round so that nothing they load "
+        "stays cached."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--models",
+            nargs="+",
+            default=[
+                "actions_data.Job",
+                "actions_data.JobStats",
+                "actions_data.WorkflowRun",
+            ],
+            help="Labels of the models to check",
+        )
+        parser.add_argument(
+            "--instances",
+            type=int,
+            default=100,
+            help="Number of stored rows to check, per model",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=20,
+            help="Number of times every row is checked, per implementation",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'model':<28}{'implementation':<16}{'us/save':>10}{'queries/save':>14}"
+        )
+        for label in options["models"]:
+            try:
+                model = apps.get_model(label)
+            except LookupError as e:
+                raise CommandError(e)
+            instances = list(model._base_manager.all()[: options["instances"]])
+            if not instances:
+                self.stdout.write(f"{label:<28}no rows to check")
+                continue
+            plan = get_validation_plan(model)
+            for name, check in [
+                ("reflection", debug_field_limits),
+                ("plan", plan.problems),
+            ]:
+                elapsed, queries = self._measure(check, instances, options["rounds"])
+                saves = len(instances) * options["rounds"]
+                self.stdout.write(
+                    f"{label:<28}{name:<16}{elapsed / saves * 1e6:>10.2f}"
+                    f"{queries / saves:>14.2f}"
+                )
+
+    @staticmethod
+    def _measure(check, instances: list, rounds: int) -> tuple[float, int]:
+        elapsed = 0
+        queries = 0
+        for _ in range(rounds):
+            copies = [copy.copy(instance) for instance in instances]
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                for instance in copies:
+                    check(instance)
+                elapsed += time.perf_counter() - start
+            queries += len(context)
+        return elapsed, queries
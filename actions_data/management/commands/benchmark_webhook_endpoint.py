@@ -0,0 +1,85 @@
+import json
+import statistics
+import time
+from unittest.mock import patch
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from actions_data.models.webhook_event import (
+    JSON_STORAGE,
+    RAW_STORAGE,
+    COMPRESSED_STORAGE,
+)
+from actions_data.views import WebhookView
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of the webhook endpoint for each "
+        "WEBHOOK_PAYLOAD_STORAGE mode. Nothing is written or published."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=500,
+            help="Number of deliveries to post per storage mode",
+        )
+        parser.add_argument(
+            "--payload",
+            default="tests/resources/sample_job_webhook_payload.json",
+            help="Path to the webhook payload to post",
+        )
+        parser.add_argument(
+            "--headers",
+            default="tests/resources/sample_webhook_headers.json",
+            help="Path to the webhook headers to post",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["payload"], "rb") as f:
+            body = f.read()
+        with open(options["headers"]) as f:
+            headers = json.load(f)
+
+        self.stdout.write(
+            f"{'storage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}"
+        )
+        for storage in (JSON_STORAGE, RAW_STORAGE, COMPRESSED_STORAGE):
+            timings = self._measure(storage, body, headers, options["iterations"])
+            quantiles = statistics.quantiles(timings, n=100)
+            self.stdout.write(
+                f"{storage:<12}{quantiles[49]:>10.2f}{quantiles[94]:>10.2f}"
+                f"{quantiles[98]:>10.2f}{statistics.mean(timings):>10.2f}"
+            )
+
+    @staticmethod
+    def _measure(storage: str, body: bytes, headers: dict, iterations: int):
+        factory = RequestFactory()
+        view = WebhookView.as_view()
+        timings = []
+        with (
+            override_settings(
+                WEBHOOK_INGESTION_MODE="direct", WEBHOOK_PAYLOAD_STORAGE=storage
+            ),
+            patch("actions_data.operations.webhook_ingestion.process_webhook_event"),
+            transaction.atomic(),
+        ):
+            for i in range(iterations):
+                request_headers = headers | {
+                    "X-GitHub-Delivery": f"benchmark-{storage}-{i}"
+                }
+                request = factory.post(
+                    "/webhook",
+                    data=body,
+                    content_type="application/json",
+                    headers=request_headers,
+                )
+                start = time.perf_counter()
+                view(request)
+                timings.append((time.perf_counter() - start) * 1000)
+            transaction.set_rollback(True)
+        return timings
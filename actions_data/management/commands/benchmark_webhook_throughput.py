@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import json
+import statistics
+import time
+import uuid
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+from actions_data.models import Installation, WebhookDelivery, WebhookEvent
+from actions_data.models.webhook_event import close_webhook_writer_connections
+from actions_data.views import AsyncWebhookView, WebhookView
+
+
+class SyncWebhookUrls:
+    urlpatterns = [path("webhook", WebhookView.as_view())]
+
+
+class AsyncWebhookUrls:
+    urlpatterns = [path("webhook", AsyncWebhookView.as_view())]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the sync and the async webhook views, reporting the sustained "
+        "deliveries per second of a single worker: a sync worker handles one "
+        "delivery at a time, an async worker handles --concurrency deliveries "
+        "concurrently. Deliveries go through the whole middleware stack and are "
+        "written to the database, then deleted at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Seconds to post deliveries for, per view",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Number of concurrent deliveries for the async view",
+        )
+        parser.add_argument(
+            "--publish-latency-ms",
+            type=float,
+            default=1,
+            help="Time taken by the mocked Celery publish, to simulate the broker",
+        )
+        parser.add_argument(
+            "--db-latency-ms",
+            type=float,
+            default=1,
+            help="Time added to every database query, to simulate the network",
+        )
+        parser.add_argument(
+            "--payload",
+            default="tests/resources/sample_job_webhook_payload.json",
+            help="Path to the webhook payload to post",
+        )
+        parser.add_argument(
+            "--headers",
+            default="tests/resources/sample_webhook_headers.json",
+            help="Path to the webhook headers to post",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["payload"], "rb") as f:
+            self.body = f.read()
+        with open(options["headers"]) as f:
+            self.headers = json.load(f)
+        self.prefix = f"load-{uuid.uuid4()}-"
+        self.deliveries = itertools.count()
+        publish_latency = options["publish_latency_ms"] / 1000
+        task = MagicMock()
+        task.apply_async.side_effect = lambda *args, **kwargs: time.sleep(
+            publish_latency
+        )
+
+        self.stdout.write(
+            f"{'view':<8}{'deliveries/s':>14}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        last_installation = Installation.objects.order_by("id").last()
+        db_latency = options["db_latency_ms"] / 1000
+
+        def delay_query(execute, *args):
+            time.sleep(db_latency)
+            return execute(*args)
+
+        def add_query_delay(connection, **kwargs):
+            connection.execute_wrappers.append(delay_query)
+
+        # Connections of the async view's threads are opened during the run
+        connection_created.connect(add_query_delay)
+        connection.execute_wrappers.append(delay_query)
+        try:
+            with (
+                override_settings(
+                    WEBHOOK_INGESTION_MODE="direct", ALLOWED_HOSTS=["testserver"]
+                ),
+                patch(
+                    "actions_data.operations.webhook_ingestion.process_webhook_event",
+                    task,
+                ),
+            ):
+                with override_settings(ROOT_URLCONF=SyncWebhookUrls):
+                    timings, elapsed = self._run_sync(options["duration"])
+                    self._report("sync", timings, elapsed)
+                with override_settings(ROOT_URLCONF=AsyncWebhookUrls):
+                    timings, elapsed = async_to_sync(self._run_async)(
+                        options["duration"], options["concurrency"]
+                    )
+                    self._report("async", timings, elapsed)
+        finally:
+            connection_created.disconnect(add_query_delay)
+            connection.execute_wrappers.remove(delay_query)
+            close_webhook_writer_connections()
+            # The async view writes from other threads, so nothing can be rolled back
+            WebhookEvent.objects.filter(delivery__startswith=self.prefix).delete()
+            WebhookDelivery.objects.filter(delivery__startswith=self.prefix).delete()
+            Installation.objects.filter(
+                id__gt=last_installation.id if last_installation else 0,
+                is_artificial=True,
+            ).delete()
+
+    def _request_headers(self) -> dict:
+        return self.headers | {
+            "X-GitHub-Delivery": f"{self.prefix}{next(self.deliveries)}"
+        }
+
+    def _run_sync(self, duration: float):
+        client = Client()
+        timings = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            request_start = time.perf_counter()
+            response = client.post(
+                "/webhook",
+                data=self.body,
+                content_type="application/json",
+                headers=self._request_headers(),
+            )
+            self._check(response)
+            timings.append((time.perf_counter() - request_start) * 1000)
+        return timings, time.perf_counter() - start
+
+    async def _run_async(self, duration: float, concurrency: int):
+        client = AsyncClient()
+        timings = []
+        start = time.perf_counter()
+
+        async def deliver():
+            while time.perf_counter() - start < duration:
+                request_start = time.perf_counter()
+                response = await client.post(
+                    "/webhook",
+                    data=self.body,
+                    content_type="application/json",
+                    headers=self._request_headers(),
+                )
+                self._check(response)
+                timings.append((time.perf_counter() - request_start) * 1000)
+
+        await asyncio.gather(*(deliver() for _ in range(concurrency)))
+        return timings, time.perf_counter() - start
+
+    @staticmethod
+    def _check(response):
+        if response.status_code != 200:
+            raise CommandError(f"The webhook answered {response.status_code}")
+
+    def _report(self, view: str, timings: list[float], elapsed: float):
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"{view:<8}{len(timings) / elapsed:>14.1f}"
+            f"{quantiles[49]:>10.2f}{quantiles[98]:>10.2f}"
+        )
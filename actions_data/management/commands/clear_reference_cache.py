@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from actions_data.models.reference_cache import REFERENCE_CACHE
+
+
+class Command(BaseCommand):
+    help = (
+        "Clear the reference entities cached by every process, after changing "
+        "owners, repositories, pull requests or workflows without saving them "
+        "one by one, e.g. with QuerySet.update() or raw SQL"
+    )
+
+    def handle(self, *args, **options):
+        REFERENCE_CACHE.invalidate()
+        self.stdout.write("Reference cache cleared")
@@ -0,0 +1,62 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from actions_data.operations.webhook_buffer import (
+    get_overflow_buffer,
+    get_webhook_buffer,
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest wait, in seconds, before flushing again after consecutive failures
+MAX_FAILURE_BACKOFF = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered webhook deliveries to the database every "
+        "WEBHOOK_BUFFER_FLUSH_SIZE events or WEBHOOK_BUFFER_FLUSH_INTERVAL_MS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the buffer once and exit",
+        )
+        parser.add_argument(
+            "--overflow",
+            action="store_true",
+            help="Flush the overflow buffer of deliveries over the rate limit instead",
+        )
+
+    def handle(self, *args, **options):
+        buffer = get_overflow_buffer() if options["overflow"] else get_webhook_buffer()
+        if options["once"]:
+            flushed = buffer.drain()
+            self.stdout.write(f"Flushed {flushed} buffered webhook events.")
+            return
+
+        # Poll often enough to notice a full buffer well before the interval ends
+        poll_interval = buffer.flush_interval / 10
+        last_flush = time.monotonic()
+        failures = 0
+        while True:
+            try:
+                if buffer.length() >= buffer.flush_size:
+                    buffer.flush()
+                elif time.monotonic() - last_flush >= buffer.flush_interval:
+                    buffer.drain()
+                    last_flush = time.monotonic()
+                else:
+                    time.sleep(poll_interval)
+                failures = 0
+            except Exception as e:
+                # Failed batches are requeued, they are flushed again once the
+                # database or Redis is back
+                failures += 1
+                backoff = min(buffer.flush_interval * 2**failures, MAX_FAILURE_BACKOFF)
+                logger.exception(f"Flush failed, retrying in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
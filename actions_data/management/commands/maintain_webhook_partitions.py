@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from actions_data.operations.webhook_partitions import (
+    create_partition,
+    dangling_references,
+    drop_partition,
+    expired_partitions,
+    missing_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the upcoming monthly partitions of the webhook events table and "
+        "drop the processed partitions older than the retention period"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.WEBHOOK_EVENT_PARTITIONS_AHEAD,
+            help="Number of months to create partitions for after the current one",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.WEBHOOK_EVENT_RETENTION_DAYS,
+            help="Drop partitions whose events are all older than this",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the partitions that would be created and dropped",
+        )
+        parser.add_argument(
+            "--check-references",
+            action="store_true",
+            help="Count the links to webhook events that no longer exist",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        verb = "Would create" if dry_run else "Created"
+        for partition in missing_partitions(options["months_ahead"]):
+            if not dry_run:
+                create_partition(partition)
+            self.stdout.write(f"{verb} partition {partition.name}")
+
+        verb = "Would drop" if dry_run else "Dropped"
+        for partition in expired_partitions(options["retention_days"]):
+            if not dry_run:
+                drop_partition(partition)
+            self.stdout.write(f"{verb} partition {partition.name}")
+
+        if options["check_references"]:
+            for table, count in dangling_references().items():
+                if count:
+                    self.stderr.write(f"{count} rows of {table} reference no event")
+                else:
+                    self.stdout.write(f"All rows of {table} reference an event")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from actions_data.models import Job, Step
+
+
+class Command(BaseCommand):
+    help = "Populates the Step table from the steps of the completed jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of jobs whose steps are written in each batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        jobs = Job.objects.filter(status="completed", steps__isnull=False).only(
+            "id", "status", "steps"
+        )
+        total_jobs = jobs.count()
+        self.stdout.write(f"Writing the steps of {total_jobs:,} jobs...")
+        start_time = now()
+
+        last_id = 0
+        processed = 0
+        written = 0
+        while True:
+            batch = list(jobs.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                written += len(Step.objects.save_for_jobs(batch))
+            last_id = batch[-1].id
+            processed += len(batch)
+            self.stdout.write(
+                f"Processed {processed:,} of {total_jobs:,} jobs in {now() - start_time}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully wrote {written:,} steps of {processed:,} jobs"
+            )
+        )
@@ -1,10 +1,49 @@
-from django.core.management import BaseCommand
+import multiprocessing
+import time
+from datetime import timedelta
+from multiprocessing.connection import wait
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
 
 from actions_data.models import WebhookEvent
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_backlog import drain_backlog_batch
 from actions_data.operations.webhook_processor import process_webhook_event_instance
+from actions_data.operations.webhook_retry import record_failed_attempts
+
+
+def drain_backlog(batch_size: int, limit: int, claimed, processed, failed):
+    """
+    Worker process of the --workers mode, claiming batches until the backlog or the
+    limit shared with the other workers is exhausted.
+    """
+    after_id = 0
+    while True:
+        with claimed.get_lock():
+            size = min(batch_size, limit - claimed.value)
+            claimed.value += max(size, 0)
+        if size <= 0:
+            break
+        results = drain_backlog_batch(size, after_id)
+        with claimed.get_lock():
+            claimed.value -= size - len(results)
+        if not results:
+            break
+        with processed.get_lock():
+            processed.value += len(results)
+        with failed.get_lock():
+            failed.value += list(results.values()).count(OperationResult.FAILURE)
+        after_id = max(results)
+    connections.close_all()
 
 
 class Command(BaseCommand):
+    help = (
+        "Process the webhook events left unprocessed, one by one, or with --workers "
+        "in parallel processes that claim batches of events with SELECT ... FOR "
+        "UPDATE SKIP LOCKED, which is safe while Celery workers are running."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,19 +52,99 @@ class Command(BaseCommand):
             default=10000,
             help="Max number of webhook events to process",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of processes draining the backlog in parallel",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of events claimed at once by each worker",
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=10,
+            help="Seconds between progress reports of the workers",
+        )
 
     def handle(self, *args, **options):
         limit = options["limit"]
-        # Get all unprocessed webhook events respecting the limit
-        unprocessed_webhook_events = WebhookEvent.objects.filter(processed_at=None)[
-            :limit
-        ]
+        if options["workers"]:
+            self.drain_in_parallel(
+                options["workers"],
+                options["batch_size"],
+                limit,
+                options["report_interval"],
+            )
+            return
+        # Get all unprocessed webhook events due for an attempt, respecting the limit
+        unprocessed_webhook_events = WebhookEvent.objects.due_for_processing()[:limit]
         if len(unprocessed_webhook_events) == 0:
             self.stdout.write("No unprocessed webhook events found.")
         for event in unprocessed_webhook_events:
             try:
-                process_webhook_event_instance(event)
+                result = process_webhook_event_instance(event)
             except Exception as e:
                 self.stdout.write(
                     f"Failed to process webhook event: {event}. Error: {e}"
                 )
+                event.last_error = repr(e)
+                result = OperationResult.FAILURE
+            if result == OperationResult.FAILURE:
+                record_failed_attempts([event])
+
+    def drain_in_parallel(
+        self, workers: int, batch_size: int, limit: int, report_interval: float
+    ):
+        total = min(limit, WebhookEvent.objects.due_for_processing().count())
+        if total == 0:
+            self.stdout.write("No unprocessed webhook events found.")
+            return
+        context = multiprocessing.get_context("fork")
+        claimed, processed, failed = (context.Value("q", 0) for _ in range(3))
+        start = time.monotonic()
+        if multiprocessing.current_process().daemon:
+            # Daemonic processes, like the workers of `manage.py test --parallel`,
+            # aren't allowed to have children
+            self.stdout.write(
+                "Running in a daemonic process, draining the backlog in this process."
+            )
+            drain_backlog(batch_size, limit, claimed, processed, failed)
+            self.report(processed.value, failed.value, total, start)
+            return
+        # Workers are forked, and must not share the connections of this process
+        connections.close_all()
+        processes = [
+            context.Process(
+                target=drain_backlog,
+                args=(batch_size, limit, claimed, processed, failed),
+                name=f"backlog-drainer-{i}",
+            )
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        running = list(processes)
+        while running:
+            wait([process.sentinel for process in running], timeout=report_interval)
+            running = [process for process in running if process.is_alive()]
+            self.report(processed.value, failed.value, total, start)
+        crashed = [process.name for process in processes if process.exitcode != 0]
+        if crashed:
+            raise CommandError(f"Backlog workers exited with an error: {crashed}")
+
+    def report(self, processed: int, failed: int, total: int, start: float):
+        rate = processed / max(time.monotonic() - start, 1e-9)
+        if processed >= total:
+            eta = "done"
+        elif rate:
+            eta = str(timedelta(seconds=round((total - processed) / rate)))
+        else:
+            eta = "unknown"
+        self.stdout.write(
+            f"{processed}/{total} events processed, {failed} failed, "
+            f"{rate:.1f} events/s, ETA {eta}"
+        )
@@ -0,0 +1,43 @@
+from django.core.management import BaseCommand
+
+from actions_data.operations.webhook_replay import WebhookEventReplay
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the runs, jobs, job stats and their labels from the stored webhook "
+        "events, into shadow tables that replace the live ones at the end. Events are "
+        "streamed in id order and transformed in parallel with --workers. The live "
+        "tables are only locked for the swap, while the events received in the "
+        "meantime are replayed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of processes transforming the events",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of events, or jobs, transformed at once by each worker",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Build the shadow tables and compare their rows, then drop them",
+        )
+
+    def handle(self, *args, **options):
+        replay = WebhookEventReplay(
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            log=self.stdout.write,
+        )
+        counts = replay.run(dry_run=options["dry_run"])
+        for table, (live, shadow) in counts.items():
+            self.stdout.write(f"{table:<32}{live:>12} live rows{shadow:>12} replayed")
+        if options["dry_run"]:
+            self.stdout.write("Dry run, the live tables were left as they are.")
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from actions_data.metrics import (
+    REFERENCE_CACHE_LOOKUPS,
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_DUPLICATE_DELIVERIES,
+    WEBHOOK_EVENTS_DEAD_LETTERED,
+    WEBHOOK_RATE_LIMITED,
+)
+
+
+class Command(BaseCommand):
+    help = "Print the webhook ingress counters"
+
+    def handle(self, *args, **options):
+        for counter in (
+            WEBHOOK_DELIVERIES,
+            WEBHOOK_DUPLICATE_DELIVERIES,
+            WEBHOOK_RATE_LIMITED,
+            WEBHOOK_EVENTS_DEAD_LETTERED,
+            REFERENCE_CACHE_LOOKUPS,
+        ):
+            self.stdout.write(f"{counter.name}: {counter.description}")
+            samples = counter.samples()
+            if not samples:
+                self.stdout.write("  no samples")
+            for labels, value in sorted(samples.items()):
+                label_text = ", ".join(
+                    f"{name}={label}"
+                    for name, label in zip(counter.label_names, labels)
+                )
+                self.stdout.write(f"  {label_text}: {value}")
@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db.models import Count, Max
+
+from actions_data.models import WebhookEvent
+from actions_data.operations.webhook_retry import replay_dead_letters
+from actions_data.operations.webhook_routing import event_webhook_queue
+from actions_data.tasks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = (
+        "List the webhook events that failed every processing attempt, grouped by "
+        "event type and last error, or replay them with --replay: their attempts "
+        "are reset and they are published again in batches, to the queue of their "
+        "repository."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            choices=["workflow_run", "workflow_job"],
+            help="Only the events of this type",
+        )
+        parser.add_argument(
+            "--error",
+            help="Only the events whose last error contains this text",
+        )
+        parser.add_argument(
+            "--ids",
+            type=int,
+            nargs="+",
+            help="Only the events with these ids",
+        )
+        parser.add_argument(
+            "--replay",
+            action="store_true",
+            help="Publish the events to be processed again",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of events published per task when replaying",
+        )
+
+    def handle(self, *args, **options):
+        events = WebhookEvent.objects.filter(dead_lettered_at__isnull=False)
+        if options["event"]:
+            events = events.filter(event=options["event"])
+        if options["error"]:
+            events = events.filter(last_error__contains=options["error"])
+        if options["ids"]:
+            events = events.filter(id__in=options["ids"])
+
+        if not options["replay"]:
+            groups = (
+                events.values("event", "last_error")
+                .annotate(count=Count("id"), last=Max("dead_lettered_at"))
+                .order_by("-count")
+            )
+            if not groups:
+                self.stdout.write("No dead-lettered webhook events found.")
+            for group in groups:
+                self.stdout.write(
+                    f"{group['count']:>8} {group['event']:<14} "
+                    f"last {group['last']:%Y-%m-%d %H:%M}  {group['last_error']}"
+                )
+            return
+
+        event_ids = replay_dead_letters(events)
+        batches = defaultdict(list)
+        for event in WebhookEvent.objects.filter(id__in=event_ids).order_by("id"):
+            batches[event_webhook_queue(event)].append(event.id)
+        batch_size = options["batch_size"]
+        for queue, queue_ids in batches.items():
+            for start in range(0, len(queue_ids), batch_size):
+                process_webhook_events.apply_async(
+                    (queue_ids[start : start + batch_size],), queue=queue
+                )
+        self.stdout.write(f"Replaying {len(event_ids)} dead-lettered webhook events.")
@@ -0,0 +1,392 @@
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Callable
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+from actions_data.models import WebhookEvent
+from actions_data.models.reference_cache import REFERENCE_CACHE
+
+METRICS_KEY_PREFIX = "metrics"
+
+# Upper bounds, in seconds, of the histogram buckets
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+@lru_cache
+def get_redis_connection() -> redis.Redis:
+    """Connection to the Redis server of the default cache."""
+    return redis.from_url(
+        settings.CACHES[DEFAULT_CACHE_ALIAS]["LOCATION"], ssl_cert_reqs=None
+    )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(":", "\\:")
+
+
+class Counter:
+    """
+    Monotonic counter shared by every web and worker process through the default
+    cache. Each combination of labels is stored under its own key, and listed in a
+    Redis set that every process adds to atomically. With a Redis cache, both are
+    written with a single pipeline.
+
+    Increments are accumulated in the process and only added to the cache by
+    flush(), which runs at most every METRICS_FLUSH_INTERVAL seconds and after
+    every Celery task, so that counting doesn't cost a cache round trip.
+    """
+
+    # Serializes the index updates of the caches that aren't shared between
+    # processes, like the local memory cache of the tests
+    _index_lock = threading.Lock()
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def _index_key(self) -> str:
+        return f"{METRICS_KEY_PREFIX}:{self.name}:label_set"
+
+    def _key(self, labels: tuple) -> str:
+        # Escaped so that label values containing ":" don't collide
+        return ":".join([METRICS_KEY_PREFIX, self.name, *map(_escape, labels)])
+
+    def _labels(self, labels: dict) -> tuple:
+        values = (labels.get(name) for name in self.label_names)
+        return tuple("" if value is None else str(value) for value in values)
+
+    def _redis_cache(self) -> RedisCache | None:
+        backend = caches[DEFAULT_CACHE_ALIAS]
+        return backend if isinstance(backend, RedisCache) else None
+
+    def _write(self, increments: dict[tuple, int]):
+        """Adds the increments, by labels, to the cache."""
+        backend = self._redis_cache()
+        if backend is not None:
+            index_key = backend.make_and_validate_key(self._index_key)
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            for labels, amount in increments.items():
+                pipeline.incrby(
+                    backend.make_and_validate_key(self._key(labels)), amount
+                )
+                pipeline.sadd(index_key, json.dumps(labels))
+            pipeline.execute()
+            return
+        for labels, amount in increments.items():
+            key = self._key(labels)
+            if not cache.add(key, amount, timeout=None):
+                cache.incr(key, amount)
+                continue
+            # First sample for these labels, keep track of it so it can be listed
+            with self._index_lock:
+                index = cache.get(self._index_key, set())
+                cache.set(self._index_key, index | {labels}, timeout=None)
+
+    def _add(self, amount: int, labels: dict):
+        labels = self._labels(labels)
+        with self._lock:
+            self._pending[labels] = self._pending.get(labels, 0) + amount
+
+    def _flush_due(self) -> bool:
+        return time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def inc(self, amount: int = 1, **labels):
+        self._add(amount, labels)
+        if self._flush_due():
+            self.flush()
+
+    async def ainc(self, amount: int = 1, **labels):
+        """inc for async views, flushing in a thread instead of the event loop."""
+        self._add(amount, labels)
+        if self._flush_due():
+            await sync_to_async(self.flush, thread_sensitive=False)()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if pending:
+            self._write(pending)
+
+    def value(self, **labels) -> int:
+        return cache.get(self._key(self._labels(labels)), 0)
+
+    def _index(self) -> list[tuple]:
+        backend = self._redis_cache()
+        if backend is None:
+            return list(cache.get(self._index_key, set()))
+        members = get_redis_connection().smembers(
+            backend.make_and_validate_key(self._index_key)
+        )
+        return [tuple(json.loads(member)) for member in members]
+
+    def samples(self) -> dict[tuple, int]:
+        # Values written by the Redis pipeline are read back as integers by the
+        # serializer of the cache
+        index = self._index()
+        values = cache.get_many([self._key(labels) for labels in index])
+        return {labels: values.get(self._key(labels), 0) for labels in index}
+
+
+class Histogram:
+    """
+    Histogram shared by every process through the default cache, like Counter.
+    Observations are accumulated in the process and only added to the cache by
+    flush(), which runs at most every METRICS_FLUSH_INTERVAL seconds and after
+    every Celery task, so that observing doesn't cost a cache round trip.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # Bucket counts are stored per bucket and summed up when read, sums are
+        # stored in microseconds as the cache can only increment integers
+        self._bucket_counter = Counter(
+            f"{name}_bucket", description, label_names=(*label_names, "le")
+        )
+        self._sum_counter = Counter(f"{name}_sum", description, label_names)
+        self._count_counter = Counter(f"{name}_count", description, label_names)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _bucket_index(self, value: float) -> int:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                return index
+        return len(self.buckets)
+
+    def _add(self, value: float, labels: dict):
+        labels = self._count_counter._labels(labels)
+        with self._lock:
+            buckets, total = self._pending.get(labels, ({}, 0))
+            index = self._bucket_index(value)
+            buckets[index] = buckets.get(index, 0) + 1
+            self._pending[labels] = buckets, total + round(value * 1_000_000)
+
+    def _flush_due(self) -> bool:
+        return time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+    def observe(self, value: float, **labels):
+        self._add(value, labels)
+        if self._flush_due():
+            self.flush()
+
+    async def aobserve(self, value: float, **labels):
+        """observe for async views, flushing in a thread instead of the event loop."""
+        self._add(value, labels)
+        if self._flush_due():
+            await sync_to_async(self.flush, thread_sensitive=False)()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    @asynccontextmanager
+    async def atime(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            await self.aobserve(time.perf_counter() - start, **labels)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        bucket_counts, sums, counts = {}, {}, {}
+        for labels, (buckets, total) in pending.items():
+            for index, count in buckets.items():
+                bucket_counts[(*labels, self._bound(index))] = count
+            sums[labels] = total
+            counts[labels] = sum(buckets.values())
+        self._bucket_counter._write(bucket_counts)
+        self._sum_counter._write(sums)
+        self._count_counter._write(counts)
+
+    def _bound(self, index: int) -> str:
+        return str(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+
+    def samples(self) -> dict[tuple, tuple[list[tuple[str, int]], float, int]]:
+        """Cumulative bucket counts, sum in seconds and count, by labels."""
+        bucket_samples = self._bucket_counter.samples()
+        sums = self._sum_counter.samples()
+        result = {}
+        for labels, count in self._count_counter.samples().items():
+            cumulative = 0
+            buckets = []
+            for index in range(len(self.buckets) + 1):
+                bound = self._bound(index)
+                cumulative += bucket_samples.get((*labels, bound), 0)
+                buckets.append((bound, cumulative))
+            result[labels] = buckets, sums.get(labels, 0) / 1_000_000, count
+        return result
+
+
+class Gauge:
+    """Gauge whose value is computed when the metrics are read."""
+
+    def __init__(self, name: str, description: str, collect: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.label_names = ()
+        self.collect = collect
+
+    def samples(self) -> dict[tuple, float]:
+        return {(): self.collect()}
+
+
+WEBHOOK_DUPLICATE_DELIVERIES = Counter(
+    "webhook_duplicate_deliveries_total",
+    "Webhook deliveries dropped because they were already received",
+    label_names=("event",),
+)
+
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Webhook deliveries received, by ingress policy outcome",
+    label_names=("event", "action", "outcome"),
+)
+
+WEBHOOK_RATE_LIMITED = Counter(
+    "webhook_rate_limited_total",
+    "Webhook deliveries over the rate limit of their installation target",
+    # Not by target, as there is one per installation
+    label_names=("host", "outcome"),
+)
+
+WEBHOOK_INGESTION_DURATION = Histogram(
+    "webhook_ingestion_duration_seconds",
+    "Time spent by the webhook endpoint parsing, inserting and enqueueing deliveries",
+    label_names=("stage",),
+)
+
+WEBHOOK_EVENTS_PROCESSED = Counter(
+    "webhook_events_processed_total",
+    "Webhook events processed, by event type and operation result",
+    label_names=("event", "result"),
+)
+
+WEBHOOK_EVENTS_DEAD_LETTERED = Counter(
+    "webhook_events_dead_lettered_total",
+    "Webhook events that failed every processing attempt, by event type",
+    label_names=("event",),
+)
+
+WEBHOOK_EVENT_PROCESSING_DURATION = Histogram(
+    "webhook_event_processing_duration_seconds",
+    "Time spent processing a webhook event, by event type",
+    label_names=("event",),
+)
+
+WEBHOOK_EVENTS_BACKLOG = Gauge(
+    "webhook_events_backlog",
+    "Webhook events waiting to be processed, dead-lettered events excluded",
+    collect=lambda: WebhookEvent.objects.filter(
+        processed_at__isnull=True, dead_lettered_at__isnull=True
+    ).count(),
+)
+
+REFERENCE_CACHE_LOOKUPS = Counter(
+    "reference_cache_lookups_total",
+    "Reference entities looked up in the cache of the processes writing them",
+    label_names=("model", "result"),
+)
+
+METRICS = (
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_DUPLICATE_DELIVERIES,
+    WEBHOOK_RATE_LIMITED,
+    WEBHOOK_INGESTION_DURATION,
+    WEBHOOK_EVENTS_PROCESSED,
+    WEBHOOK_EVENTS_DEAD_LETTERED,
+    WEBHOOK_EVENT_PROCESSING_DURATION,
+    WEBHOOK_EVENTS_BACKLOG,
+    REFERENCE_CACHE_LOOKUPS,
+)
+
+
+def flush_metrics():
+    """Adds the increments and observations accumulated by this process to the cache."""
+    # Lookups are counted by the cache itself, as they happen in the models
+    for (model, result), count in REFERENCE_CACHE.take_lookups().items():
+        REFERENCE_CACHE_LOOKUPS.inc(count, model=model, result=result)
+    for metric in METRICS:
+        if isinstance(metric, (Counter, Histogram)):
+            metric.flush()
+
+
+def _format_labels(names: tuple, values: tuple, **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render_metrics() -> str:
+    """All the metrics in the Prometheus text exposition format."""
+    flush_metrics()
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        if isinstance(metric, Histogram):
+            lines.append(f"# TYPE {metric.name} histogram")
+            for labels, (buckets, total, count) in sorted(metric.samples().items()):
+                for bound, value in buckets:
+                    label_text = _format_labels(metric.label_names, labels, le=bound)
+                    lines.append(f"{metric.name}_bucket{label_text} {value}")
+                label_text = _format_labels(metric.label_names, labels)
+                lines.append(f"{metric.name}_sum{label_text} {total}")
+                lines.append(f"{metric.name}_count{label_text} {count}")
+            continue
+        metric_type = "gauge" if isinstance(metric, Gauge) else "counter"
+        lines.append(f"# TYPE {metric.name} {metric_type}")
+        for labels, value in sorted(metric.samples().items()):
+            label_text = _format_labels(metric.label_names, labels)
+            lines.append(f"{metric.name}{label_text} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0095_jobstats_job_name_jobstats_owner_entity_name_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="raw_payload",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="raw_payload_compressed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="webhookevent",
+            name="payload",
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:33
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.migrations import RunPython
+
+
+def delete_duplicate_deliveries(apps, schema_editor):
+    WebhookEvent = apps.get_model("actions_data", "WebhookEvent")
+    throughs = [
+        (apps.get_model("actions_data", model).webhook_events.through, column)
+        for model, column in (("Job", "job_id"), ("WorkflowRun", "workflowrun_id"))
+    ]
+    events = WebhookEvent.objects.annotate(
+        host=django.db.models.functions.Coalesce(
+            "enterprise_host", models.Value("github.com")
+        )
+    )
+    duplicates = (
+        events.values("delivery", "host")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        # Keep the processed event, then the one linked to the most jobs and runs,
+        # so that a failed or unprocessed copy doesn't replace it
+        copies = list(
+            events.filter(delivery=duplicate["delivery"], host=duplicate["host"])
+            .annotate(
+                links=models.Count("job", distinct=True)
+                + models.Count("workflowrun", distinct=True)
+            )
+            .order_by(models.F("processed_at").desc(nulls_last=True), "-links", "id")
+            .values_list("id", flat=True)
+        )
+        kept_id, deleted_ids = copies[0], copies[1:]
+        # Links of the deleted copies are moved to the kept one
+        for through, column in throughs:
+            linked = set(
+                through.objects.filter(webhookevent_id=kept_id).values_list(
+                    column, flat=True
+                )
+            )
+            for link in through.objects.filter(webhookevent_id__in=deleted_ids):
+                owner_id = getattr(link, column)
+                if owner_id not in linked:
+                    link.webhookevent_id = kept_id
+                    link.save(update_fields=["webhookevent"])
+                    linked.add(owner_id)
+        WebhookEvent.objects.filter(id__in=deleted_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0096_webhookevent_raw_payload"),
+    ]
+
+    operations = [
+        RunPython(
+            delete_duplicate_deliveries,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
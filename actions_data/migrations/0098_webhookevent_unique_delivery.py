@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:33
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0097_delete_duplicate_webhook_deliveries"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="webhookevent",
+            constraint=models.UniqueConstraint(
+                models.F("delivery"),
+                django.db.models.functions.comparison.Coalesce(
+                    "enterprise_host", models.Value("github.com")
+                ),
+                name="unique_webhook_event_delivery",
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0098_webhookevent_unique_delivery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookEventArchive",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="archive",
+                        serialize=False,
+                        to="actions_data.webhookevent",
+                    ),
+                ),
+                ("payload", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="projection_version",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0099_webhookevent_projection"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookDelivery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("delivery", models.CharField(max_length=255)),
+                ("enterprise_host", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name="webhookevent",
+            name="unique_webhook_event_delivery",
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="webhook_events",
+            field=models.ManyToManyField(
+                db_constraint=False, to="actions_data.webhookevent"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="webhookeventarchive",
+            name="event",
+            field=models.OneToOneField(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                primary_key=True,
+                related_name="archive",
+                serialize=False,
+                to="actions_data.webhookevent",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="workflowrun",
+            name="webhook_events",
+            field=models.ManyToManyField(
+                db_constraint=False, to="actions_data.webhookevent"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="webhookdelivery",
+            constraint=models.UniqueConstraint(
+                fields=("delivery", "enterprise_host"), name="unique_webhook_delivery"
+            ),
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO actions_data_webhookdelivery (delivery, enterprise_host, created_at)
+            SELECT delivery, COALESCE(enterprise_host, 'github.com'), MIN(created_at)
+            FROM actions_data_webhookevent
+            GROUP BY delivery, COALESCE(enterprise_host, 'github.com')
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
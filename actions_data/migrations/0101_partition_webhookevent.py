@@ -0,0 +1,245 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:50
+
+from datetime import date, timedelta
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+MONTHS_AHEAD = 3
+
+# Rows moved between the old and new tables in each transaction
+MOVE_BATCH_SIZE = 10_000
+
+TABLE = "actions_data_webhookevent"
+UNPARTITIONED_TABLE = f"{TABLE}_unpartitioned"
+PARTITIONED_TABLE = f"{TABLE}_partitioned"
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def table_kind(cursor, table: str) -> str | None:
+    """'p' for a partitioned table, 'r' for a plain one, None if it doesn't exist."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def move_events(connection, source: str, target: str):
+    """
+    Moves the rows of `source` to `target` in batches of MOVE_BATCH_SIZE, newest
+    first, each in its own transaction so that no lock is held for the whole copy
+    and an interrupted move can be resumed by running the migration again.
+    """
+    while True:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    WITH moved AS (
+                        DELETE FROM {source}
+                        WHERE id IN (
+                            SELECT id FROM {source} ORDER BY id DESC LIMIT %s
+                        )
+                        RETURNING *
+                    )
+                    INSERT INTO {target} SELECT * FROM moved
+                    """,
+                    [MOVE_BATCH_SIZE],
+                )
+                if cursor.rowcount < MOVE_BATCH_SIZE:
+                    return
+
+
+def create_partitioned_table(cursor):
+    """
+    Renames actions_data_webhookevent and creates in its place a table partitioned
+    by month of created_at. The primary key becomes (id, created_at), as Postgres
+    requires the partition key in it. Ids continue after the ones of the old table,
+    whose rows are moved afterwards.
+    """
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {UNPARTITIONED_TABLE}")
+    # Frees the name of the sequence for the new table
+    cursor.execute(f"ALTER TABLE {UNPARTITIONED_TABLE} ALTER COLUMN id DROP IDENTITY")
+    cursor.execute(
+        f"""
+        CREATE TABLE {TABLE} (
+            LIKE {UNPARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    cursor.execute(f"SELECT MIN(created_at) FROM {UNPARTITIONED_TABLE}")
+    oldest = cursor.fetchone()[0] or timezone.now()
+    month = oldest.date().replace(day=1)
+    last_month = timezone.now().date().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last_month = next_month(last_month)
+    while month <= last_month:
+        cursor.execute(
+            f"""
+            CREATE TABLE {TABLE}_p{month:%Y%m}
+            PARTITION OF {TABLE}
+            FOR VALUES FROM ('{month.isoformat()} 00:00:00+00')
+            TO ('{next_month(month).isoformat()} 00:00:00+00')
+            """
+        )
+        month = next_month(month)
+
+    cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    cursor.execute(
+        f"""
+        SELECT setval(
+            '{TABLE}_id_seq',
+            COALESCE((SELECT MAX(id) FROM {UNPARTITIONED_TABLE}), 0) + 1,
+            false
+        )
+        """
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ADD CONSTRAINT {TABLE}_partitioned_pkey PRIMARY KEY (id, created_at)
+        """
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ADD CONSTRAINT {TABLE}_user_id_fk_auth_user_id
+        FOREIGN KEY (user_id) REFERENCES auth_user (id)
+        DEFERRABLE INITIALLY DEFERRED
+        """
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ADD CONSTRAINT {TABLE}_installation_id_fk
+        FOREIGN KEY (installation_id) REFERENCES actions_data_installation (id)
+        DEFERRABLE INITIALLY DEFERRED
+        """
+    )
+    cursor.execute(f"CREATE INDEX {TABLE}_user_id_idx ON {TABLE} (user_id)")
+    cursor.execute(
+        f"CREATE INDEX {TABLE}_installation_id_idx ON {TABLE} (installation_id)"
+    )
+
+
+def partition_webhook_events(apps, schema_editor):
+    """
+    Replaces actions_data_webhookevent with a table partitioned by month, then
+    moves the existing events into it in batches. No foreign key references the
+    table anymore, 0100_webhookdelivery dropped them, as partitioned tables can't
+    be referenced by id alone.
+    """
+    connection = schema_editor.connection
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if table_kind(cursor, TABLE) != "p":
+                create_partitioned_table(cursor)
+    move_events(connection, UNPARTITIONED_TABLE, TABLE)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+
+
+def create_unpartitioned_table(cursor):
+    """
+    Renames the partitioned table and creates in its place the plain table with
+    the names Django gave to its constraints and indexes before partitioning.
+    """
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {PARTITIONED_TABLE}")
+    cursor.execute(
+        f"ALTER SEQUENCE {TABLE}_id_seq RENAME TO {PARTITIONED_TABLE}_id_seq"
+    )
+    cursor.execute(
+        f"""
+        CREATE TABLE {TABLE} (
+            LIKE {PARTITIONED_TABLE} INCLUDING CONSTRAINTS
+        )
+        """
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY,
+        ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)
+        """
+    )
+    cursor.execute(
+        f"""
+        SELECT setval(
+            pg_get_serial_sequence('{TABLE}', 'id'),
+            COALESCE((SELECT MAX(id) FROM {PARTITIONED_TABLE}), 0) + 1,
+            false
+        )
+        """
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ADD CONSTRAINT {TABLE}_user_id_ab2ece35_fk_auth_user_id
+        FOREIGN KEY (user_id) REFERENCES auth_user (id)
+        DEFERRABLE INITIALLY DEFERRED
+        """
+    )
+    cursor.execute(
+        f"""
+        ALTER TABLE {TABLE}
+        ADD CONSTRAINT actions_data_webhook_installation_id_b9183aad_fk_actions_d
+        FOREIGN KEY (installation_id) REFERENCES actions_data_installation (id)
+        DEFERRABLE INITIALLY DEFERRED
+        """
+    )
+    cursor.execute(f"CREATE INDEX {TABLE}_user_id_ab2ece35 ON {TABLE} (user_id)")
+    cursor.execute(
+        f"CREATE INDEX {TABLE}_installation_id_b9183aad ON {TABLE} (installation_id)"
+    )
+
+
+def unpartition_webhook_events(apps, schema_editor):
+    """
+    Reverse of partition_webhook_events: moves the events back to a plain table,
+    which the foreign keys restored by reverting 0100_webhookdelivery can
+    reference. Rows referencing events that no longer exist would make those
+    constraints fail, so they are deleted.
+    """
+    connection = schema_editor.connection
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if table_kind(cursor, TABLE) == "p":
+                create_unpartitioned_table(cursor)
+    move_events(connection, PARTITIONED_TABLE, TABLE)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {PARTITIONED_TABLE}")
+        for table, column in (
+            ("actions_data_job_webhook_events", "webhookevent_id"),
+            ("actions_data_workflowrun_webhook_events", "webhookevent_id"),
+            ("actions_data_webhookeventarchive", "event_id"),
+        ):
+            cursor.execute(
+                f"""
+                DELETE FROM {table} WHERE NOT EXISTS (
+                    SELECT 1 FROM {TABLE} WHERE {TABLE}.id = {table}.{column}
+                )
+                """
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Events are moved in batches, each committed on its own
+    atomic = False
+
+    dependencies = [
+        ("actions_data", "0100_webhookdelivery"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partition_webhook_events, reverse_code=unpartition_webhook_events
+        ),
+    ]
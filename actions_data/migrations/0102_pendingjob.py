@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0101_partition_webhookevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingJob",
+            fields=[
+                (
+                    "job",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="pending",
+                        serialize=False,
+                        to="actions_data.job",
+                    ),
+                ),
+                (
+                    "workflow_run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_jobs",
+                        to="actions_data.workflowrun",
+                    ),
+                ),
+            ],
+        ),
+        # Completed jobs of runs whose event wasn't processed yet
+        migrations.RunSQL(
+            """
+            INSERT INTO actions_data_pendingjob (job_id, workflow_run_id)
+            SELECT job.id, job.workflow_run_id
+            FROM actions_data_job job
+            JOIN actions_data_workflowrun run ON run.id = job.workflow_run_id
+            WHERE run.workflow_id IS NULL
+            AND job.started_at IS NOT NULL
+            AND job.completed_at IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
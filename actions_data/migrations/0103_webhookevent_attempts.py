@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0102_pendingjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="dead_lettered_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="last_error",
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="next_attempt_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                condition=models.Q(("dead_lettered_at__isnull", False)),
+                fields=["dead_lettered_at"],
+                name="webhookevent_dead_letter_idx",
+            ),
+        ),
+    ]
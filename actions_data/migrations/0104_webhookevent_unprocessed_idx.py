@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0103_webhookevent_attempts"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                condition=models.Q(("processed_at__isnull", True)),
+                fields=["id"],
+                name="webhookevent_unprocessed_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0104_webhookevent_unprocessed_idx"),
+    ]
+
+    operations = [
+        # Never written to, replaced by the compact table
+        migrations.DeleteModel(
+            name="Step",
+        ),
+        migrations.CreateModel(
+            name="StepName",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=1000, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Step",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.PositiveSmallIntegerField()),
+                ("conclusion", models.CharField(max_length=50, null=True)),
+                ("duration_seconds", models.PositiveIntegerField(null=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="actions_data.job",
+                    ),
+                ),
+                (
+                    "name",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        to="actions_data.stepname",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("job", "number"),
+                        include=("name", "duration_seconds", "conclusion"),
+                        name="unique_step_number_for_job",
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="jobstats",
+            index=models.Index(
+                fields=["workflow_id", "started_at"],
+                name="actions_dat_workflo_53f257_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions_data", "0105_step_stepname"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="fingerprint",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="workflowrun",
+            name="fingerprint",
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -2,14 +2,20 @@ from .billing import Billing
 from .owner_entity import OwnerEntity
 from .pull_request import PullRequest
 from .repository import Repository
-from .step import Step
+from .step import Step, StepName
 from .workflow import Workflow
 from .membership import Membership
 from .installation import Installation
-from .webhook_event import WebhookEvent, WebhookEventManager
-from .workflow_run import WorkflowRun
-from .user_profile import UserProfile
+from .webhook_event import (
+    WebhookEvent,
+    WebhookEventManager,
+    WebhookEventArchive,
+    WebhookDelivery,
+)
 from .job_stats_label import JobStatsLabel
 from .job_stats import JobStats
+from .pending_job import PendingJob
+from .workflow_run import WorkflowRun
+from .user_profile import UserProfile
 from .job import Job
 from .runner_cost_config import RunnerCostConfig, RunnerLabelMultiplier
@@ -1,8 +1,10 @@
+import time
 from dataclasses import dataclass
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils.timezone import now
 from github.Installation import Installation as ClientInstallation
 
@@ -73,7 +75,121 @@ class ExtendedInstallation:
         return self.installation.raw_data.get("suspended_by")
 
 
+class InstallationCache:
+    """
+    Remembers which installation each webhook sender resolves to, and which users
+    were already added to each installation. Entries are kept in process memory
+    for INSTALLATION_CACHE_TTL seconds. With INSTALLATION_CACHE_BACKEND=shared they
+    are also kept in the default cache, so invalidations reach every process.
+    """
+
+    GENERATION_KEY = "installations:generation"
+
+    def __init__(self):
+        self.entries = {}
+        self.generation = None
+
+    @property
+    def is_shared(self) -> bool:
+        return settings.INSTALLATION_CACHE_BACKEND == "shared"
+
+    def _shared_key(self, key: tuple) -> str:
+        return ":".join(["installations", str(self.generation), *map(str, key)])
+
+    def _sync_generation(self):
+        generation = cache.get(self.GENERATION_KEY, 0)
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def _set_local(self, key: tuple, value):
+        self.entries[key] = (time.monotonic() + settings.INSTALLATION_CACHE_TTL, value)
+
+    def get(self, key: tuple):
+        if self.is_shared:
+            self._sync_generation()
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        if self.is_shared:
+            value = cache.get(self._shared_key(key))
+            if value is not None:
+                self._set_local(key, value)
+                return value
+        return None
+
+    def set(self, key: tuple, value):
+        if settings.INSTALLATION_CACHE_TTL <= 0:
+            return
+        self._set_local(key, value)
+        if self.is_shared:
+            cache.set(
+                self._shared_key(key), value, timeout=settings.INSTALLATION_CACHE_TTL
+            )
+
+    def invalidate(self):
+        self.entries.clear()
+        if self.is_shared:
+            cache.add(self.GENERATION_KEY, 0, timeout=None)
+            cache.incr(self.GENERATION_KEY)
+
+
+INSTALLATION_CACHE = InstallationCache()
+
+
+def invalidate_installation_cache(sender, created=False, action=None, **kwargs):
+    """Signal receiver for changes to installations or to their users."""
+    if created or action in ("pre_add", "post_add", "pre_remove", "pre_clear"):
+        # New rows and new members cannot make a cached entry stale
+        return
+    INSTALLATION_CACHE.invalidate()
+
+
 class InstallationManager(models.Manager):
+    def resolve_for_webhook(
+        self,
+        enterprise_host: str | None,
+        installation_id: int | None,
+        webhook_id: int,
+        user_id: int | None,
+    ) -> int:
+        """
+        Returns the id of the installation a webhook was sent by, creating it if
+        needed, and makes sure the user is one of its users. Repeat senders are
+        resolved from INSTALLATION_CACHE without any query, once the transaction
+        that resolved them commits.
+        """
+        if installation_id:
+            key = ("installation", enterprise_host, installation_id)
+        else:
+            key = ("webhook", enterprise_host, webhook_id)
+        pk = INSTALLATION_CACHE.get(key)
+        if pk is None:
+            if installation_id:
+                installation, _ = self.get_or_create(
+                    enterprise_host=enterprise_host,
+                    installation_id=installation_id,
+                    is_artificial=False,
+                )
+            else:
+                installation = self.get_or_create_artificial_installation(
+                    enterprise_host=enterprise_host,
+                    webhook_id=webhook_id,
+                )
+            pk = installation.pk
+            # Installations created by a transaction that is rolled back must not
+            # be cached, as inserting events for them would fail
+            transaction.on_commit(
+                lambda: INSTALLATION_CACHE.set(key, pk), using=self.db
+            )
+        if user_id and not INSTALLATION_CACHE.get(("user", pk, user_id)):
+            self.model(pk=pk).users.add(user_id)
+            transaction.on_commit(
+                lambda: INSTALLATION_CACHE.set(("user", pk, user_id), True),
+                using=self.db,
+            )
+        return pk
+
     def demo_installation(self):
         return self.get(
             is_artificial=True, installation_id=settings.DEMO_INSTALLATION_ID
@@ -3,10 +3,11 @@ from datetime import datetime
 from typing import Optional
 
 from django.contrib.postgres.indexes import GinIndex
-from django.db import models
+from django.db import models, transaction
 from django.utils.dateparse import parse_datetime
 
-from actions_data.models import WebhookEvent, JobStats, WorkflowRun
+from actions_data.models import WebhookEvent, JobStats, PendingJob, Step, WorkflowRun
+from actions_data.models.payload_projection import payload_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -54,49 +55,105 @@ class JobManager(models.Manager):
     def get_or_create_from_payload(self, payload: dict) -> "Job":
         job = payload["workflow_job"]
         return self.update_or_create(
-            id=job["id"],
-            defaults={
-                "node_id": job["node_id"],
-                "url": job["url"],
-                "html_url": job["html_url"],
-                "name": job["name"],
-                "status": job["status"],
-                "conclusion": job["conclusion"],
-                "created_at": job["created_at"],
-                "started_at": get_started_at(job),
-                "completed_at": get_completed_at(job),
-                "steps": job["steps"],
-                "check_run_url": job["check_run_url"],
-                "labels": job["labels"],
-                "runner_id": job["runner_id"],
-                "runner_name": job["runner_name"],
-                "runner_group_id": job["runner_group_id"],
-                "runner_group_name": job["runner_group_name"],
-            },
+            id=job["id"], defaults=self.defaults_from_payload(job)
         )[0]
 
+    @staticmethod
+    def defaults_from_payload(job: dict) -> dict:
+        return {
+            "node_id": job["node_id"],
+            "url": job["url"],
+            "html_url": job["html_url"],
+            "name": job["name"],
+            "status": job["status"],
+            "conclusion": job["conclusion"],
+            "created_at": job["created_at"],
+            "started_at": get_started_at(job),
+            "completed_at": get_completed_at(job),
+            "steps": job["steps"],
+            "check_run_url": job["check_run_url"],
+            "labels": job["labels"],
+            "runner_id": job["runner_id"],
+            "runner_name": job["runner_name"],
+            "runner_group_id": job["runner_group_id"],
+            "runner_group_name": job["runner_group_name"],
+        }
+
     def get_or_create_from_webhook_event(
         self, event: "WebhookEvent"
     ) -> Optional["Job"]:
+        """
+        Writes the job of the event, or returns None without writing anything when
+        the job was already written from the same content.
+        """
         if not event.is_processable_webhook_event:
             logger.warning(f"Received a non-processable event: {event}")
             raise ValueError("Received a non-processable event")
-        job = self.get_or_create_from_payload(event.payload)
-        job.webhook_events.add(event)
-
-        run_id = event.payload["workflow_job"]["run_id"]
-        run_attempt = event.payload["workflow_job"]["run_attempt"]
-        repo_data = event.payload["repository"]
-        job.workflow_run = (
+        payload = event.parsed_payload
+        job_data = payload["workflow_job"]
+        fingerprint = payload_fingerprint(payload, event.installation_id)
+        if self.filter(id=job_data["id"], fingerprint=fingerprint).exists():
+            return None
+        workflow_run = (
             WorkflowRun.objects.get_or_create_from_run_id_attempt_and_repo_data(
-                run_id, run_attempt, repo_data
+                job_data["run_id"], job_data["run_attempt"], payload["repository"]
             )
         )
-        job.installation = event.installation
-        job.save()
-        job.save_job_stats_entry()
+        # The fingerprint is only stored along with the stats, so that an event
+        # failing halfway is processed again when retried
+        with transaction.atomic(using=self.db):
+            job = self.update_or_create(
+                id=job_data["id"],
+                defaults={
+                    **self.defaults_from_payload(job_data),
+                    "workflow_run": workflow_run,
+                    "installation_id": event.installation_id,
+                    "fingerprint": fingerprint,
+                },
+            )[0]
+            job.webhook_events.add(event)
+            Step.objects.save_for_jobs([job])
+            ready = self.stage_until_run_is_known([job])
+            if ready:
+                JobStats.objects.save_for_jobs(
+                    self.filter(id__in=[job.id for job in ready])
+                )
         return job
 
+    def stage_until_run_is_known(self, jobs: list["Job"]) -> list["Job"]:
+        """
+        Stages the completed jobs whose run event wasn't processed yet as
+        PendingJob, and returns the other completed jobs, whose stats can be saved.
+        Runs of unknown workflow are locked while their jobs are staged, so that a
+        run event processed at the same time either sees the staged jobs, or is
+        seen here.
+        """
+        completed = [job for job in jobs if job.started_at and job.completed_at]
+        run_ids = {
+            job.workflow_run_id
+            for job in completed
+            if not (
+                self.model.workflow_run.is_cached(job) and job.workflow_run.workflow_id
+            )
+        }
+        if not run_ids:
+            return completed
+        with transaction.atomic(using=self.db):
+            waiting_run_ids = set(
+                WorkflowRun.objects.select_for_update(no_key=True)
+                .filter(id__in=run_ids, workflow__isnull=True)
+                .values_list("id", flat=True)
+            )
+            PendingJob.objects.bulk_create(
+                [
+                    PendingJob(job=job, workflow_run_id=job.workflow_run_id)
+                    for job in completed
+                    if job.workflow_run_id in waiting_run_ids
+                ],
+                ignore_conflicts=True,
+            )
+        return [job for job in completed if job.workflow_run_id not in waiting_run_ids]
+
     def count_for_run_attempt(
         self, owner: str, repo: str, run_id: int, run_attempt: int
     ) -> int:
@@ -130,10 +187,12 @@ class Job(models.Model):
     runner_name = models.CharField(max_length=500, null=True)
     runner_group_id = models.IntegerField(null=True)
     runner_group_name = models.CharField(max_length=500, null=True)
-    webhook_events = models.ManyToManyField("WebhookEvent")
+    webhook_events = models.ManyToManyField("WebhookEvent", db_constraint=False)
     installation = models.ForeignKey(
         "Installation", on_delete=models.CASCADE, null=True, related_name="jobs"
     )
+    # payload_fingerprint() of the event the job was written from
+    fingerprint = models.BigIntegerField(null=True)
 
     objects = JobManager()
 
@@ -148,25 +207,28 @@ class Job(models.Model):
         return f"{self.workflow_run_id} - {self.id} - {self.name} - {self.status}"
 
     def save_job_stats_entry(self) -> Optional[JobStats]:
-        self.refresh_from_db()
+        workflow_run = self.workflow_run
         if (
-            not self.workflow_run
-            or not self.workflow_run.workflow
+            not workflow_run
+            or not workflow_run.workflow
             or not self.started_at
             or not self.completed_at
         ):
             return
 
+        # Related rows are passed as instances, so that the names and labels of
+        # the stats are read without fetching them again
         result, created = JobStats.objects.update_or_create(
             job_id=self.id,
             defaults={
-                "workflow_run": self.workflow_run,
-                "workflow": self.workflow_run.workflow,
-                "repository": self.workflow_run.repository,
-                "owner_entity": self.workflow_run.repository.owner,
+                "job": self,
+                "workflow_run": workflow_run,
+                "workflow": workflow_run.workflow,
+                "repository": workflow_run.repository,
+                "owner_entity": workflow_run.repository.owner,
                 "started_at": self.started_at,
                 "completed_at": self.completed_at,
-                "installation": self.installation,
+                "installation_id": self.installation_id,
             },
         )
         return result
@@ -6,8 +6,39 @@ from django.core.exceptions import ValidationError
 from django.db import models
 
 from actions_data.models import JobStatsLabel
+from actions_insider.middleware import validate_field_limits
 
 TOLERANCE_SECONDS = 2
+# Set by save() from the other fields
+DERIVED_FIELDS = (
+    "event",
+    "job_name",
+    "workflow_name",
+    "repository_name",
+    "owner_entity_name",
+    "completed_at",
+    "execution_time",
+    "billable_time",
+)
+# Checked by their foreign key constraints rather than with a query each
+RELATED_FIELDS = (
+    "job",
+    "workflow_run",
+    "workflow",
+    "repository",
+    "owner_entity",
+    "installation",
+)
+# Written again when the stats of a job are recomputed
+UPDATE_FIELDS = (
+    "workflow_run",
+    "workflow",
+    "repository",
+    "owner_entity",
+    "started_at",
+    "installation",
+    *DERIVED_FIELDS,
+)
 logger = logging.getLogger(__name__)
 
 
@@ -19,6 +50,57 @@ class JobStatsManager(models.Manager):
         ).distinct()
         return self.filter(repository_id__in=user_distinct_repo_ids)
 
+    def save_for_jobs(self, jobs: models.QuerySet) -> list["JobStats"]:
+        """
+        Writes the stats and labels of `jobs` like Job.save_job_stats_entry would
+        for each of them, with one query to read the jobs and their runs, one
+        upsert of the stats and one insert of the missing labels, however many
+        jobs there are.
+        """
+        jobs = (
+            jobs.filter(
+                workflow_run__workflow__isnull=False,
+                started_at__isnull=False,
+                completed_at__isnull=False,
+            )
+            .select_related("workflow_run__workflow", "workflow_run__repository__owner")
+            .defer("steps")
+        )
+        stats = []
+        for job in jobs:
+            run = job.workflow_run
+            entry = self.model(
+                job=job,
+                workflow_run=run,
+                workflow=run.workflow,
+                repository=run.repository,
+                owner_entity=run.repository.owner,
+                started_at=job.started_at,
+                completed_at=job.completed_at,
+                installation_id=job.installation_id,
+            )
+            entry.save_event()
+            entry.save_names()
+            entry.clean()
+            entry.calculate_execution_times()
+            stats.append(entry)
+        validate_field_limits(stats)
+        self.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=["job"],
+            update_fields=UPDATE_FIELDS,
+        )
+        JobStatsLabel.objects.bulk_create(
+            [
+                JobStatsLabel(job_stats=entry, label=label)
+                for entry in stats
+                for label in entry.job.labels or []
+            ],
+            ignore_conflicts=True,
+        )
+        return stats
+
 
 class JobStats(models.Model):
     job = models.ForeignKey("Job", on_delete=models.CASCADE, related_name="stats")
@@ -64,6 +146,7 @@ class JobStats(models.Model):
             ),
             models.Index(fields=["installation_id", "started_at"]),
             models.Index(fields=["workflow_id"]),
+            models.Index(fields=["workflow_id", "started_at"]),
             models.Index(fields=["repository_id"]),
             models.Index(fields=["owner_entity_id"]),
             models.Index(fields=["repository_id", "started_at"]),
@@ -92,10 +175,14 @@ class JobStats(models.Model):
         )
 
     def save_labels(self):
-        labels = self.job.labels
         if self.job.labels:
-            for label in labels:
-                JobStatsLabel.objects.get_or_create(job_stats=self, label=label)
+            JobStatsLabel.objects.bulk_create(
+                [
+                    JobStatsLabel(job_stats=self, label=label)
+                    for label in self.job.labels
+                ],
+                ignore_conflicts=True,
+            )
 
     def save_event(self):
         self.event = self.workflow_run.event
@@ -121,7 +208,13 @@ class JobStats(models.Model):
     def save(self, *args, **kwargs):
         self.save_event()
         self.save_names()
-        self.full_clean()
+        # The unique job is enforced by its constraint, update_or_create retries
+        # concurrent inserts
+        self.full_clean(
+            exclude=RELATED_FIELDS, validate_unique=False, validate_constraints=False
+        )
         self.calculate_execution_times()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], *DERIVED_FIELDS}
         super().save(*args, **kwargs)
         self.save_labels()
@@ -5,6 +5,8 @@ from django.urls import reverse
 from github.NamedUser import NamedUser as ClientNamedUser
 from django.db import models
 
+from actions_data.models.reference_cache import upsert_references
+
 
 class OwnerEntityManager(models.Manager):
     def filter_for_user(self, user: User) -> Self:
@@ -51,15 +53,19 @@ class OwnerEntity(models.Model):
     def get_demo_url(self):
         return reverse("demo_organization_stats", kwargs={"pk": self.pk})
 
+    @staticmethod
+    def defaults_from_dict(data: dict) -> dict:
+        return {
+            "avatar_url": data["avatar_url"],
+            "entity_type": data["type"],
+            "login": data["login"],
+        }
+
     @classmethod
     def get_or_create_from_dict(cls, data: dict) -> Self:
-        return cls.objects.update_or_create(
-            id=data["id"],
-            defaults={
-                "avatar_url": data["avatar_url"],
-                "entity_type": data["type"],
-                "login": data["login"],
-            },
+        defaults = cls.defaults_from_dict(data)
+        return upsert_references(
+            [cls(id=data["id"], **defaults)], update_fields=list(defaults)
         )[0]
 
     @classmethod
@@ -0,0 +1,130 @@
+"""
+Compact projections of webhook payloads, keeping only the fields read by the
+workflow run and job processors. When a processor starts reading a new field,
+add it to a new projection version instead of changing an existing one, so
+that the version stored with each event tells which fields it has.
+"""
+
+import hashlib
+import json
+
+# A spec maps each kept key to the spec of its value, None keeps the whole value.
+# Specs are applied to every item of lists.
+OWNER_SPEC = {"id": None, "login": None, "avatar_url": None, "type": None}
+
+REPOSITORY_SPEC = {"id": None, "name": None, "owner": OWNER_SPEC}
+
+PULL_REQUEST_SPEC = {"id": None, "number": None, "url": None}
+
+WORKFLOW_SPEC = {
+    "id": None,
+    "node_id": None,
+    "name": None,
+    "path": None,
+    "state": None,
+    "url": None,
+    "html_url": None,
+    "created_at": None,
+    "updated_at": None,
+}
+
+WORKFLOW_RUN_SPEC = {
+    "id": None,
+    "run_attempt": None,
+    "name": None,
+    "node_id": None,
+    "head_branch": None,
+    "head_sha": None,
+    "path": None,
+    "display_title": None,
+    "run_number": None,
+    "event": None,
+    "status": None,
+    "conclusion": None,
+    "workflow_id": None,
+    "check_suite_id": None,
+    "check_suite_node_id": None,
+    "url": None,
+    "html_url": None,
+    "created_at": None,
+    "updated_at": None,
+    "actor": OWNER_SPEC,
+    "run_started_at": None,
+    "triggering_actor": OWNER_SPEC,
+    "jobs_url": None,
+    "logs_url": None,
+    "check_suite_url": None,
+    "artifacts_url": None,
+    "cancel_url": None,
+    "rerun_url": None,
+    "previous_attempt_url": None,
+    "workflow_url": None,
+    "head_commit": {"id": None},
+    "pull_requests": PULL_REQUEST_SPEC,
+    "repository": REPOSITORY_SPEC,
+    "head_repository": REPOSITORY_SPEC,
+}
+
+WORKFLOW_JOB_SPEC = {
+    "id": None,
+    "run_id": None,
+    "run_attempt": None,
+    "node_id": None,
+    "url": None,
+    "html_url": None,
+    "name": None,
+    "status": None,
+    "conclusion": None,
+    "created_at": None,
+    "started_at": None,
+    "completed_at": None,
+    "steps": None,
+    "check_run_url": None,
+    "labels": None,
+    "runner_id": None,
+    "runner_name": None,
+    "runner_group_id": None,
+    "runner_group_name": None,
+}
+
+PROJECTIONS = {
+    1: {
+        "action": None,
+        "installation": {"id": None},
+        "workflow_run": WORKFLOW_RUN_SPEC,
+        "workflow": WORKFLOW_SPEC,
+        "workflow_job": WORKFLOW_JOB_SPEC,
+        "repository": REPOSITORY_SPEC,
+    },
+}
+
+CURRENT_PROJECTION_VERSION = max(PROJECTIONS)
+
+
+def apply_spec(data, spec: dict | None):
+    if spec is None or data is None:
+        return data
+    if isinstance(data, list):
+        return [apply_spec(item, spec) for item in data]
+    return {key: apply_spec(data[key], spec[key]) for key in spec if key in data}
+
+
+def project_payload(payload: dict, version: int = CURRENT_PROJECTION_VERSION) -> dict:
+    return apply_spec(payload, PROJECTIONS[version])
+
+
+def payload_fingerprint(payload: dict, installation_id: int | None) -> int:
+    """
+    Fingerprint of the fields of `payload` read by the processors, and of the
+    installation the rows are written with, as a signed 64-bit integer. Stable
+    across processes, unlike hash(), so that it can be stored with the rows.
+    """
+    projection = project_payload(payload)
+    # Only completed events are processed, and the installation is resolved
+    projection.pop("action", None)
+    projection.pop("installation", None)
+    content = json.dumps(
+        [projection, installation_id], sort_keys=True, separators=(",", ":")
+    )
+    digest = hashlib.blake2b(content.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, signed=True)
@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class PendingJob(models.Model):
+    """
+    Completed job whose run event wasn't processed yet, so that the stats of the
+    job can't be saved. Its stats are saved once, along with the other jobs
+    waiting for the run, when the run event is processed.
+    """
+
+    job = models.OneToOneField(
+        "Job", on_delete=models.CASCADE, primary_key=True, related_name="pending"
+    )
+    workflow_run = models.ForeignKey(
+        "WorkflowRun", on_delete=models.CASCADE, related_name="pending_jobs"
+    )
@@ -2,6 +2,8 @@ from typing import Self
 
 from django.db import models
 
+from actions_data.models.reference_cache import upsert_references
+
 
 class PullRequest(models.Model):
     id = models.BigIntegerField(primary_key=True)
@@ -15,17 +17,20 @@ class PullRequest(models.Model):
 
     @classmethod
     def get_or_create_from_dict_list(cls, prs: list[dict]) -> list[Self]:
-        pull_requests = []
-        for pr in prs:
-            pull_requests.append(cls.get_or_create_from_dict(pr))
-        return pull_requests
+        pull_requests = {
+            pr["id"]: cls(id=pr["id"], **cls.defaults_from_dict(pr)) for pr in prs
+        }
+        return upsert_references(
+            list(pull_requests.values()), update_fields=["number", "url"]
+        )
 
     @classmethod
     def get_or_create_from_dict(cls, pr: dict) -> Self:
-        return PullRequest.objects.update_or_create(
-            id=pr["id"],
-            defaults={
-                "number": pr["number"],
-                "url": pr["url"],
-            },
-        )[0]
+        return cls.get_or_create_from_dict_list([pr])[0]
+
+    @staticmethod
+    def defaults_from_dict(pr: dict) -> dict:
+        return {
+            "number": pr["number"],
+            "url": pr["url"],
+        }
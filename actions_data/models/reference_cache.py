@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+
+from actions_data.models.upsert import upsert
+
+
+class ReferenceCache:
+    """
+    Bounded LRU of the reference entities (owners, repositories, pull requests and
+    workflows) this process wrote, keyed by model and primary key, with a
+    fingerprint of the fields that were written. Holds up to REFERENCE_CACHE_SIZE
+    entries, none with 0. Entries are only added once the transaction that wrote
+    them commits, and are cleared in every process when the rows are changed by
+    anything else, through a generation kept in the default cache and checked at
+    most every SYNC_INTERVAL seconds.
+    """
+
+    GENERATION_KEY = "references:generation"
+    SYNC_INTERVAL = 1
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.synced_at = 0
+        self.lookups = Counter()
+
+    @staticmethod
+    def fingerprint(obj: Model, fields: list[str]) -> int:
+        opts = obj._meta
+        return hash(
+            tuple(getattr(obj, opts.get_field(name).attname) for name in fields)
+        )
+
+    def _sync_generation(self):
+        if time.monotonic() - self.synced_at < self.SYNC_INTERVAL:
+            return
+        generation = cache.get(self.GENERATION_KEY, 0)
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            self.synced_at = time.monotonic()
+
+    def is_current(self, obj: Model, fingerprint: int) -> bool:
+        """Whether `obj` was written by this process with the same fingerprint."""
+        key = (obj._meta.label, obj.pk)
+        with self.lock:
+            hit = self.entries.get(key) == fingerprint
+            if hit:
+                self.entries.move_to_end(key)
+            self.lookups[obj._meta.label, "hit" if hit else "miss"] += 1
+        return hit
+
+    def set_many(self, entries: dict[tuple, int]):
+        size = settings.REFERENCE_CACHE_SIZE
+        with self.lock:
+            for key, fingerprint in entries.items():
+                self.entries[key] = fingerprint
+                self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def take_lookups(self) -> dict[tuple[str, str], int]:
+        """Hits and misses by model since the last call."""
+        with self.lock:
+            lookups, self.lookups = self.lookups, Counter()
+        return dict(lookups)
+
+    def invalidate(self, obj: Model | None = None):
+        """Forgets `obj`, or every entry, here and in every other process."""
+        with self.lock:
+            if obj is None:
+                self.entries.clear()
+            else:
+                self.entries.pop((obj._meta.label, obj.pk), None)
+        cache.add(self.GENERATION_KEY, 0, timeout=None)
+        cache.incr(self.GENERATION_KEY)
+
+
+REFERENCE_CACHE = ReferenceCache()
+
+
+def invalidate_reference_cache(sender, instance, created=False, **kwargs):
+    """Signal receiver for reference entities changed outside of upsert_references()."""
+    if created:
+        # New rows cannot make a cached entry stale
+        return
+    REFERENCE_CACHE.invalidate(instance)
+
+
+def upsert_references(
+    objs: list[Model], update_fields: list[str], using: str = "default"
+) -> list[Model]:
+    """
+    upsert() on the primary key, skipping the objects this process already wrote
+    with the same `update_fields` values, which don't need any query.
+    """
+    if settings.REFERENCE_CACHE_SIZE <= 0:
+        return upsert(
+            objs, unique_fields=["id"], update_fields=update_fields, using=using
+        )
+    REFERENCE_CACHE._sync_generation()
+    fingerprints = {}
+    missed = []
+    for obj in objs:
+        fingerprint = ReferenceCache.fingerprint(obj, update_fields)
+        if REFERENCE_CACHE.is_current(obj, fingerprint):
+            obj._state.adding = False
+            obj._state.db = using
+        else:
+            fingerprints[obj._meta.label, obj.pk] = fingerprint
+            missed.append(obj)
+    upsert(missed, unique_fields=["id"], update_fields=update_fields, using=using)
+    if fingerprints:
+        # Rows written by a transaction that is rolled back must be written again
+        transaction.on_commit(
+            lambda: REFERENCE_CACHE.set_many(fingerprints), using=using
+        )
+    return objs
@@ -3,6 +3,7 @@ from django.urls import reverse
 from github.Repository import Repository as ClientRepository
 
 from actions_data.models import OwnerEntity
+from actions_data.models.reference_cache import upsert_references
 
 
 class RepositoryManager(models.Manager):
@@ -23,13 +24,21 @@ class RepositoryManager(models.Manager):
     def get_or_create_from_dict(self, data: dict) -> "Repository":
         owner_data = data.get("owner", {})
         owner = OwnerEntity.get_or_create_from_dict(owner_data)
-        return self.update_or_create(
-            id=data["id"],
-            defaults={
-                "name": data["name"],
-                "owner_id": owner.id,
-            },
-        )[0]
+        defaults = self.defaults_from_dict(data, owner.id)
+        [repository] = upsert_references(
+            [self.model(id=data["id"], **defaults)],
+            update_fields=list(defaults),
+            using=self.db,
+        )
+        repository.owner = owner
+        return repository
+
+    @staticmethod
+    def defaults_from_dict(data: dict, owner_id: int) -> dict:
+        return {
+            "name": data["name"],
+            "owner_id": owner_id,
+        }
 
     def filter_for_user(self, user: "User"):
         user_distinct_repo_ids = user.userprofile.repositories.values_list(
@@ -1,13 +1,153 @@
-from django.db import models
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from actions_data.models.upsert import insert_ignoring_conflicts, upsert
+
+
+def step_duration_seconds(step: dict) -> Optional[int]:
+    if not step.get("started_at") or not step.get("completed_at"):
+        return None
+    duration = parse_datetime(step["completed_at"]) - parse_datetime(step["started_at"])
+    return max(0, round(duration.total_seconds()))
+
+
+class StepNameManager(models.Manager):
+
+    def __init__(self):
+        super().__init__()
+        self.cached_ids: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def ids_for(self, names: set[str]) -> dict[str, int]:
+        """
+        Ids of `names`, inserting the ones that aren't stored yet. Names this
+        process already looked up don't need any query, the others take one insert
+        and, when some of them were stored before, one select.
+        """
+        with self.lock:
+            ids = {
+                name: self.cached_ids[name] for name in names if name in self.cached_ids
+            }
+        missing = names - ids.keys()
+        if not missing:
+            return ids
+        inserted = {
+            step_name.name: step_name.id
+            for step_name in insert_ignoring_conflicts(
+                [self.model(name=name) for name in missing], ["name"], using=self.db
+            )
+        }
+        stored = {}
+        if len(inserted) < len(missing):
+            stored = dict(
+                self.filter(name__in=missing - inserted.keys()).values_list(
+                    "name", "id"
+                )
+            )
+        ids.update(inserted)
+        ids.update(stored)
+
+        def remember():
+            with self.lock:
+                if len(self.cached_ids) + len(missing) > settings.STEP_NAME_CACHE_SIZE:
+                    self.cached_ids.clear()
+                self.cached_ids.update(inserted)
+                self.cached_ids.update(stored)
+
+        # Inserted names only exist once the transaction commits
+        if len(missing) <= settings.STEP_NAME_CACHE_SIZE:
+            transaction.on_commit(remember, using=self.db)
+        return ids
+
+
+class StepName(models.Model):
+    """Names of the steps, stored once and referenced by id from each step."""
+
+    name = models.CharField(max_length=1000, unique=True)
+
+    objects = StepNameManager()
+
+    def __str__(self):
+        return self.name
+
+
+class StepManager(models.Manager):
+
+    def save_for_jobs(self, jobs: list["Job"]) -> list["Step"]:
+        """
+        Writes the steps of the completed `jobs` from their `steps` payload, and
+        deletes the ones they no longer have, with one upsert and one delete however
+        many jobs there are. Jobs that aren't completed yet are skipped, their steps
+        are written with the event that completes them.
+        """
+        jobs = {job.id: job for job in jobs if job.status == "completed" and job.steps}
+        if not jobs:
+            return []
+        max_length = StepName._meta.get_field("name").max_length
+        name_ids = StepName.objects.db_manager(self.db).ids_for(
+            {step["name"][:max_length] for job in jobs.values() for step in job.steps}
+        )
+        steps = {}
+        for job in jobs.values():
+            for step in job.steps:
+                steps[job.id, step["number"]] = self.model(
+                    job_id=job.id,
+                    number=step["number"],
+                    name_id=name_ids[step["name"][:max_length]],
+                    conclusion=step.get("conclusion"),
+                    duration_seconds=step_duration_seconds(step),
+                )
+        upsert(
+            list(steps.values()),
+            unique_fields=["job", "number"],
+            update_fields=["name", "conclusion", "duration_seconds"],
+            using=self.db,
+        )
+        last_numbers = {}
+        for job_id, number in steps:
+            last_numbers[job_id] = max(number, last_numbers.get(job_id, number))
+        self.filter(
+            Q(
+                *(
+                    Q(job_id=job_id, number__gt=number)
+                    for job_id, number in last_numbers.items()
+                ),
+                _connector=Q.OR,
+            )
+        ).delete()
+        return list(steps.values())
 
 
 class Step(models.Model):
-    job = models.ForeignKey("Job", on_delete=models.CASCADE)
-    name = models.CharField(max_length=100)
-    status = models.CharField(max_length=50)
-    conclusion = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    """
+    Steps of the completed jobs, kept small so that the steps of every run of a
+    workflow can be aggregated without decoding `Job.steps`.
+    """
+
+    # Both are covered by the unique constraint, or never filtered on alone
+    job = models.ForeignKey("Job", on_delete=models.CASCADE, db_index=False)
+    number = models.PositiveSmallIntegerField()
+    name = models.ForeignKey(StepName, on_delete=models.PROTECT, db_index=False)
+    conclusion = models.CharField(max_length=50, null=True)
+    duration_seconds = models.PositiveIntegerField(null=True)
+
+    objects = StepManager()
+
+    class Meta:
+        constraints = [
+            # Covers the columns aggregated by the step hotspots of a workflow, so
+            # that they are read from the index alone
+            models.UniqueConstraint(
+                fields=["job", "number"],
+                include=["name", "duration_seconds", "conclusion"],
+                name="unique_step_number_for_job",
+            )
+        ]
 
     def __str__(self):
-        return f"{self.job.workflow_run.workflow.name} - {self.job.workflow_run.repository.name} - {self.job.name} - {self.name} - {self.status}"
+        return f"{self.job_id} - {self.number} - {self.name_id} - {self.conclusion}"
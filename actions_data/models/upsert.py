@@ -0,0 +1,141 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import Model, Q, sql
+from django.db.models.constants import OnConflict
+
+from actions_insider.middleware import validate_field_limits
+
+
+def insert_ignoring_conflicts(
+    objs: list[Model], key_fields: list[str], using: str = "default"
+) -> list[Model]:
+    """
+    Inserts `objs` with a single INSERT ... ON CONFLICT DO NOTHING, and returns
+    the ones that were actually inserted, with their primary key set. Rows are
+    matched back to `objs` through `key_fields`, which should be the fields of
+    the unique constraint that causes the conflicts.
+    """
+    if not objs:
+        return []
+    validate_field_limits(objs)
+    opts = objs[0]._meta
+    fields = [f for f in opts.concrete_fields if f is not opts.pk and not f.generated]
+    key_fields = [opts.get_field(name) for name in key_fields]
+
+    query = sql.InsertQuery(objs[0].__class__, on_conflict=OnConflict.IGNORE)
+    query.insert_values(fields, objs)
+    compiler = query.get_compiler(using=using)
+    compiler.returning_fields = [opts.pk, *key_fields]
+    with connections[using].cursor() as cursor:
+        for statement, params in compiler.as_sql():
+            cursor.execute(statement, params)
+        rows = cursor.fetchall()
+
+    pending = defaultdict(list)
+    for obj in objs:
+        pending[tuple(getattr(obj, f.attname) for f in key_fields)].append(obj)
+    inserted = []
+    for pk, *key in rows:
+        obj = pending[tuple(key)].pop(0)
+        obj.pk = pk
+        obj._state.adding = False
+        obj._state.db = using
+        inserted.append(obj)
+    return inserted
+
+
+def upsert(
+    objs: list[Model],
+    unique_fields: list[str],
+    update_fields: list[str],
+    using: str = "default",
+) -> list[Model]:
+    """
+    Inserts `objs`, or updates the `update_fields` of the rows they conflict with
+    on `unique_fields`, with a single INSERT ... ON CONFLICT DO UPDATE. Rows are
+    only rewritten when one of their `update_fields` differs, so that unchanged
+    rows don't leave dead tuples behind, and concurrent writers of the same row
+    don't need to retry. Without `update_fields`, conflicting rows are left as they
+    are.
+
+    auto_now fields are updated along with the other fields, and auto_now_add
+    fields keep the time the row was inserted. Fields that aren't updated keep the
+    values of `objs`, not the stored ones. Sets the primary key of every object,
+    which must have distinct `unique_fields`, and returns `objs`.
+    """
+    if not objs:
+        return objs
+    validate_field_limits(objs)
+    model = objs[0].__class__
+    opts = model._meta
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = [
+        f
+        for f in opts.concrete_fields
+        if not f.generated and (f is not opts.pk or objs[0].pk is not None)
+    ]
+    unique_fields = [opts.get_field(name) for name in unique_fields]
+    update_fields = [
+        f
+        for f in (opts.get_field(name) for name in update_fields)
+        if not getattr(f, "auto_now_add", False)
+    ]
+    compared_fields = [f for f in update_fields if not getattr(f, "auto_now", False)]
+    if update_fields:
+        update_fields += [
+            f
+            for f in opts.concrete_fields
+            if getattr(f, "auto_now", False) and f not in update_fields
+        ]
+
+    query = sql.InsertQuery(
+        model,
+        on_conflict=OnConflict.UPDATE if update_fields else OnConflict.IGNORE,
+        update_fields=update_fields,
+        unique_fields=unique_fields,
+    )
+    query.insert_values(fields, objs)
+    [(statement, params)] = query.get_compiler(using=using).as_sql()
+    if compared_fields:
+        table = quote_name(opts.db_table)
+        columns = [quote_name(f.column) for f in compared_fields]
+        statement += " WHERE ({}) IS DISTINCT FROM ({})".format(
+            ", ".join(f"{table}.{column}" for column in columns),
+            ", ".join(f"EXCLUDED.{column}" for column in columns),
+        )
+    statement += " RETURNING {}".format(
+        ", ".join(quote_name(f.column) for f in [opts.pk, *unique_fields])
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        rows = cursor.fetchall()
+
+    def key(obj: Model) -> tuple:
+        return tuple(getattr(obj, f.attname) for f in unique_fields)
+
+    pending = {key(obj): obj for obj in objs}
+    for pk, *row_key in rows:
+        pending.pop(tuple(row_key)).pk = pk
+    # Unchanged rows aren't returned, nor are the ones only a concurrent writer made
+    if pending and unique_fields != [opts.pk]:
+        stored = model._base_manager.using(using).filter(
+            reduce(
+                or_,
+                (
+                    Q(**{f.attname: value for f, value in zip(unique_fields, row_key)})
+                    for row_key in pending
+                ),
+            )
+        )
+        for pk, *row_key in stored.values_list(
+            opts.pk.attname, *(f.attname for f in unique_fields)
+        ):
+            pending[tuple(row_key)].pk = pk
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
@@ -1,7 +1,21 @@
+import json
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import close_old_connections, connections, models, transaction
+from django.db.models.signals import pre_save
+from django.utils.timezone import now
 
 from actions_data.models import Installation
+from actions_data.models.payload_projection import (
+    CURRENT_PROJECTION_VERSION,
+    project_payload,
+)
+from actions_data.models.upsert import insert_ignoring_conflicts
 
 DEFAULT_HOST = "github.com"
 DELIVERY_HEADER = "X-Github-Delivery"
@@ -11,15 +25,129 @@ HOOK_INSTALLATION_TARGET_ID_HEADER = "X-Github-Hook-Installation-Target-ID"
 HOOK_INSTALLATION_TARGET_TYPE_HEADER = "X-Github-Hook-Installation-Target-Type"
 ENTERPRISE_VERSION_HEADER = "X-Github-Enterprise-Version"
 ENTERPRISE_HOST_HEADER = "X-Github-Enterprise-Host"
+WEBHOOK_HEADERS = (
+    DELIVERY_HEADER,
+    EVENT_HEADER,
+    HOOK_ID_HEADER,
+    HOOK_INSTALLATION_TARGET_ID_HEADER,
+    HOOK_INSTALLATION_TARGET_TYPE_HEADER,
+    ENTERPRISE_VERSION_HEADER,
+    ENTERPRISE_HOST_HEADER,
+)
+PROCESSABLE_EVENT_TYPES = ("workflow_run", "workflow_job")
+
+JSON_STORAGE = "json"
+RAW_STORAGE = "raw"
+COMPRESSED_STORAGE = "compressed"
+
+
+# Threads writing the events received by the async webhook view, each keeping its
+# own database connection
+WEBHOOK_WRITERS = ThreadPoolExecutor(
+    max_workers=settings.WEBHOOK_ASYNC_WRITE_THREADS,
+    thread_name_prefix="webhook-writer",
+)
+
+
+def close_webhook_writer_connections():
+    """Closes the database connection of every webhook writer thread."""
+    # Every thread has to take one task for all of them to reach the barrier
+    barrier = threading.Barrier(settings.WEBHOOK_ASYNC_WRITE_THREADS)
+
+    def close_connections():
+        connections.close_all()
+        barrier.wait()
+
+    wait(
+        [
+            WEBHOOK_WRITERS.submit(close_connections)
+            for _ in range(settings.WEBHOOK_ASYNC_WRITE_THREADS)
+        ]
+    )
+
+
+def decode_raw_payload(raw_payload: bytes, compressed: bool) -> dict:
+    if compressed:
+        raw_payload = zlib.decompress(raw_payload)
+    return json.loads(raw_payload)
 
 
 class WebhookEventManager(models.Manager):
-    def create_from_headers_and_payload(self, **kwargs):
+    def create_from_headers_and_payload(self, **kwargs) -> "WebhookEvent | None":
+        """
+        Inserts the event unless its delivery was already received from the same
+        host, in which case nothing is written and None is returned.
+        """
+        event = self.build_from_headers_and_payload(**kwargs)
+        return self.insert_or_ignore(event)
+
+    def create_from_headers_and_body(self, **kwargs) -> "WebhookEvent | None":
+        event = self.build_from_headers_and_body(**kwargs)
+        return self.insert_or_ignore(event)
+
+    async def ainsert_or_ignore(self, event: "WebhookEvent") -> "WebhookEvent | None":
+        """
+        Async variant of insert_or_ignore. The event is written by one of the
+        WEBHOOK_WRITERS, so that concurrent deliveries are written in parallel
+        instead of queueing on the thread Django runs sync code on. Installations
+        are created on first sight, so they're still resolved on that thread, one
+        at a time.
+        """
+        if event.is_payload_parsed:
+            await sync_to_async(event.associate_installation)()
+        return await sync_to_async(
+            self.insert_or_ignore_in_writer,
+            thread_sensitive=False,
+            executor=WEBHOOK_WRITERS,
+        )(event)
+
+    def insert_or_ignore_in_writer(
+        self, event: "WebhookEvent"
+    ) -> "WebhookEvent | None":
+        # Writer threads don't get the request signals that recycle connections
+        close_old_connections()
+        return self.insert_or_ignore(event)
+
+    def insert_or_ignore(self, event: "WebhookEvent") -> "WebhookEvent | None":
+        # Keep the field checks that save() would have run
+        pre_save.send(sender=self.model, instance=event, raw=False, using=self.db)
+        inserted = self.bulk_insert_or_ignore([event])
+        return inserted[0] if inserted else None
+
+    def due_for_processing(self) -> models.QuerySet:
+        """Unprocessed events, except the dead-lettered ones and the ones backing off."""
+        return self.filter(
+            models.Q(next_attempt_at=None) | models.Q(next_attempt_at__lte=now()),
+            processed_at=None,
+            dead_lettered_at=None,
+        )
+
+    def build_from_headers_and_body(self, **kwargs) -> "WebhookEvent":
+        """
+        Builds an event from the raw request body, stored according to
+        WEBHOOK_PAYLOAD_STORAGE. Raw bodies are only parsed by the worker.
+        """
+        body = kwargs.pop("body")
+        storage = settings.WEBHOOK_PAYLOAD_STORAGE
+        if storage == JSON_STORAGE:
+            return self.build_from_headers_and_payload(
+                payload=json.loads(body), body=body, **kwargs
+            )
+        compressed = storage == COMPRESSED_STORAGE
+        return self.build_from_headers_and_payload(
+            raw_payload=zlib.compress(body) if compressed else body,
+            raw_payload_compressed=compressed,
+            **kwargs,
+        )
+
+    def build_from_headers_and_payload(self, **kwargs) -> "WebhookEvent":
         headers = kwargs.get("headers")
         payload = kwargs.get("payload")
         user_id = kwargs.get("user_id")
-        return self.create(
+        event = self.model(
             payload=payload,
+            raw_payload=kwargs.get("raw_payload"),
+            raw_payload_compressed=kwargs.get("raw_payload_compressed", False),
             delivery=headers.get(DELIVERY_HEADER),
             event=headers.get(EVENT_HEADER),
             hook_id=headers.get(HOOK_ID_HEADER),
@@ -31,10 +159,61 @@ class WebhookEventManager(models.Manager):
             enterprise_host=headers.get(ENTERPRISE_HOST_HEADER),
             user_id=user_id,
         )
+        if settings.WEBHOOK_PAYLOAD_PROJECTION and payload is not None:
+            event.project_payload(body=kwargs.get("body"))
+        return event
+
+    def bulk_insert_or_ignore(
+        self, events: list["WebhookEvent"]
+    ) -> list["WebhookEvent"]:
+        """
+        Inserts the events in a single statement, skipping deliveries that were
+        already received. Returns the events that were inserted.
+        """
+        with transaction.atomic(using=self.db):
+            deliveries = insert_ignoring_conflicts(
+                [
+                    WebhookDelivery(
+                        delivery=event.delivery,
+                        enterprise_host=event.enterprise_host or DEFAULT_HOST,
+                    )
+                    for event in events
+                ],
+                key_fields=["delivery", "enterprise_host"],
+                using=self.db,
+            )
+            new_deliveries = {(d.delivery, d.enterprise_host) for d in deliveries}
+            new_events = []
+            for event in events:
+                key = (event.delivery, event.enterprise_host or DEFAULT_HOST)
+                if key in new_deliveries:
+                    new_deliveries.remove(key)
+                    new_events.append(event)
+            # Nothing goes through save(), so installations are resolved here instead
+            for event in new_events:
+                if event.is_payload_parsed and event.installation_id is None:
+                    event.associate_installation()
+            inserted = self.bulk_create(new_events)
+            self.archive_payloads(inserted)
+        return inserted
+
+    def archive_payloads(self, events: list["WebhookEvent"]):
+        """Writes the full payloads that projected events set aside."""
+        archives = [
+            WebhookEventArchive(event=event, payload=event._archived_payload)
+            for event in events
+            if event._archived_payload is not None
+        ]
+        WebhookEventArchive.objects.using(self.db).bulk_create(archives)
+        for event in events:
+            event._archived_payload = None
 
 
 class WebhookEvent(models.Model):
-    payload = models.JSONField()
+    payload = models.JSONField(null=True)
+    raw_payload = models.BinaryField(null=True)
+    raw_payload_compressed = models.BooleanField(default=False)
+    projection_version = models.PositiveSmallIntegerField(null=True)
     delivery: models.CharField = models.CharField(max_length=255)
     event: models.CharField = models.CharField(max_length=255)
     hook_id: models.IntegerField = models.IntegerField()
@@ -44,6 +223,12 @@ class WebhookEvent(models.Model):
     enterprise_host: models.CharField = models.CharField(max_length=255, null=True)
     created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
     processed_at: models.DateTimeField = models.DateTimeField(null=True)
+    # Failed processing attempts, retried with a backoff until WEBHOOK_MAX_ATTEMPTS,
+    # when the event is dead-lettered and only processed again when replayed
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True)
+    dead_lettered_at = models.DateTimeField(null=True)
+    last_error = models.TextField(null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     installation = models.ForeignKey(
         Installation, on_delete=models.CASCADE, null=True, related_name="webhook_events"
@@ -51,36 +236,155 @@ class WebhookEvent(models.Model):
 
     objects = WebhookEventManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["dead_lettered_at"],
+                condition=models.Q(dead_lettered_at__isnull=False),
+                name="webhookevent_dead_letter_idx",
+            ),
+            # The backlog, claimed in id order by process_missing_events
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="webhookevent_unprocessed_idx",
+            ),
+        ]
+
+    # The table is partitioned by created_at (see migration 0101), so its primary key
+    # is (id, created_at) in the database, it can't have unique constraints of its
+    # own, and it can't be referenced by foreign key constraints.
+
+    _parsed_raw_payload = None
+    # Compressed full payload of a projected event, archived once it is inserted
+    _archived_payload = None
+
     def __str__(self):
         return f"{self.hook_id} - {self.delivery}"
 
     @property
-    def is_processable_webhook_event(self) -> bool:
-        action = self.payload.get("action")
-        is_completed = action == "completed"
-        event_type = self.event
-        is_workflow_related = event_type in ["workflow_run", "workflow_job"]
-        return is_completed and is_workflow_related
+    def parsed_payload(self) -> dict:
+        """The payload, parsed on first access when only the raw body is stored."""
+        if self.payload is not None:
+            return self.payload
+        if self._parsed_raw_payload is None:
+            self._parsed_raw_payload = decode_raw_payload(
+                bytes(self.raw_payload), self.raw_payload_compressed
+            )
+        return self._parsed_raw_payload
+
+    @property
+    def full_payload(self) -> dict:
+        """The payload as received, read from the archive for projected events."""
+        if self.projection_version is None:
+            return self.parsed_payload
+        return self.archive.parsed_payload
 
-    def associate_installation(self) -> Installation:
-        installation_data = self.payload.get("installation")
-        if installation_data:
-            installation_id = installation_data.get("id")
-            installation, _ = Installation.objects.get_or_create(
-                enterprise_host=self.enterprise_host,
-                installation_id=installation_id,
-                is_artificial=False,
+    def project_payload(self, body: bytes | None = None):
+        """
+        Replaces the payload with its compact projection, and sets the full payload
+        aside to be archived. `body` is the payload as received, if available.
+        """
+        payload = self.parsed_payload
+        if self.raw_payload is not None:
+            body = bytes(self.raw_payload)
+            self._archived_payload = (
+                body if self.raw_payload_compressed else zlib.compress(body)
             )
         else:
-            installation = Installation.objects.get_or_create_artificial_installation(
-                enterprise_host=self.enterprise_host,
-                webhook_id=self.hook_id,
+            body = body if body is not None else json.dumps(payload).encode()
+            self._archived_payload = zlib.compress(body)
+        self.payload = project_payload(payload)
+        self.raw_payload = None
+        self.raw_payload_compressed = False
+        self.projection_version = CURRENT_PROJECTION_VERSION
+
+    def compact(self):
+        """Projects the payload of a stored event and archives the full payload."""
+        self.project_payload()
+        with transaction.atomic():
+            WebhookEvent.objects.archive_payloads([self])
+            self.save(
+                update_fields=[
+                    "payload",
+                    "raw_payload",
+                    "raw_payload_compressed",
+                    "projection_version",
+                ]
             )
-        self.installation = installation
-        if self.user:
-            self.installation.users.add(self.user)
-        return installation
+
+    @property
+    def is_payload_parsed(self) -> bool:
+        return self.payload is not None or self._parsed_raw_payload is not None
+
+    @staticmethod
+    def is_processable(event_type: str, action: str | None) -> bool:
+        is_completed = action == "completed"
+        is_workflow_related = event_type in PROCESSABLE_EVENT_TYPES
+        return is_completed and is_workflow_related
+
+    @property
+    def is_processable_webhook_event(self) -> bool:
+        action = self.parsed_payload.get("action")
+        return self.is_processable(self.event, action)
+
+    def associate_installation(self) -> int:
+        installation_data = self.parsed_payload.get("installation")
+        self.installation_id = Installation.objects.resolve_for_webhook(
+            enterprise_host=self.enterprise_host,
+            installation_id=installation_data.get("id") if installation_data else None,
+            webhook_id=self.hook_id,
+            user_id=self.user_id,
+        )
+        return self.installation_id
 
     def save(self, *args, **kwargs):
-        self.associate_installation()
+        # Raw payloads are not parsed in the request thread, the worker associates
+        # the installation once it parses them
+        if self.is_payload_parsed:
+            self.associate_installation()
         super().save(*args, **kwargs)
+
+
+class WebhookEventArchive(models.Model):
+    """Full payload of a WebhookEvent whose payload was projected, zlib-compressed."""
+
+    event = models.OneToOneField(
+        WebhookEvent,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="archive",
+        db_constraint=False,
+    )
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of {self.event_id}"
+
+    @property
+    def parsed_payload(self) -> dict:
+        return decode_raw_payload(bytes(self.payload), compressed=True)
+
+
+class WebhookDelivery(models.Model):
+    """
+    Deliveries already received, used to skip GitHub redeliveries. WebhookEvent is
+    partitioned and can't hold this unique constraint itself.
+    """
+
+    delivery = models.CharField(max_length=255)
+    enterprise_host = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # GitHub redelivers events with the same delivery id
+            models.UniqueConstraint(
+                fields=["delivery", "enterprise_host"],
+                name="unique_webhook_delivery",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.enterprise_host} - {self.delivery}"
@@ -4,6 +4,8 @@ from django.db import models
 from django.urls import reverse
 from github.Workflow import Workflow as ClientWorkflow
 
+from actions_data.models.reference_cache import upsert_references
+
 
 class WorkflowManager(models.Manager):
     def filter_for_user(self, user: "User"):
@@ -50,22 +52,25 @@ class Workflow(models.Model):
 
     @classmethod
     def get_or_create_from_webhook_payload(cls, data: dict, repo_id: int) -> Self:
-        return Workflow.objects.update_or_create(
-            id=data["id"],
-            defaults={
-                "repository_id": repo_id,
-                "id": data["id"],
-                "node_id": data["node_id"],
-                "name": data["name"],
-                "path": data["path"],
-                "state": data["state"],
-                "url": data["url"],
-                "html_url": data["html_url"],
-                "created_at": data["created_at"],
-                "updated_at": data["updated_at"],
-            },
+        defaults = cls.defaults_from_webhook_payload(data, repo_id)
+        return upsert_references(
+            [cls(id=data["id"], **defaults)], update_fields=list(defaults)
         )[0]
 
+    @staticmethod
+    def defaults_from_webhook_payload(data: dict, repo_id: int) -> dict:
+        return {
+            "repository_id": repo_id,
+            "node_id": data["node_id"],
+            "name": data["name"],
+            "path": data["path"],
+            "state": data["state"],
+            "url": data["url"],
+            "html_url": data["html_url"],
+            "created_at": data["created_at"],
+            "updated_at": data["updated_at"],
+        }
+
     def get_full_name(self):
         return f"{self.repository.slug} - {self.name}"
 
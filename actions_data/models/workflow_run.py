@@ -1,23 +1,31 @@
 import logging
-from datetime import datetime
 from typing import Self, Optional
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Q
 
 from actions_data.models import (
+    JobStats,
     Repository,
     PullRequest,
     OwnerEntity,
     Workflow,
     WebhookEvent,
 )
+from actions_data.models.payload_projection import payload_fingerprint
+from actions_data.models.upsert import insert_ignoring_conflicts, upsert
 
 logger = logging.getLogger(__name__)
 
 
 class WorkflowRunManager(models.Manager):
 
-    def get_or_create_from_payload(self, payload: dict) -> "WorkflowRun":
+    def get_or_create_from_payload(
+        self,
+        payload: dict,
+        installation_id: int | None = None,
+        fingerprint: int | None = None,
+    ) -> "WorkflowRun":
         run = payload["workflow_run"]
         pull_requests_data = run.get("pull_requests", [])
         pull_requests = PullRequest.get_or_create_from_dict_list(pull_requests_data)
@@ -45,79 +53,114 @@ class WorkflowRunManager(models.Manager):
                 workflow_data, repository.id
             )
 
-        result = self.update_or_create(
-            run_id=run["id"],
-            run_attempt=run["run_attempt"],
-            defaults={
-                "name": run["name"],
-                "node_id": run["node_id"],
-                "head_branch": run["head_branch"],
-                "head_sha": run["head_sha"],
-                "path": run["path"],
-                "display_title": run["display_title"],
-                "run_number": run["run_number"],
-                "event": run["event"],
-                "status": run["status"],
-                "conclusion": run["conclusion"],
-                "workflow_id": run["workflow_id"],
-                "check_suite_id": run["check_suite_id"],
-                "check_suite_node_id": run["check_suite_node_id"],
-                "url": run["url"],
-                "html_url": run["html_url"],
-                "created_at": run["created_at"],
-                "updated_at": run["updated_at"],
-                "actor": actor,
-                # referenced_workflows=[]
-                "run_started_at": run["run_started_at"],
-                "triggering_actor": triggering_actor,
-                "jobs_url": run["jobs_url"],
-                "logs_url": run["logs_url"],
-                "check_suite_url": run["check_suite_url"],
-                "artifacts_url": run["artifacts_url"],
-                "cancel_url": run["cancel_url"],
-                "rerun_url": run["rerun_url"],
-                "previous_attempt_url": run["previous_attempt_url"],
-                "workflow_url": run["workflow_url"],
-                "head_commit": run["head_commit"]["id"],
-                "repository": repository,
-                "head_repository": head_repository,
-            },
-        )[0]
+        defaults = {
+            **self.defaults_from_payload(run),
+            "actor": actor,
+            "triggering_actor": triggering_actor,
+            "repository": repository,
+            "head_repository": head_repository,
+            "installation_id": installation_id,
+            "fingerprint": fingerprint,
+        }
+        [result] = upsert(
+            [self.model(run_id=run["id"], run_attempt=run["run_attempt"], **defaults)],
+            unique_fields=["run_id", "run_attempt"],
+            update_fields=list(defaults),
+            using=self.db,
+        )
+        if workflow and workflow.id == result.workflow_id:
+            result.workflow = workflow
         result.pull_requests.add(*pull_requests)
-        result.save()
         return result
 
+    @staticmethod
+    def defaults_from_payload(run: dict) -> dict:
+        """Fields of the run in its payload, apart from the related rows."""
+        return {
+            "name": run["name"],
+            "node_id": run["node_id"],
+            "head_branch": run["head_branch"],
+            "head_sha": run["head_sha"],
+            "path": run["path"],
+            "display_title": run["display_title"],
+            "run_number": run["run_number"],
+            "event": run["event"],
+            "status": run["status"],
+            "conclusion": run["conclusion"],
+            "workflow_id": run["workflow_id"],
+            "check_suite_id": run["check_suite_id"],
+            "check_suite_node_id": run["check_suite_node_id"],
+            "url": run["url"],
+            "html_url": run["html_url"],
+            "created_at": run["created_at"],
+            "updated_at": run["updated_at"],
+            # referenced_workflows=[]
+            "run_started_at": run["run_started_at"],
+            "jobs_url": run["jobs_url"],
+            "logs_url": run["logs_url"],
+            "check_suite_url": run["check_suite_url"],
+            "artifacts_url": run["artifacts_url"],
+            "cancel_url": run["cancel_url"],
+            "rerun_url": run["rerun_url"],
+            "previous_attempt_url": run["previous_attempt_url"],
+            "workflow_url": run["workflow_url"],
+            "head_commit": run["head_commit"]["id"],
+        }
+
     def get_or_create_from_webhook_event(
         self, event: WebhookEvent
     ) -> Optional["WorkflowRun"]:
+        """
+        Writes the run of the event, or returns None without writing anything when
+        the run was already written from the same content.
+        """
         if not event.is_processable_webhook_event:
             logger.warning(f"Received a non-processable WebhookEvent: {event}")
-        result = self.get_or_create_from_payload(event.payload)
-        result.webhook_events.add(event)
-        result.installation = event.associate_installation()
-        result.repository.last_webhook_received = datetime.now()
-        result.save()
-        result.save_redundant_data_to_jobs()
+        payload = event.parsed_payload
+        installation_id = event.associate_installation()
+        fingerprint = payload_fingerprint(payload, installation_id)
+        if self.filter(
+            run_id=payload["workflow_run"]["id"],
+            run_attempt=payload["workflow_run"]["run_attempt"],
+            fingerprint=fingerprint,
+        ).exists():
+            return None
+        # The run stays locked until its waiting jobs are saved, see
+        # JobManager.stage_until_run_is_known
+        with transaction.atomic(using=self.db):
+            result = self.get_or_create_from_payload(
+                payload, installation_id=installation_id, fingerprint=fingerprint
+            )
+            result.webhook_events.add(event)
+            result.save_redundant_data_to_jobs()
         return result
 
     def create_empty_workflow_run(
         self, run_id: int, run_attempt: int, repo_id: int
-    ) -> Self:
-        return self.create(
-            run_id=run_id, run_attempt=run_attempt, repository_id=repo_id
+    ) -> Self | None:
+        """Creates the run, unless another worker just did, returning None then."""
+        run = self.model(run_id=run_id, run_attempt=run_attempt, repository_id=repo_id)
+        inserted = insert_ignoring_conflicts(
+            [run], key_fields=["run_id", "run_attempt"], using=self.db
         )
+        return inserted[0] if inserted else None
 
     def get_or_create_from_run_id_attempt_and_repo_data(
         self, run_id: int, run_attempt: int, repo_data: dict
     ) -> Self:
+        # Along with the rows that the job stats are made of
+        runs = self.select_related("workflow", "repository__owner")
         try:
-            workflow_run = self.get(run_id=run_id, run_attempt=run_attempt)
+            workflow_run = runs.get(run_id=run_id, run_attempt=run_attempt)
         except self.model.DoesNotExist:
             repository = Repository.objects.get_or_create_from_dict(repo_data)
             workflow_run = self.create_empty_workflow_run(
                 run_id=run_id, run_attempt=run_attempt, repo_id=repository.id
             )
-        workflow_run.repository.last_webhook_received = datetime.now()
+            if workflow_run is None:
+                workflow_run = runs.get(run_id=run_id, run_attempt=run_attempt)
+            else:
+                workflow_run.repository = repository
         return workflow_run
 
     def filter_for_user(self, user: "User"):
@@ -186,7 +229,7 @@ class WorkflowRun(models.Model):
         related_name="workflows_as_head_repository",
         null=True,
     )
-    webhook_events = models.ManyToManyField("WebhookEvent")
+    webhook_events = models.ManyToManyField("WebhookEvent", db_constraint=False)
     job_data_collected = models.BooleanField(default=False)
     installation = models.ForeignKey(
         "Installation",
@@ -194,6 +237,9 @@ class WorkflowRun(models.Model):
         null=True,
         related_name="workflow_runs",
     )
+    # payload_fingerprint() of the event the run was written from, None for the
+    # runs created by the events of their jobs
+    fingerprint = models.BigIntegerField(null=True)
 
     objects = WorkflowRunManager()
 
@@ -211,5 +257,17 @@ class WorkflowRun(models.Model):
         return f"{self.workflow.name} - {self.repository.name} - {self.status}"
 
     def save_redundant_data_to_jobs(self):
-        for job in self.jobs.all():
-            job.save_job_stats_entry()
+        """
+        Saves the stats of the jobs that were waiting for the run event, and of the
+        jobs stored without stats nor staging, like the ones written by the release
+        before PendingJob while it was being deployed.
+        """
+        if self.workflow_id is None:
+            return
+        JobStats.objects.save_for_jobs(
+            self.jobs.filter(
+                Q(pending__isnull=False)
+                | ~Exists(JobStats.objects.filter(job=OuterRef("pk")))
+            )
+        )
+        self.pending_jobs.all().delete()
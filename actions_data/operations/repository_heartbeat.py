@@ -0,0 +1,167 @@
+"""
+Last time a webhook event was processed for each repository. Processing an event
+only records the time in a Redis hash, and the flush_repository_heartbeats task
+writes the recorded times to Repository.last_webhook_received with a single bulk
+update every minute, instead of every event writing the repository row.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterable
+
+import redis
+from django.conf import settings
+
+from actions_data.models import Repository
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_KEY = "repository_heartbeats"
+# Seconds between flushes of the heartbeats kept in a process
+LOCAL_FLUSH_INTERVAL = 60
+
+
+class RedisHeartbeatStore:
+    """Heartbeats recorded by every worker process, in a Redis hash."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self._connection = None
+
+    @property
+    def connection(self) -> redis.Redis:
+        if self._connection is None:
+            self._connection = redis.from_url(
+                settings.CELERY_BROKER_URL, ssl_cert_reqs=None
+            )
+        return self._connection
+
+    def record(self, heartbeats: dict[int, float]):
+        self.connection.hset(self.key, mapping=heartbeats)
+
+    def get(self, repository_ids: list[int]) -> dict[int, float]:
+        values = self.connection.hmget(self.key, repository_ids)
+        return {
+            repository_id: float(value)
+            for repository_id, value in zip(repository_ids, values)
+            if value is not None
+        }
+
+    def pop_all(self) -> dict[int, float]:
+        pipeline = self.connection.pipeline()
+        pipeline.hgetall(self.key)
+        pipeline.delete(self.key)
+        heartbeats, _ = pipeline.execute()
+        return {int(key): float(value) for key, value in heartbeats.items()}
+
+
+class LocalHeartbeatStore:
+    """Heartbeats recorded by the threads of one process."""
+
+    def __init__(self):
+        self.heartbeats = {}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+
+    def record(self, heartbeats: dict[int, float]):
+        with self.lock:
+            self.heartbeats.update(heartbeats)
+
+    def get(self, repository_ids: list[int]) -> dict[int, float]:
+        with self.lock:
+            return {
+                repository_id: self.heartbeats[repository_id]
+                for repository_id in repository_ids
+                if repository_id in self.heartbeats
+            }
+
+    def pop_all(self) -> dict[int, float]:
+        with self.lock:
+            heartbeats, self.heartbeats = self.heartbeats, {}
+            self.flushed_at = time.monotonic()
+        return heartbeats
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self.flushed_at >= LOCAL_FLUSH_INTERVAL
+
+
+LOCAL_HEARTBEATS = LocalHeartbeatStore()
+
+
+@lru_cache
+def get_redis_heartbeats() -> RedisHeartbeatStore:
+    return RedisHeartbeatStore(HEARTBEAT_KEY)
+
+
+def record_heartbeats(repository_ids: Iterable[int]):
+    """Records that webhook events of the repositories were just processed."""
+    now = time.time()
+    heartbeats = {repository_id: now for repository_id in repository_ids}
+    if not heartbeats:
+        return
+    if settings.REPOSITORY_HEARTBEAT_BACKEND == "redis":
+        try:
+            get_redis_heartbeats().record(heartbeats)
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Recording heartbeats in the process, Redis failed: {e}")
+    LOCAL_HEARTBEATS.record(heartbeats)
+    # Nothing else flushes the heartbeats of this process
+    if LOCAL_HEARTBEATS.is_due():
+        flush_heartbeats(LOCAL_HEARTBEATS.pop_all())
+
+
+def flush_heartbeats(heartbeats: dict[int, float]) -> int:
+    """Writes the heartbeats to their repositories, returning how many were written."""
+    repositories = [
+        Repository(id=repository_id, last_webhook_received=to_datetime(timestamp))
+        for repository_id, timestamp in heartbeats.items()
+    ]
+    return Repository.objects.bulk_update(repositories, ["last_webhook_received"])
+
+
+def flush_recorded_heartbeats() -> int:
+    """Writes the heartbeats recorded in Redis, and in this process."""
+    heartbeats = LOCAL_HEARTBEATS.pop_all()
+    if settings.REPOSITORY_HEARTBEAT_BACKEND == "redis":
+        for repository_id, timestamp in get_redis_heartbeats().pop_all().items():
+            heartbeats[repository_id] = max(timestamp, heartbeats.get(repository_id, 0))
+    return flush_heartbeats(heartbeats)
+
+
+def last_webhooks_received(
+    repositories: list[Repository],
+) -> dict[int, datetime | None]:
+    """
+    Last time a webhook event was processed for each repository, by id, including
+    the heartbeats that were not written to the repositories yet.
+    """
+    ids = [repository.id for repository in repositories]
+    pending = LOCAL_HEARTBEATS.get(ids) if ids else {}
+    if ids and settings.REPOSITORY_HEARTBEAT_BACKEND == "redis":
+        try:
+            pending |= get_redis_heartbeats().get(ids)
+        except redis.RedisError as e:
+            logger.warning(f"Reading stored heartbeats only, Redis failed: {e}")
+    return {
+        repository.id: max(
+            filter(
+                None,
+                [
+                    repository.last_webhook_received,
+                    to_datetime(pending.get(repository.id)),
+                ],
+            ),
+            default=None,
+        )
+        for repository in repositories
+    }
+
+
+def to_datetime(timestamp: float | None) -> datetime | None:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
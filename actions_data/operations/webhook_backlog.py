@@ -0,0 +1,46 @@
+"""
+Draining of the webhook event backlog by several processes at once. Each batch of
+events due for processing is claimed with SELECT ... FOR UPDATE SKIP LOCKED and
+processed in the transaction that holds the locks, so that concurrent drainers
+never claim the same events. Celery workers don't lock the events they process:
+an event processed by both is written twice, with the same result.
+"""
+
+from django.db import transaction
+
+from actions_data.metrics import flush_metrics
+from actions_data.models import WebhookEvent
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+from actions_data.operations.webhook_retry import record_failed_attempts
+
+
+def drain_backlog_batch(
+    batch_size: int, after_id: int = 0
+) -> dict[int, OperationResult]:
+    """
+    Claims up to `batch_size` events due for processing, with ids greater than
+    `after_id`, and processes them, returning the result of each event by id.
+    Failed events count an attempt, and are left for a later sweep.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.due_for_processing()
+            .filter(id__gt=after_id)
+            .select_for_update(skip_locked=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return {}
+        results = process_webhook_event_batch(events)
+        failed = [
+            event
+            for event in events
+            if results.get(event.id) == OperationResult.FAILURE
+        ]
+        if failed:
+            record_failed_attempts(failed)
+    flush_metrics()
+    return results
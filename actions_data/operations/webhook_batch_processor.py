@@ -0,0 +1,408 @@
+"""
+Processing of many webhook events at once, used for the batches published by the
+webhook buffer. The results are the same as processing the events one by one with
+process_webhook_event_instance in the order of their ids, but instead of the 25 to
+40 queries each event takes on its own, the runs referenced by the batch are
+prefetched in one query and every model is written with a single upsert.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils.timezone import now
+
+from actions_data.metrics import WEBHOOK_EVENTS_PROCESSED
+from actions_data.models import (
+    Job,
+    JobStats,
+    OwnerEntity,
+    PendingJob,
+    PullRequest,
+    Repository,
+    Step,
+    WebhookEvent,
+    Workflow,
+    WorkflowRun,
+)
+from actions_data.models.payload_projection import payload_fingerprint
+from actions_data.models.reference_cache import upsert_references
+from actions_data.models.upsert import upsert
+from actions_data.operations.repository_heartbeat import record_heartbeats
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_processor import (
+    prepare_webhook_event,
+    process_workflow_job_event,
+    process_workflow_run_event,
+)
+from actions_insider.middleware import validate_field_limits
+
+logger = logging.getLogger("celery")
+
+RunKey = tuple[int, int]
+
+OWNER_UPDATE_FIELDS = ["avatar_url", "entity_type", "login"]
+REPOSITORY_UPDATE_FIELDS = ["name", "owner"]
+PULL_REQUEST_UPDATE_FIELDS = ["number", "url"]
+WORKFLOW_UPDATE_FIELDS = [
+    "repository",
+    "node_id",
+    "name",
+    "path",
+    "state",
+    "url",
+    "html_url",
+]
+WORKFLOW_RUN_UPDATE_FIELDS = [
+    "name",
+    "node_id",
+    "head_branch",
+    "head_sha",
+    "path",
+    "display_title",
+    "run_number",
+    "event",
+    "status",
+    "conclusion",
+    "workflow",
+    "check_suite_id",
+    "check_suite_node_id",
+    "url",
+    "html_url",
+    "created_at",
+    "updated_at",
+    "actor",
+    "run_started_at",
+    "triggering_actor",
+    "jobs_url",
+    "logs_url",
+    "check_suite_url",
+    "artifacts_url",
+    "cancel_url",
+    "rerun_url",
+    "previous_attempt_url",
+    "workflow_url",
+    "head_commit",
+    "repository",
+    "head_repository",
+    "installation",
+    "fingerprint",
+]
+JOB_UPDATE_FIELDS = [
+    "workflow_run",
+    "node_id",
+    "url",
+    "html_url",
+    "name",
+    "status",
+    "conclusion",
+    "created_at",
+    "started_at",
+    "completed_at",
+    "updated_at",
+    "steps",
+    "check_run_url",
+    "labels",
+    "runner_id",
+    "runner_name",
+    "runner_group_id",
+    "runner_group_name",
+    "installation",
+    "fingerprint",
+]
+
+
+class WebhookEventBatch:
+    """
+    Rows written by a batch of events. Events must be added in the order of their
+    ids, so that rows referenced by several events get the data of the last one.
+    """
+
+    def __init__(
+        self, existing_runs: dict[RunKey, int], resolve_installations: bool = True
+    ):
+        # Ids of the runs referenced by job events that were already stored
+        self.existing_runs = existing_runs
+        # Otherwise runs get the installation the event was already associated with
+        self.resolve_installations = resolve_installations
+        self.owners: dict[int, OwnerEntity] = {}
+        self.repositories: dict[int, Repository] = {}
+        self.pull_requests: dict[int, PullRequest] = {}
+        self.workflows: dict[int, Workflow] = {}
+        self.runs: dict[RunKey, WorkflowRun] = {}
+        self.run_pull_requests: dict[RunKey, set[int]] = defaultdict(set)
+        # Runs that jobs are received for before the run itself
+        self.empty_runs: dict[RunKey, WorkflowRun] = {}
+        self.jobs: dict[int, tuple[Job, RunKey]] = {}
+        self.events: list[WebhookEvent] = []
+
+    def add_owner(self, data: dict) -> int:
+        owner = OwnerEntity(id=data["id"], **OwnerEntity.defaults_from_dict(data))
+        self.owners[owner.id] = owner
+        return owner.id
+
+    def add_repository(self, data: dict) -> int:
+        owner_id = self.add_owner(data.get("owner", {}))
+        repository = Repository(
+            id=data["id"], **Repository.objects.defaults_from_dict(data, owner_id)
+        )
+        self.repositories[repository.id] = repository
+        return repository.id
+
+    def add_workflow_run_event(self, event: WebhookEvent):
+        payload = event.parsed_payload
+        data = payload["workflow_run"]
+        key = (data["id"], data["run_attempt"])
+        run = WorkflowRun(
+            run_id=key[0],
+            run_attempt=key[1],
+            **WorkflowRun.objects.defaults_from_payload(data),
+        )
+        pull_requests = [
+            PullRequest(id=pr["id"], **PullRequest.defaults_from_dict(pr))
+            for pr in data.get("pull_requests", [])
+        ]
+        run.actor_id = self.add_owner(data.get("actor", {}))
+        run.triggering_actor_id = self.add_owner(data.get("triggering_actor", {}))
+        run.repository_id = self.add_repository(data.get("repository", {}))
+        if data.get("head_repository"):
+            run.head_repository_id = self.add_repository(data["head_repository"])
+        if payload.get("workflow"):
+            workflow_data = payload["workflow"]
+            self.workflows[workflow_data["id"]] = Workflow(
+                id=workflow_data["id"],
+                **Workflow.defaults_from_webhook_payload(
+                    workflow_data, run.repository_id
+                ),
+            )
+        for pull_request in pull_requests:
+            self.pull_requests[pull_request.id] = pull_request
+            self.run_pull_requests[key].add(pull_request.id)
+        if self.resolve_installations:
+            run.installation_id = event.associate_installation()
+        else:
+            run.installation_id = event.installation_id
+        run.fingerprint = payload_fingerprint(payload, run.installation_id)
+        self.runs[key] = run
+        self.events.append(event)
+
+    def add_workflow_job_event(self, event: WebhookEvent):
+        payload = event.parsed_payload
+        data = payload["workflow_job"]
+        key = (data["run_id"], data["run_attempt"])
+        job = Job(
+            id=data["id"],
+            installation_id=event.installation_id,
+            fingerprint=payload_fingerprint(payload, event.installation_id),
+            **Job.objects.defaults_from_payload(data),
+        )
+        if not (
+            key in self.existing_runs or key in self.runs or key in self.empty_runs
+        ):
+            self.empty_runs[key] = WorkflowRun(
+                run_id=key[0],
+                run_attempt=key[1],
+                repository_id=self.add_repository(payload["repository"]),
+            )
+        self.jobs[job.id] = (job, key)
+        self.events.append(event)
+
+    @transaction.atomic
+    def write(self):
+        upsert_references(list(self.owners.values()), update_fields=OWNER_UPDATE_FIELDS)
+        upsert_references(
+            list(self.repositories.values()), update_fields=REPOSITORY_UPDATE_FIELDS
+        )
+        upsert_references(
+            list(self.pull_requests.values()), update_fields=PULL_REQUEST_UPDATE_FIELDS
+        )
+        upsert_references(
+            list(self.workflows.values()), update_fields=WORKFLOW_UPDATE_FIELDS
+        )
+        run_ids = self.write_runs()
+        self.write_jobs(run_ids)
+        Step.objects.save_for_jobs([job for job, _ in self.jobs.values()])
+        self.write_job_stats(
+            jobs=[job for job, _ in self.jobs.values()],
+            run_ids=[run_ids[key] for key in self.runs],
+        )
+        processed_at = now()
+        for event in self.events:
+            event.processed_at = processed_at
+        WebhookEvent.objects.bulk_update(self.events, ["processed_at", "installation"])
+
+    def write_runs(self) -> dict[RunKey, int]:
+        upsert(
+            list(self.runs.values()),
+            unique_fields=["run_id", "run_attempt"],
+            update_fields=WORKFLOW_RUN_UPDATE_FIELDS,
+        )
+        empty_runs = [
+            run for key, run in self.empty_runs.items() if key not in self.runs
+        ]
+        # Runs written concurrently are left as they are
+        upsert(empty_runs, unique_fields=["run_id", "run_attempt"], update_fields=[])
+        run_ids = dict(self.existing_runs)
+        for run in [*self.runs.values(), *empty_runs]:
+            run_ids[(run.run_id, run.run_attempt)] = run.id
+
+        event_runs = {}
+        for event in self.events:
+            if event.event == "workflow_run":
+                data = event.parsed_payload["workflow_run"]
+                event_runs[event.id] = run_ids[(data["id"], data["run_attempt"])]
+        WorkflowRun.webhook_events.through.objects.bulk_create(
+            [
+                WorkflowRun.webhook_events.through(
+                    workflowrun_id=run_id, webhookevent_id=event_id
+                )
+                for event_id, run_id in event_runs.items()
+            ],
+            ignore_conflicts=True,
+        )
+        WorkflowRun.pull_requests.through.objects.bulk_create(
+            [
+                WorkflowRun.pull_requests.through(
+                    workflowrun_id=run_ids[key], pullrequest_id=pull_request_id
+                )
+                for key, pull_request_ids in self.run_pull_requests.items()
+                for pull_request_id in pull_request_ids
+            ],
+            ignore_conflicts=True,
+        )
+        return run_ids
+
+    def write_jobs(self, run_ids: dict[RunKey, int]):
+        for job, key in self.jobs.values():
+            job.workflow_run_id = run_ids[key]
+        jobs = [job for job, _ in self.jobs.values()]
+        validate_field_limits(jobs)
+        Job.objects.bulk_create(
+            jobs,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=JOB_UPDATE_FIELDS,
+        )
+
+        event_jobs = {
+            event.id: event.parsed_payload["workflow_job"]["id"]
+            for event in self.events
+            if event.event == "workflow_job"
+        }
+        Job.webhook_events.through.objects.bulk_create(
+            [
+                Job.webhook_events.through(job_id=job_id, webhookevent_id=event_id)
+                for event_id, job_id in event_jobs.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def write_job_stats(jobs: list[Job], run_ids: list[int]):
+        """
+        Writes the stats of the jobs of the batch, and of the jobs that were
+        waiting for the runs of the batch or stored without stats, like processing
+        the events one by one would.
+        """
+        ready = Job.objects.stage_until_run_is_known(jobs)
+        pending = PendingJob.objects.filter(
+            workflow_run_id__in=run_ids, workflow_run__workflow__isnull=False
+        )
+        JobStats.objects.save_for_jobs(
+            Job.objects.filter(
+                Q(id__in=[job.id for job in ready])
+                | Q(pending__in=pending)
+                | Q(
+                    ~Exists(JobStats.objects.filter(job=OuterRef("pk"))),
+                    workflow_run_id__in=run_ids,
+                )
+            )
+        )
+        pending.delete()
+
+
+def prefetch_existing_runs(events: list[WebhookEvent]) -> dict[RunKey, int]:
+    """Ids of the stored runs that the job events of the batch belong to."""
+    keys = {
+        (
+            event.parsed_payload["workflow_job"]["run_id"],
+            event.parsed_payload["workflow_job"]["run_attempt"],
+        )
+        for event in events
+        if event.event == "workflow_job"
+    }
+    if not keys:
+        return {}
+    runs = WorkflowRun.objects.filter(
+        run_id__in={run_id for run_id, _ in keys}
+    ).values_list("run_id", "run_attempt", "id")
+    return {
+        (run_id, run_attempt): id
+        for run_id, run_attempt, id in runs
+        if (run_id, run_attempt) in keys
+    }
+
+
+def process_webhook_event_batch(
+    events: list[WebhookEvent],
+) -> dict[int, OperationResult]:
+    """
+    Processes the events, which must be ordered by id, returning the result of
+    each event by id. When the batch can't be written as a whole, its events are
+    processed one by one, so that a single event can't fail the others.
+    """
+    results = {}
+    processable = []
+    # Non processable events are deleted, which unsets their id
+    processed = [(event.id, event.event) for event in events]
+    for (event_id, _), event in zip(processed, events):
+        result = prepare_webhook_event(event)
+        if result is None:
+            processable.append(event)
+        else:
+            results[event_id] = result
+
+    batch = None
+    try:
+        batch = WebhookEventBatch(prefetch_existing_runs(processable))
+    except Exception as e:
+        logger.exception(f"Failed to prefetch the runs of the batch. Exception: {e}")
+    if batch is not None:
+        for event in processable:
+            try:
+                match event.event:
+                    case "workflow_run":
+                        batch.add_workflow_run_event(event)
+                    case "workflow_job":
+                        batch.add_workflow_job_event(event)
+            except Exception as e:
+                logger.exception(
+                    f"Failed to process {event.event} event: {event}. Exception: {e}"
+                )
+                event.last_error = repr(e)
+                results[event.id] = OperationResult.FAILURE
+        try:
+            batch.write()
+            for event in batch.events:
+                results[event.id] = OperationResult.SUCCESS
+            record_heartbeats(
+                {event.parsed_payload["repository"]["id"] for event in batch.events}
+            )
+        except Exception as e:
+            logger.warning(
+                f"Processing the events of a failed batch one by one. Exception: {e}"
+            )
+            batch = None
+    if batch is None:
+        for event in processable:
+            if event.id in results:
+                continue
+            if event.event == "workflow_run":
+                results[event.id] = process_workflow_run_event(event)
+            else:
+                results[event.id] = process_workflow_job_event(event)
+
+    for event_id, event_type in processed:
+        WEBHOOK_EVENTS_PROCESSED.inc(event=event_type, result=results[event_id].value)
+    return results
@@ -0,0 +1,296 @@
+import json
+import logging
+import threading
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from actions_data.metrics import (
+    WEBHOOK_DUPLICATE_DELIVERIES,
+    WEBHOOK_INGESTION_DURATION,
+)
+from actions_data.models import WebhookEvent
+from actions_data.operations.webhook_routing import (
+    repository_id_from_body,
+    webhook_queue,
+)
+from actions_data.tasks import process_webhook_events
+
+logger = logging.getLogger(__name__)
+
+BEFORE_FLUSH = "before_flush"
+AFTER_FLUSH = "after_flush"
+ACK_TTL_SECONDS = 60
+
+
+class RedisListStore:
+    """Buffer store shared by every web process, backed by a Redis list."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self._connection = None
+
+    @property
+    def connection(self) -> redis.Redis:
+        if self._connection is None:
+            self._connection = redis.from_url(
+                settings.CELERY_BROKER_URL, ssl_cert_reqs=None
+            )
+        return self._connection
+
+    def _ack_key(self, token: str) -> str:
+        return f"{self.key}:ack:{token}"
+
+    def push(self, entry: str) -> int:
+        return self.connection.rpush(self.key, entry)
+
+    def pop_batch(self, size: int) -> list[str]:
+        return [entry.decode() for entry in self.connection.lpop(self.key, size) or []]
+
+    def requeue(self, entries: list[str]):
+        if entries:
+            self.connection.lpush(self.key, *reversed(entries))
+
+    def length(self) -> int:
+        return self.connection.llen(self.key)
+
+    def mark_flushed(self, tokens: list[str], written: bool = True):
+        pipeline = self.connection.pipeline(transaction=False)
+        for token in tokens:
+            pipeline.rpush(self._ack_key(token), int(written))
+            pipeline.expire(self._ack_key(token), ACK_TTL_SECONDS)
+        pipeline.execute()
+
+    def pop_flushed(self, token: str) -> bool | None:
+        ack = self.connection.lpop(self._ack_key(token))
+        return None if ack is None else ack == b"1"
+
+    def wait_flushed(self, token: str, timeout: float) -> bool | None:
+        ack = self.connection.blpop([self._ack_key(token)], timeout)
+        return None if ack is None else ack[1] == b"1"
+
+
+class LocalListStore:
+    """In-memory buffer store, only shared between threads of one process."""
+
+    def __init__(self):
+        self.entries = deque()
+        # Whether each flushed delivery was written, by token
+        self.flushed = {}
+        self.condition = threading.Condition()
+
+    def push(self, entry: str) -> int:
+        with self.condition:
+            self.entries.append(entry)
+            return len(self.entries)
+
+    def pop_batch(self, size: int) -> list[str]:
+        with self.condition:
+            return [self.entries.popleft() for _ in range(min(size, len(self.entries)))]
+
+    def requeue(self, entries: list[str]):
+        with self.condition:
+            self.entries.extendleft(reversed(entries))
+
+    def length(self) -> int:
+        return len(self.entries)
+
+    def mark_flushed(self, tokens: list[str], written: bool = True):
+        with self.condition:
+            self.flushed.update(dict.fromkeys(tokens, written))
+            self.condition.notify_all()
+
+    def pop_flushed(self, token: str) -> bool | None:
+        with self.condition:
+            return self.flushed.pop(token, None)
+
+    def wait_flushed(self, token: str, timeout: float) -> bool | None:
+        with self.condition:
+            self.condition.wait_for(lambda: token in self.flushed, timeout)
+        return self.pop_flushed(token)
+
+    def clear(self):
+        with self.condition:
+            self.entries.clear()
+            self.flushed.clear()
+
+
+LOCAL_STORE = LocalListStore()
+LOCAL_OVERFLOW_STORE = LocalListStore()
+
+
+@dataclass
+class BufferedDelivery:
+    token: str
+    buffer_length: int
+
+
+class WebhookBuffer:
+    """
+    Collects webhook deliveries and writes them to the database in batches,
+    publishing a single Celery message per batch.
+    """
+
+    def __init__(self, store, flush_size: int, flush_interval_ms: int):
+        self.store = store
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+
+    def append(
+        self, body: str, headers: dict, user_id, wait_for_flush: bool = False
+    ) -> BufferedDelivery:
+        token = uuid.uuid4().hex
+        entry = {
+            "token": token,
+            "headers": headers,
+            "body": body,
+            "user_id": user_id,
+            "ack": wait_for_flush,
+        }
+        length = self.store.push(json.dumps(entry))
+        return BufferedDelivery(token=token, buffer_length=length)
+
+    def is_full(self, delivery: BufferedDelivery) -> bool:
+        return delivery.buffer_length >= self.flush_size
+
+    def length(self) -> int:
+        return self.store.length()
+
+    def flush(self) -> list[int]:
+        """Write up to `flush_size` buffered deliveries and enqueue them for processing."""
+        raw_entries = self.store.pop_batch(self.flush_size)
+        if not raw_entries:
+            return []
+        entries = []
+        for raw_entry in raw_entries:
+            try:
+                entries.append(json.loads(raw_entry))
+            except json.JSONDecodeError:
+                # Never written by append(), there is no sender to acknowledge
+                logger.error(f"Dropping malformed buffer entry: {raw_entry}")
+        try:
+            event_ids, dropped = self._write_entries(entries)
+        except Exception:
+            self.store.requeue(raw_entries)
+            raise
+        acknowledged = [entry["token"] for entry in entries if entry["ack"]]
+        written = [token for token in acknowledged if token not in dropped]
+        if written:
+            self.store.mark_flushed(written)
+        if len(written) < len(acknowledged):
+            self.store.mark_flushed(
+                [token for token in acknowledged if token in dropped], written=False
+            )
+        return event_ids
+
+    def drain(self, limit: int | None = None) -> int:
+        """Flush until the buffer is empty, or at least `limit` deliveries were flushed."""
+        flushed = 0
+        while self.store.length() and (limit is None or flushed < limit):
+            flushed += len(self.flush())
+        return flushed
+
+    def flush_until_written(self, delivery: BufferedDelivery) -> bool:
+        """
+        Flush until the given delivery is in the database, and return True, or
+        return False if it was dropped or it timed out.
+        """
+        while (written := self.store.pop_flushed(delivery.token)) is None:
+            if not self.store.length():
+                # Another process popped our delivery and is still writing it
+                return bool(
+                    self.store.wait_flushed(delivery.token, self.flush_interval)
+                )
+            self.flush()
+        return written
+
+    @staticmethod
+    def _write_entries(entries: list[dict]) -> tuple[list[int], set[str]]:
+        """
+        Writes the entries, and returns the ids of the inserted events along with
+        the tokens of the entries dropped for their invalid JSON.
+        """
+        events = []
+        repository_ids = []
+        dropped = set()
+        with WEBHOOK_INGESTION_DURATION.time(stage="parse"):
+            for entry in entries:
+                body = entry["body"].encode()
+                try:
+                    event = WebhookEvent.objects.build_from_headers_and_body(
+                        headers=entry["headers"],
+                        body=body,
+                        user_id=entry["user_id"],
+                    )
+                except json.JSONDecodeError:
+                    logger.error(
+                        f"Dropping buffered delivery with invalid JSON: {entry}"
+                    )
+                    dropped.add(entry["token"])
+                    continue
+                events.append(event)
+                repository_ids.append(repository_id_from_body(body))
+        with transaction.atomic():
+            with WEBHOOK_INGESTION_DURATION.time(stage="insert"):
+                created = WebhookEvent.objects.bulk_insert_or_ignore(events)
+            event_ids = [event.id for event in created]
+            if event_ids:
+                # Events that were not inserted have no id
+                published = {
+                    event.id: repository_id
+                    for event, repository_id in zip(events, repository_ids)
+                    if event.id is not None
+                }
+                transaction.on_commit(lambda: publish_webhook_events(published))
+        if len(created) < len(events):
+            for event in events:
+                if event.id is None:
+                    WEBHOOK_DUPLICATE_DELIVERIES.inc(event=event.event)
+            logger.info(f"Dropped {len(events) - len(created)} duplicate deliveries")
+        logger.debug(f"Flushed {len(event_ids)} buffered webhook events")
+        return event_ids, dropped
+
+
+def publish_webhook_events(events: dict[int, int | None]):
+    """Publishes the events, by id with their repository id, one batch per queue."""
+    batches = defaultdict(list)
+    for event_id, repository_id in events.items():
+        batches[webhook_queue(repository_id)].append(event_id)
+    with WEBHOOK_INGESTION_DURATION.time(stage="enqueue"):
+        for queue, event_ids in batches.items():
+            process_webhook_events.apply_async((event_ids,), queue=queue)
+
+
+@lru_cache
+def get_redis_store(key: str) -> RedisListStore:
+    return RedisListStore(key)
+
+
+def get_webhook_buffer() -> WebhookBuffer:
+    if settings.WEBHOOK_BUFFER_BACKEND == "local":
+        store = LOCAL_STORE
+    else:
+        store = get_redis_store(settings.WEBHOOK_BUFFER_KEY)
+    return WebhookBuffer(
+        store=store,
+        flush_size=settings.WEBHOOK_BUFFER_FLUSH_SIZE,
+        flush_interval_ms=settings.WEBHOOK_BUFFER_FLUSH_INTERVAL_MS,
+    )
+
+
+def get_overflow_buffer() -> WebhookBuffer:
+    """Buffer where deliveries over the rate limit are parked, with the shed mode."""
+    if settings.WEBHOOK_RATE_LIMIT_BACKEND == "local":
+        store = LOCAL_OVERFLOW_STORE
+    else:
+        store = get_redis_store(settings.WEBHOOK_OVERFLOW_KEY)
+    return WebhookBuffer(
+        store=store,
+        flush_size=settings.WEBHOOK_BUFFER_FLUSH_SIZE,
+        flush_interval_ms=settings.WEBHOOK_BUFFER_FLUSH_INTERVAL_MS,
+    )
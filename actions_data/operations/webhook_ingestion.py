@@ -0,0 +1,207 @@
+import json
+import logging
+import re
+
+import redis
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from actions_data.metrics import (
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_DUPLICATE_DELIVERIES,
+    WEBHOOK_INGESTION_DURATION,
+    WEBHOOK_RATE_LIMITED,
+)
+from actions_data.models import WebhookEvent
+from actions_data.models.webhook_event import (
+    DELIVERY_HEADER,
+    EVENT_HEADER,
+    PROCESSABLE_EVENT_TYPES,
+    WEBHOOK_HEADERS,
+)
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_buffer import (
+    AFTER_FLUSH,
+    get_overflow_buffer,
+    get_webhook_buffer,
+)
+from actions_data.operations.webhook_rate_limit import (
+    RATE_LIMIT_OFF,
+    RATE_LIMIT_SHED,
+    bucket_key,
+    take_token,
+)
+from actions_data.operations.webhook_routing import (
+    repository_id_from_body,
+    webhook_queue,
+)
+from actions_data.tasks import process_webhook_event
+
+logger = logging.getLogger(__name__)
+
+ACCEPT_POLICY = "accept"
+COUNT_POLICY = "count"
+DROP_POLICY = "drop"
+
+# GitHub sends "action" as the first key of the payload
+ACTION_PATTERN = re.compile(rb'^\s*\{\s*"action"\s*:\s*"([^"\\]*)"')
+
+
+def extract_webhook_headers(headers) -> dict:
+    return {name: headers.get(name) for name in WEBHOOK_HEADERS}
+
+
+def ingest_directly(body: bytes, headers, user_id) -> OperationResult:
+    with WEBHOOK_INGESTION_DURATION.time(stage="parse"):
+        event = WebhookEvent.objects.build_from_headers_and_body(
+            headers=headers, body=body, user_id=user_id
+        )
+    with WEBHOOK_INGESTION_DURATION.time(stage="insert"):
+        created_event = WebhookEvent.objects.insert_or_ignore(event)
+    if created_event is None:
+        logger.info(f"Dropping duplicate delivery {headers.get(DELIVERY_HEADER)}")
+        WEBHOOK_DUPLICATE_DELIVERIES.inc(event=headers.get(EVENT_HEADER))
+        return OperationResult.NOOP
+    with WEBHOOK_INGESTION_DURATION.time(stage="enqueue"):
+        process_webhook_event.apply_async(
+            (created_event.id,), queue=webhook_queue(repository_id_from_body(body))
+        )
+    return OperationResult.SUCCESS
+
+
+async def aingest_directly(body: bytes, headers, user_id) -> OperationResult:
+    async with WEBHOOK_INGESTION_DURATION.atime(stage="parse"):
+        event = WebhookEvent.objects.build_from_headers_and_body(
+            headers=headers, body=body, user_id=user_id
+        )
+    async with WEBHOOK_INGESTION_DURATION.atime(stage="insert"):
+        created_event = await WebhookEvent.objects.ainsert_or_ignore(event)
+    if created_event is None:
+        logger.info(f"Dropping duplicate delivery {headers.get(DELIVERY_HEADER)}")
+        await WEBHOOK_DUPLICATE_DELIVERIES.ainc(event=headers.get(EVENT_HEADER))
+        return OperationResult.NOOP
+    # Publishing doesn't touch the database, so it doesn't have to wait for the
+    # database thread
+    async with WEBHOOK_INGESTION_DURATION.atime(stage="enqueue"):
+        await sync_to_async(process_webhook_event.apply_async, thread_sensitive=False)(
+            (created_event.id,), queue=webhook_queue(repository_id_from_body(body))
+        )
+    return OperationResult.SUCCESS
+
+
+def ingest_buffered(body: bytes, headers, user_id) -> OperationResult:
+    """
+    Appends the delivery to the webhook buffer. Returns SUCCESS once the delivery
+    is in the database, IN_PROGRESS if it is only buffered, or FAILURE if it could
+    not be written in time, in which case GitHub shows the delivery as failed but
+    it stays buffered and is still written by the next flush, or if it was dropped
+    for its invalid JSON.
+    """
+    buffer = get_webhook_buffer()
+    wait_for_flush = settings.WEBHOOK_BUFFER_ACK == AFTER_FLUSH
+    delivery = buffer.append(
+        body=body.decode(),
+        headers=extract_webhook_headers(headers),
+        user_id=user_id,
+        wait_for_flush=wait_for_flush,
+    )
+    if wait_for_flush:
+        if buffer.flush_until_written(delivery):
+            return OperationResult.SUCCESS
+        logger.warning(f"Buffered delivery {delivery.token} timed out or was dropped")
+        return OperationResult.FAILURE
+    if buffer.is_full(delivery):
+        buffer.flush()
+    return OperationResult.IN_PROGRESS
+
+
+def peek_action(body: bytes) -> str | None:
+    """Reads the action of a delivery, without parsing the whole body if possible."""
+    match = ACTION_PATTERN.match(body)
+    if match:
+        return match.group(1).decode()
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        return None
+    return payload.get("action") if isinstance(payload, dict) else None
+
+
+def apply_ingress_policy(body: bytes, headers) -> bool:
+    """
+    Counts the delivery according to WEBHOOK_INGRESS_POLICY and returns whether
+    it should be ingested. With the "drop" policy, deliveries that would be
+    deleted by the processor are never written nor published.
+    """
+    policy = settings.WEBHOOK_INGRESS_POLICY
+    if policy == ACCEPT_POLICY:
+        return True
+    event_type = headers.get(EVENT_HEADER)
+    action = peek_action(body) if event_type in PROCESSABLE_EVENT_TYPES else None
+    accepted = policy != DROP_POLICY or WebhookEvent.is_processable(event_type, action)
+    WEBHOOK_DELIVERIES.inc(
+        event=event_type,
+        action=action,
+        outcome="accepted" if accepted else "dropped",
+    )
+    return accepted
+
+
+def apply_rate_limit(body: bytes, headers, user_id) -> OperationResult | None:
+    """
+    Takes a token from the rate limit bucket of the delivery's installation
+    target. Returns None if the delivery can be ingested, otherwise FAILURE when
+    rejecting deliveries over the limit, or IN_PROGRESS when they are shed to the
+    overflow buffer, to be ingested later by the drain_webhook_overflow task.
+    """
+    host, target_id = bucket_key(headers)
+    if take_token(host, target_id):
+        return None
+    if settings.WEBHOOK_RATE_LIMIT == RATE_LIMIT_SHED:
+        try:
+            get_overflow_buffer().append(
+                body=body.decode(),
+                headers=extract_webhook_headers(headers),
+                user_id=user_id,
+            )
+        except redis.RedisError as e:
+            # Better over the limit than lost
+            logger.warning(f"Ingesting delivery over the rate limit, Redis failed: {e}")
+            return None
+        outcome, result = "shed", OperationResult.IN_PROGRESS
+    else:
+        outcome, result = "rejected", OperationResult.FAILURE
+    logger.info(f"Delivery over the rate limit of {host}:{target_id} {outcome}")
+    WEBHOOK_RATE_LIMITED.inc(host=host, outcome=outcome)
+    return result
+
+
+def ingest_webhook(body: bytes, headers, user_id) -> OperationResult:
+    if not apply_ingress_policy(body, headers):
+        return OperationResult.NOOP
+    if settings.WEBHOOK_RATE_LIMIT != RATE_LIMIT_OFF:
+        rate_limited_result = apply_rate_limit(body, headers, user_id)
+        if rate_limited_result is not None:
+            return rate_limited_result
+    if settings.WEBHOOK_INGESTION_MODE == "buffered":
+        return ingest_buffered(body, headers, user_id)
+    return ingest_directly(body, headers, user_id)
+
+
+async def aingest_webhook(body: bytes, headers, user_id) -> OperationResult:
+    """Async variant of ingest_webhook, for the ASGI webhook view."""
+    # The accept policy doesn't count deliveries, skip the thread switch
+    if settings.WEBHOOK_INGRESS_POLICY != ACCEPT_POLICY and not await sync_to_async(
+        apply_ingress_policy
+    )(body, headers):
+        return OperationResult.NOOP
+    if settings.WEBHOOK_RATE_LIMIT != RATE_LIMIT_OFF:
+        rate_limited_result = await sync_to_async(apply_rate_limit)(
+            body, headers, user_id
+        )
+        if rate_limited_result is not None:
+            return rate_limited_result
+    if settings.WEBHOOK_INGESTION_MODE == "buffered":
+        return await sync_to_async(ingest_buffered)(body, headers, user_id)
+    return await aingest_directly(body, headers, user_id)
@@ -0,0 +1,199 @@
+"""
+Maintenance of the monthly partitions of the WebhookEvent table, created by
+migration 0101_partition_webhookevent: partitions are created ahead of time, so
+that events don't land in the default partition, and dropped once all their
+events are processed and older than the retention period.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from actions_data.models import WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+TABLE = "actions_data_webhookevent"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_PREFIX = f"{TABLE}_p"
+
+# Tables referencing webhook events, without foreign key constraints since
+# partitioned tables can't be referenced, with the column holding the event id.
+REFERENCING_TABLES = (
+    ("actions_data_job_webhook_events", "webhookevent_id"),
+    ("actions_data_workflowrun_webhook_events", "webhookevent_id"),
+    ("actions_data_webhookeventarchive", "event_id"),
+)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+
+    @classmethod
+    def for_month(cls, month: date) -> "Partition":
+        month = month.replace(day=1)
+        return cls(
+            name=f"{PARTITION_PREFIX}{month:%Y%m}",
+            start=datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+            end=datetime.combine(
+                next_month(month), datetime.min.time(), tzinfo=dt_timezone.utc
+            ),
+        )
+
+    @classmethod
+    def from_name(cls, name: str) -> "Partition":
+        month = datetime.strptime(name.removeprefix(PARTITION_PREFIX), "%Y%m")
+        return cls.for_month(month.date())
+
+
+def list_partitions() -> list[Partition]:
+    """Monthly partitions of the WebhookEvent table, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(
+        (Partition.from_name(name) for name in names if name != DEFAULT_PARTITION),
+        key=lambda partition: partition.start,
+    )
+
+
+def missing_partitions(months_ahead: int) -> list[Partition]:
+    """Partitions from the current month to months_ahead months from now that don't exist yet."""
+    existing = set(list_partitions())
+    month = timezone.now().date().replace(day=1)
+    missing = []
+    for _ in range(months_ahead + 1):
+        partition = Partition.for_month(month)
+        if partition not in existing:
+            missing.append(partition)
+        month = next_month(month)
+    return missing
+
+
+def expired_partitions(retention_days: int) -> list[Partition]:
+    """Partitions older than the retention period with no unprocessed events."""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = []
+    with connection.cursor() as cursor:
+        for partition in list_partitions():
+            if partition.end > cutoff:
+                break
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {partition.name} WHERE processed_at IS NULL)"
+            )
+            if cursor.fetchone()[0]:
+                logger.warning(
+                    f"Keeping expired partition {partition.name} with unprocessed events"
+                )
+                continue
+            expired.append(partition)
+    return expired
+
+
+@transaction.atomic
+def create_partition(partition: Partition):
+    """
+    Creates the partition, moving into it the events of its range that landed in
+    the default partition, which would otherwise prevent attaching it.
+    """
+    start, end = partition.start.isoformat(), partition.end.isoformat()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TABLE {partition.name} (
+                LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO {partition.name} SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        if cursor.rowcount:
+            logger.info(
+                f"Moved {cursor.rowcount} events from {DEFAULT_PARTITION} to {partition.name}"
+            )
+        cursor.execute(
+            f"""
+            ALTER TABLE {TABLE} ATTACH PARTITION {partition.name}
+            FOR VALUES FROM ('{start}') TO ('{end}')
+            """
+        )
+
+
+@transaction.atomic
+def drop_partition(partition: Partition):
+    """Drops the partition along with the rows referencing its events."""
+    with connection.cursor() as cursor:
+        # Tables can't be dropped with deferred foreign key checks pending on them
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        for table, column in REFERENCING_TABLES:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {column} IN (SELECT id FROM {partition.name})"
+            )
+        cursor.execute(f"DROP TABLE {partition.name}")
+    # GitHub only redelivers recent events, older deliveries can't be duplicated
+    WebhookDelivery.objects.filter(created_at__lt=partition.end).delete()
+
+
+def dangling_references() -> dict[str, int]:
+    """
+    Number of rows of each of REFERENCING_TABLES whose event doesn't exist, as no
+    foreign key constraint prevents them. Dropping a partition deletes the rows
+    referencing its events, so any found here are left over by another path.
+    """
+    counts = {}
+    with connection.cursor() as cursor:
+        for table, column in REFERENCING_TABLES:
+            cursor.execute(
+                f"""
+                SELECT COUNT(*) FROM {table}
+                WHERE NOT EXISTS (SELECT 1 FROM {TABLE} WHERE {TABLE}.id = {table}.{column})
+                """
+            )
+            counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def maintain_partitions(
+    months_ahead: int | None = None, retention_days: int | None = None
+) -> tuple[list[Partition], list[Partition]]:
+    """Creates missing partitions and drops expired ones, returning both lists."""
+    if months_ahead is None:
+        months_ahead = settings.WEBHOOK_EVENT_PARTITIONS_AHEAD
+    if retention_days is None:
+        retention_days = settings.WEBHOOK_EVENT_RETENTION_DAYS
+
+    created = missing_partitions(months_ahead)
+    for partition in created:
+        create_partition(partition)
+    dropped = expired_partitions(retention_days)
+    for partition in dropped:
+        drop_partition(partition)
+    return created, dropped
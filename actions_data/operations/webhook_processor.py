@@ -1,64 +1,119 @@
+import json
 import logging
+import time
+import zlib
 
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import transaction
 from django.utils.timezone import now
 
+from actions_data.metrics import (
+    WEBHOOK_EVENT_PROCESSING_DURATION,
+    WEBHOOK_EVENTS_PROCESSED,
+)
 from actions_data.models import WebhookEvent, Job, WorkflowRun
+from actions_data.operations.repository_heartbeat import record_heartbeats
 from actions_data.operations.schemas import OperationResult
 
 logger = logging.getLogger("celery")
 
 
+def settle_processed_event(event: WebhookEvent):
+    event.processed_at = now()
+    event.save(update_fields=["processed_at", "installation"])
+    record_heartbeats([event.parsed_payload["repository"]["id"]])
+
+
 def process_workflow_run_event(event: WebhookEvent) -> OperationResult:
     try:
         result = WorkflowRun.objects.get_or_create_from_webhook_event(event)
+        settle_processed_event(event)
+        if result is None:
+            logger.debug(f"Skipped unchanged workflow run event: {event}")
+            return OperationResult.NOOP
         logger.debug(f"Successfully processed workflow run event: {result}")
-        event.processed_at = now()
-        event.save()
         return OperationResult.SUCCESS
     except Exception as e:
         logger.exception(
             f"Failed to process workflow run event: {event}. Exception: {e}",
             exc_info=True,
         )
+        event.last_error = repr(e)
         return OperationResult.FAILURE
 
 
 def process_workflow_job_event(event: WebhookEvent) -> OperationResult:
     try:
         result = Job.objects.get_or_create_from_webhook_event(event)
+        settle_processed_event(event)
+        if result is None:
+            logger.debug(f"Skipped unchanged workflow job event: {event}")
+            return OperationResult.NOOP
         logger.debug(f"Successfully processed workflow job event: {result}")
-        event.processed_at = now()
-        event.save()
         return OperationResult.SUCCESS
-    except ValidationError as e:
-        if "Job stats with this Job already exists" in str(e):
-            logger.info(f"JobStat already exists for the job in this event: {event}")
-            return OperationResult.NOOP
-        logger.exception(
-            f"Failed to process workflow job event: {event}. Exception: {e}",
-            exc_info=True,
-        )
     except Exception as e:
         logger.exception(
             f"Failed to process workflow job event: {event}. Exception: {e}",
             exc_info=True,
         )
-    return OperationResult.FAILURE
+        event.last_error = repr(e)
+        return OperationResult.FAILURE
 
 
 def process_webhook_event_instance(event: WebhookEvent) -> OperationResult:
-    if event.is_processable_webhook_event:
-        match event.event:
-            case "workflow_run":
-                return process_workflow_run_event(event)
-            case "workflow_job":
-                return process_workflow_job_event(event)
-            case _:
-                raise ValueError(
-                    f"Unexpectedly processing unsupported event type: {event.event}"
-                )
-    else:
+    start = time.perf_counter()
+    result = dispatch_webhook_event(event)
+    WEBHOOK_EVENT_PROCESSING_DURATION.observe(
+        time.perf_counter() - start, event=event.event
+    )
+    WEBHOOK_EVENTS_PROCESSED.inc(event=event.event, result=result.value)
+    return result
+
+
+def dispatch_webhook_event(event: WebhookEvent) -> OperationResult:
+    result = prepare_webhook_event(event)
+    if result is not None:
+        return result
+    match event.event:
+        case "workflow_run":
+            return process_workflow_run_event(event)
+        case "workflow_job":
+            return process_workflow_job_event(event)
+        case _:
+            raise ValueError(
+                f"Unexpectedly processing unsupported event type: {event.event}"
+            )
+
+
+def prepare_webhook_event(event: WebhookEvent) -> OperationResult | None:
+    """
+    Gets a processable event ready to be processed, returning None, or settles
+    the events that won't be processed, returning their result.
+    """
+    try:
+        is_processable = event.is_processable_webhook_event
+    except (json.JSONDecodeError, zlib.error) as e:
+        logger.error(f"Failed to parse raw payload of event: {event}. Exception: {e}")
+        event.last_error = repr(e)
+        return OperationResult.FAILURE
+    if not is_processable:
         logger.debug(f"Deleting non processable event: {event}")
         event.delete()
         return OperationResult.NOOP
+    associate = event.installation_id is None
+    compact = settings.WEBHOOK_PAYLOAD_PROJECTION and event.projection_version is None
+    if not associate and not compact:
+        return None
+    try:
+        # A savepoint, so that a failed query doesn't abort the rest of a batch
+        with transaction.atomic():
+            if associate:
+                # Events stored as raw bodies get their installation once parsed
+                event.associate_installation()
+            if compact:
+                event.compact()
+    except Exception as e:
+        logger.exception(f"Failed to prepare event: {event}. Exception: {e}")
+        event.last_error = repr(e)
+        return OperationResult.FAILURE
+    return None
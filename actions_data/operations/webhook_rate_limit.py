@@ -0,0 +1,121 @@
+"""
+Token bucket rate limiting of webhook deliveries, with one bucket per installation
+target (the account or repository the webhook is installed on) and host. Buckets
+hold up to WEBHOOK_RATE_LIMIT_BURST deliveries and are refilled with
+WEBHOOK_RATE_LIMIT_RATE deliveries per second.
+"""
+
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+from actions_data.models.webhook_event import (
+    DEFAULT_HOST,
+    ENTERPRISE_HOST_HEADER,
+    HOOK_ID_HEADER,
+    HOOK_INSTALLATION_TARGET_ID_HEADER,
+)
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_OFF = "off"
+RATE_LIMIT_REJECT = "reject"
+RATE_LIMIT_SHED = "shed"
+
+BUCKET_KEY_PREFIX = "webhook_rate_limit"
+
+# Refills the bucket for the time elapsed since it was last updated, and takes a
+# token from it if there is one. Uses the Redis clock, so that every process
+# refills buckets the same way.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local taken = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    taken = 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return taken
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by every web process, stored in Redis hashes."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            connection = redis.from_url(settings.CELERY_BROKER_URL, ssl_cert_reqs=None)
+            self._script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def take(self, key: str, rate: float, burst: int) -> bool:
+        return bool(self.script(keys=[f"{self.prefix}:{key}"], args=[rate, burst]))
+
+
+class LocalBucketStore:
+    """In-memory token buckets, only shared between threads of one process."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            taken = tokens >= 1
+            self.buckets[key] = (tokens - 1 if taken else tokens), now
+        return taken
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+LOCAL_BUCKETS = LocalBucketStore()
+
+
+@lru_cache
+def get_redis_buckets() -> RedisBucketStore:
+    return RedisBucketStore(BUCKET_KEY_PREFIX)
+
+
+def bucket_key(headers) -> tuple[str, str]:
+    """The host and installation target a delivery is rate limited by."""
+    host = headers.get(ENTERPRISE_HOST_HEADER) or DEFAULT_HOST
+    # Older GitHub Enterprise Server versions don't send the installation target
+    target_id = headers.get(HOOK_INSTALLATION_TARGET_ID_HEADER) or (
+        f"hook-{headers.get(HOOK_ID_HEADER)}"
+    )
+    return host, target_id
+
+
+def take_token(host: str, target_id: str) -> bool:
+    """Takes a token from the bucket of the installation target, if there's one left."""
+    key = f"{host}:{target_id}"
+    rate = settings.WEBHOOK_RATE_LIMIT_RATE
+    burst = settings.WEBHOOK_RATE_LIMIT_BURST
+    if settings.WEBHOOK_RATE_LIMIT_BACKEND == "redis":
+        try:
+            return get_redis_buckets().take(key, rate, burst)
+        except redis.RedisError as e:
+            logger.warning(f"Rate limiting with local buckets, Redis failed: {e}")
+    return LOCAL_BUCKETS.take(key, rate, burst)
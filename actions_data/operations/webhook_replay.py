@@ -0,0 +1,724 @@
+"""
+Rebuilding of the tables derived from the webhook events, WorkflowRun, Job, JobStats
+and JobStatsLabel, after the processing logic changed. Stored events are streamed in
+id order with a server-side cursor and transformed by a pool of processes with the
+code of the buffered mode, WebhookEventBatch. Their rows are copied into staging
+tables with COPY, and merged into shadow tables with INSERT ... ON CONFLICT, so that
+later events overwrite earlier ones like processing them did. Job stats are then
+computed from the shadow jobs the same way.
+
+The shadow tables replace the live ones in a single transaction, once the events
+received in the meantime were replayed too. Runs and stats keep their ids, which other
+tables reference, and rows that can't be rebuilt, because their events were dropped
+with their partition or fail to process, are copied over from the live tables.
+"""
+
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import batched
+from multiprocessing.pool import ThreadPool
+from typing import Callable, Iterable, Iterator
+
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.db.models import JSONField, Max, Model
+
+from actions_data.models import (
+    Job,
+    JobStats,
+    JobStatsLabel,
+    OwnerEntity,
+    Repository,
+    WebhookEvent,
+    Workflow,
+    WorkflowRun,
+)
+from actions_data.models.job_stats import UPDATE_FIELDS as JOB_STATS_UPDATE_FIELDS
+from actions_data.models.upsert import upsert
+from actions_data.models.webhook_event import PROCESSABLE_EVENT_TYPES
+from actions_data.operations.webhook_batch_processor import (
+    JOB_UPDATE_FIELDS,
+    WORKFLOW_RUN_UPDATE_FIELDS,
+    WebhookEventBatch,
+)
+from actions_insider.middleware import validate_field_limits
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_MODELS = (WorkflowRun, Job, JobStats, JobStatsLabel)
+SHADOW_SUFFIX = "_replay"
+# Seconds between progress reports
+REPORT_INTERVAL = 10
+
+EVENT_FIELDS = (
+    "id",
+    "event",
+    "payload",
+    "raw_payload",
+    "raw_payload_compressed",
+    "installation_id",
+)
+# Columns of the staging tables, the others are set when merging
+RUN_FIELDS = [
+    f
+    for f in WorkflowRun._meta.concrete_fields
+    if f.name not in ("id", "job_data_collected")
+]
+JOB_FIELDS = [
+    f for f in Job._meta.concrete_fields if f.name not in ("workflow_run", "updated_at")
+]
+JOB_STATS_FIELDS = [f for f in JobStats._meta.concrete_fields if f.name != "id"]
+
+
+@dataclass
+class ReplayedEvents:
+    """Rows of a chunk of events, as CSV for the staging tables."""
+
+    owners: list[OwnerEntity] = field(default_factory=list)
+    repositories: list[Repository] = field(default_factory=list)
+    workflows: list[Workflow] = field(default_factory=list)
+    runs: str = ""
+    empty_runs: str = ""
+    jobs: str = ""
+    events: int = 0
+    failed: int = 0
+
+
+@dataclass
+class ComputedJobStats:
+    """Stats and labels of a chunk of jobs, as CSV for the staging tables."""
+
+    stats: str = ""
+    labels: str = ""
+    jobs: int = 0
+    failed: int = 0
+
+
+def encode(model_field, value):
+    if value is None:
+        return None
+    if isinstance(model_field, JSONField):
+        return json.dumps(value)
+    if isinstance(value, timedelta):
+        return f"{value.total_seconds()} seconds"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def dump_rows(rows: Iterable[list]) -> str:
+    """Rows as CSV for COPY, where NULL is the only unquoted empty value."""
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NOTNULL, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+def dump_instances(objs: Iterable[Model], fields: list, extra=None) -> str:
+    return dump_rows(
+        [
+            *(encode(f, getattr(obj, f.attname)) for f in fields),
+            *(extra(obj) if extra else ()),
+        ]
+        for obj in objs
+    )
+
+
+def split_invalid(objs: Iterable[Model]) -> tuple[list[Model], int]:
+    """The objects within their field limits, and the number of the others."""
+    valid = []
+    for obj in objs:
+        try:
+            validate_field_limits([obj])
+            valid.append(obj)
+        except ValueError:
+            pass
+    return valid, len(objs) - len(valid)
+
+
+def transform_events(rows: list[tuple]) -> ReplayedEvents:
+    """
+    Rows of the runs and jobs of the events, which must be ordered by id, like the
+    buffered mode would write them. Runs in the pool, without database access.
+    """
+    batch = WebhookEventBatch(existing_runs={}, resolve_installations=False)
+    failed = 0
+    for row in rows:
+        event = WebhookEvent(**dict(zip(EVENT_FIELDS, row)))
+        try:
+            if not event.is_processable_webhook_event:
+                continue
+            match event.event:
+                case "workflow_run":
+                    batch.add_workflow_run_event(event)
+                case "workflow_job":
+                    batch.add_workflow_job_event(event)
+        except Exception as e:
+            logger.warning(f"Failed to replay {event.event} event {event.id}: {e!r}")
+            failed += 1
+    runs, invalid_runs = split_invalid(list(batch.runs.values()))
+    jobs, invalid_jobs = split_invalid(
+        [job for job, _ in batch.jobs.values()],
+    )
+    run_keys = {job.id: key for job, key in batch.jobs.values()}
+    return ReplayedEvents(
+        owners=list(batch.owners.values()),
+        repositories=list(batch.repositories.values()),
+        workflows=list(batch.workflows.values()),
+        runs=dump_instances(runs, RUN_FIELDS),
+        empty_runs=dump_rows(
+            [run.run_id, run.run_attempt, run.repository_id]
+            for key, run in batch.empty_runs.items()
+            if key not in batch.runs
+        ),
+        jobs=dump_instances(jobs, JOB_FIELDS, extra=lambda job: run_keys[job.id]),
+        events=len(rows),
+        failed=failed + invalid_runs + invalid_jobs,
+    )
+
+
+def compute_job_stats(rows: list[tuple]) -> ComputedJobStats:
+    """
+    Stats of the jobs read by the stats query, computed like
+    JobStatsManager.save_for_jobs() would. Runs in the pool, without database access.
+    """
+    stats = []
+    failed = 0
+    for (
+        job_id,
+        job_name,
+        labels,
+        started_at,
+        completed_at,
+        installation_id,
+        run_id,
+        run_event,
+        workflow_id,
+        workflow_name,
+        repository_id,
+        repository_name,
+        owner_id,
+        owner_login,
+    ) in rows:
+        entry = JobStats(
+            job=Job(
+                id=job_id,
+                name=job_name,
+                labels=json.loads(labels) if labels is not None else None,
+            ),
+            workflow_run=WorkflowRun(id=run_id, event=run_event),
+            workflow=Workflow(id=workflow_id, name=workflow_name),
+            repository=Repository(id=repository_id, name=repository_name),
+            owner_entity=OwnerEntity(id=owner_id, login=owner_login),
+            started_at=started_at,
+            completed_at=completed_at,
+            installation_id=installation_id,
+        )
+        entry.save_event()
+        entry.save_names()
+        try:
+            entry.clean()
+        except ValidationError:
+            failed += 1
+            continue
+        entry.calculate_execution_times()
+        stats.append(entry)
+    stats, invalid = split_invalid(stats)
+    return ComputedJobStats(
+        stats=dump_instances(stats, JOB_STATS_FIELDS),
+        labels=dump_rows(
+            [entry.job_id, label] for entry in stats for label in entry.job.labels or []
+        ),
+        jobs=len(stats),
+        failed=failed + invalid,
+    )
+
+
+def quote(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def column_list(fields: list, prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{quote(f.column)}" for f in fields)
+
+
+def update_list(model: type[Model], names: Iterable[str]) -> str:
+    columns = [quote(model._meta.get_field(name).column) for name in names]
+    return ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+
+
+class WebhookEventReplay:
+    """
+    Replay of the stored webhook events into shadow tables, which replace the live
+    ones with swap(). With `workers`, events are transformed by a pool of processes,
+    otherwise by this one.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        chunk_size: int = 1000,
+        log: Callable[[str], None] = logger.info,
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.log = log
+        self.tables = {model: model._meta.db_table for model in REPLAYED_MODELS}
+        self.shadows = {
+            model: f"{table}{SHADOW_SUFFIX}" for model, table in self.tables.items()
+        }
+        # Identity sequences of the live tables, new ids are taken from them so that
+        # they can't be taken by live writes too
+        self.sequences: dict[type[Model], str | None] = {}
+        # Constraints and indexes of the shadow tables, and their live names
+        self.renames: list[tuple[str, str, str, str]] = []
+        self.deferred_indexes: list[str] = []
+        self.replayed = 0
+        self.failed = 0
+        self.reported_at = time.monotonic()
+
+    def run(self, dry_run: bool = False) -> dict[str, tuple[int, int]]:
+        """
+        Rebuilds the tables, or only reports the rows of the live and shadow tables
+        with `dry_run`. Returns both row counts, by table.
+        """
+        started = time.monotonic()
+        snapshot = WebhookEvent.objects.aggregate(last=Max("id"))["last"] or 0
+        with self.pool() as pool:
+            self.create_shadow_tables()
+            self.replay_events(pool, after=0, until=snapshot)
+            self.carry_over_runs_and_jobs()
+            self.compute_stats(pool)
+            self.carry_over_stats()
+            counts = self.count_rows()
+            if dry_run:
+                self.drop_shadow_tables()
+                return counts
+            self.create_deferred_indexes()
+            # Most events received meanwhile are replayed before taking the locks
+            caught_up = WebhookEvent.objects.aggregate(last=Max("id"))["last"] or 0
+            self.replay_events(pool, after=snapshot, until=caught_up, touched=True)
+            self.compute_stats(pool, touched=True)
+        self.swap(after=caught_up)
+        self.log(
+            f"Replayed {self.replayed} events in "
+            f"{timedelta(seconds=round(time.monotonic() - started))}, "
+            f"{self.failed} rows failed"
+        )
+        return counts
+
+    @contextmanager
+    def pool(self) -> Iterator:
+        if not self.workers:
+            yield None
+            return
+        if multiprocessing.current_process().daemon:
+            # Daemonic processes, like the workers of `manage.py test --parallel`,
+            # aren't allowed to have children. The pool functions don't access the
+            # database, so threads can run them instead.
+            self.log("Running in a daemonic process, transforming with threads.")
+            pool = ThreadPool(self.workers)
+        else:
+            # Workers are forked, and must not share the connections of this process
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(self.workers)
+        try:
+            yield pool
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def map_chunks(self, pool, function: Callable, chunks: Iterable) -> Iterator:
+        """
+        function() of each chunk, in order, with at most two chunks per worker in
+        flight so that the chunks aren't all read upfront.
+        """
+        if pool is None:
+            yield from map(function, chunks)
+            return
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(function, (chunk,)))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def create_shadow_tables(self):
+        with connection.cursor() as cursor:
+            for model, table in self.tables.items():
+                shadow = self.shadows[model]
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(shadow)}")
+                cursor.execute(
+                    f"CREATE TABLE {quote(shadow)} (LIKE {quote(table)} "
+                    "INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS "
+                    "INCLUDING GENERATED)"
+                )
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                [self.sequences[model]] = cursor.fetchone()
+                # Unique constraints are needed by the merges, other indexes are
+                # built once the rows are loaded
+                cursor.execute(
+                    "SELECT oid, conname, pg_get_constraintdef(oid) "
+                    "FROM pg_constraint "
+                    "WHERE conrelid = %s::regclass AND contype IN ('p', 'u')",
+                    [table],
+                )
+                for oid, name, definition in cursor.fetchall():
+                    cursor.execute(
+                        f"ALTER TABLE {quote(shadow)} "
+                        f"ADD CONSTRAINT replay_{oid} {definition}"
+                    )
+                    self.renames.append(("CONSTRAINT", table, f"replay_{oid}", name))
+                cursor.execute(
+                    "SELECT i.indexrelid, c.relname, i.indisunique, "
+                    "pg_get_indexdef(i.indexrelid) "
+                    "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE i.indrelid = %s::regclass AND NOT EXISTS ("
+                    "SELECT 1 FROM pg_constraint "
+                    "WHERE conindid = i.indexrelid AND conrelid = i.indrelid)",
+                    [table],
+                )
+                for oid, name, unique, definition in cursor.fetchall():
+                    _, method = definition.split(" USING ", 1)
+                    statement = (
+                        f"CREATE {'UNIQUE ' if unique else ''}INDEX replay_{oid} "
+                        f"ON {quote(shadow)} USING {method}"
+                    )
+                    if unique:
+                        cursor.execute(statement)
+                    else:
+                        self.deferred_indexes.append(statement)
+                    self.renames.append(("INDEX", table, f"replay_{oid}", name))
+            self.create_staging_tables(cursor)
+
+    def create_staging_tables(self, cursor):
+        run = quote(self.shadows[WorkflowRun])
+        job = quote(self.shadows[Job])
+        stats = quote(self.shadows[JobStats])
+        labels = quote(self.shadows[JobStatsLabel])
+        for statement in [
+            f"replay_runs AS SELECT {column_list(RUN_FIELDS)} FROM {run}",
+            "replay_empty_runs AS SELECT run_id, run_attempt, repository_id "
+            f"FROM {run}",
+            f"replay_jobs AS SELECT {column_list(JOB_FIELDS, 'j.')}, r.run_id, "
+            f"r.run_attempt FROM {job} j, {run} r",
+            f"replay_stats AS SELECT {column_list(JOB_STATS_FIELDS)} FROM {stats}",
+            f"replay_labels AS SELECT s.job_id, l.label FROM {stats} s, {labels} l",
+            f"replay_touched_jobs AS SELECT id FROM {job}",
+            f"replay_touched_runs AS SELECT run_id, run_attempt FROM {run}",
+        ]:
+            name = statement.split(" ", 1)[0]
+            cursor.execute(f"DROP TABLE IF EXISTS pg_temp.{name}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {statement} WITH NO DATA")
+
+    def create_deferred_indexes(self):
+        with connection.cursor() as cursor:
+            for statement in self.deferred_indexes:
+                cursor.execute(statement)
+            for shadow in self.shadows.values():
+                cursor.execute(f"ANALYZE {quote(shadow)}")
+
+    def drop_shadow_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DROP TABLE IF EXISTS "
+                + ", ".join(quote(shadow) for shadow in self.shadows.values())
+            )
+
+    def report(self, force: bool = False):
+        if force or time.monotonic() - self.reported_at >= REPORT_INTERVAL:
+            self.reported_at = time.monotonic()
+            self.log(f"{self.replayed} events replayed, {self.failed} rows failed")
+
+    @staticmethod
+    def copy(cursor, table: str, rows: str):
+        cursor.execute(f"TRUNCATE {table}")
+        cursor.copy_expert(
+            f"COPY {table} FROM STDIN WITH (FORMAT csv)", io.StringIO(rows)
+        )
+
+    def replay_events(self, pool, after: int, until: int | None, touched: bool = False):
+        """
+        Replays the events with ids in (`after`, `until`], recording the rows they
+        write when `touched`, for their stats to be computed again.
+        """
+        events = WebhookEvent.objects.filter(
+            id__gt=after, event__in=PROCESSABLE_EVENT_TYPES, dead_lettered_at=None
+        )
+        if until is not None:
+            events = events.filter(id__lte=until)
+        # Streamed by a server-side cursor, which the transaction keeps open
+        with transaction.atomic():
+            rows = (
+                tuple(bytes(v) if isinstance(v, memoryview) else v for v in row)
+                for row in events.order_by("id")
+                .values_list(*EVENT_FIELDS)
+                .iterator(chunk_size=self.chunk_size)
+            )
+            for chunk in self.map_chunks(
+                pool, transform_events, batched(rows, self.chunk_size)
+            ):
+                self.load_events(chunk, touched)
+        self.report(force=True)
+
+    def load_events(self, chunk: ReplayedEvents, touched: bool):
+        # Rows of the other tables are only created, they are rewritten by the
+        # live processing of the events
+        upsert(chunk.owners, unique_fields=["id"], update_fields=[])
+        upsert(chunk.repositories, unique_fields=["id"], update_fields=[])
+        upsert(chunk.workflows, unique_fields=["id"], update_fields=[])
+        run, live_run = quote(self.shadows[WorkflowRun]), quote(
+            self.tables[WorkflowRun]
+        )
+        sequence = self.sequences[WorkflowRun]
+        with connection.cursor() as cursor:
+            self.copy(cursor, "replay_runs", chunk.runs)
+            self.copy(cursor, "replay_empty_runs", chunk.empty_runs)
+            self.copy(cursor, "replay_jobs", chunk.jobs)
+            cursor.execute(
+                f"INSERT INTO {run} (id, job_data_collected, {column_list(RUN_FIELDS)}) "
+                "SELECT COALESCE(l.id, nextval(%s)), "
+                "COALESCE(l.job_data_collected, false), "
+                f"{column_list(RUN_FIELDS, 's.')} FROM replay_runs s "
+                f"LEFT JOIN {live_run} l "
+                "ON l.run_id = s.run_id AND l.run_attempt = s.run_attempt "
+                "ON CONFLICT (run_id, run_attempt) DO UPDATE SET "
+                + update_list(WorkflowRun, WORKFLOW_RUN_UPDATE_FIELDS),
+                [sequence],
+            )
+            # Runs that jobs are received for before the run itself, which keep
+            # the live row if there is one
+            cursor.execute(
+                f"INSERT INTO {run} SELECT l.* FROM {live_run} l "
+                "JOIN replay_empty_runs s "
+                "ON l.run_id = s.run_id AND l.run_attempt = s.run_attempt "
+                "ON CONFLICT DO NOTHING"
+            )
+            cursor.execute(
+                f"INSERT INTO {run} "
+                "(id, run_id, run_attempt, repository_id, job_data_collected) "
+                "SELECT nextval(%s), s.run_id, s.run_attempt, s.repository_id, false "
+                "FROM replay_empty_runs s WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {run} r "
+                "WHERE r.run_id = s.run_id AND r.run_attempt = s.run_attempt)",
+                [sequence],
+            )
+            cursor.execute(
+                f"INSERT INTO {quote(self.shadows[Job])} "
+                f"({column_list(JOB_FIELDS)}, workflow_run_id, updated_at) "
+                f"SELECT {column_list(JOB_FIELDS, 's.')}, r.id, now() "
+                f"FROM replay_jobs s JOIN {run} r "
+                "ON r.run_id = s.run_id AND r.run_attempt = s.run_attempt "
+                "ON CONFLICT (id) DO UPDATE SET " + update_list(Job, JOB_UPDATE_FIELDS),
+            )
+            if touched:
+                cursor.execute(
+                    "INSERT INTO replay_touched_jobs SELECT id FROM replay_jobs"
+                )
+                cursor.execute(
+                    "INSERT INTO replay_touched_runs "
+                    "SELECT run_id, run_attempt FROM replay_runs"
+                )
+        self.replayed += chunk.events
+        self.failed += chunk.failed
+        self.report()
+
+    def carry_over_runs_and_jobs(self):
+        run, live_run = quote(self.shadows[WorkflowRun]), quote(
+            self.tables[WorkflowRun]
+        )
+        job, live_job = quote(self.shadows[Job]), quote(self.tables[Job])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {run} SELECT l.* FROM {live_run} l WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {run} s "
+                "WHERE s.run_id = l.run_id AND s.run_attempt = l.run_attempt)"
+            )
+            runs = cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO {job} SELECT l.* FROM {live_job} l WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {job} s WHERE s.id = l.id)"
+            )
+            self.log(f"Carried over {runs} runs and {cursor.rowcount} jobs")
+
+    def carry_over_stats(self):
+        stats, live_stats = quote(self.shadows[JobStats]), quote(self.tables[JobStats])
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH carried AS (INSERT INTO {stats} SELECT l.* FROM {live_stats} l "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {stats} s WHERE s.job_id = l.job_id) "
+                "RETURNING id) "
+                f"INSERT INTO {quote(self.shadows[JobStatsLabel])} (job_stats_id, label) "
+                f"SELECT l.job_stats_id, l.label "
+                f"FROM {quote(self.tables[JobStatsLabel])} l "
+                "JOIN carried c ON c.id = l.job_stats_id ON CONFLICT DO NOTHING"
+            )
+
+    def compute_stats(self, pool, touched: bool = False):
+        """
+        Computes the stats of the shadow jobs, only of the ones written by the
+        events replayed with `touched` and of the jobs of their runs if `touched`.
+        """
+        condition = ""
+        if touched:
+            condition = (
+                "AND (j.id IN (SELECT id FROM replay_touched_jobs) "
+                "OR (r.run_id, r.run_attempt) IN ("
+                "SELECT run_id, run_attempt FROM replay_touched_runs))"
+            )
+        query = (
+            "SELECT j.id, j.name, j.labels, j.started_at, j.completed_at, "
+            "j.installation_id, r.id, r.event, w.id, w.name, repo.id, repo.name, "
+            "o.id, o.login "
+            f"FROM {quote(self.shadows[Job])} j "
+            f"JOIN {quote(self.shadows[WorkflowRun])} r ON r.id = j.workflow_run_id "
+            f"JOIN {quote(Workflow._meta.db_table)} w ON w.id = r.workflow_id "
+            f"JOIN {quote(Repository._meta.db_table)} repo "
+            "ON repo.id = r.repository_id "
+            f"JOIN {quote(OwnerEntity._meta.db_table)} o ON o.id = repo.owner_id "
+            "WHERE j.started_at IS NOT NULL AND j.completed_at IS NOT NULL " + condition
+        )
+        computed = 0
+        with transaction.atomic(), connection.chunked_cursor() as source:
+            source.execute(query)
+            chunks = iter(lambda: source.fetchmany(self.chunk_size), [])
+            for chunk in self.map_chunks(pool, compute_job_stats, chunks):
+                self.load_stats(chunk)
+                computed += chunk.jobs
+        if touched:
+            with connection.cursor() as cursor:
+                cursor.execute("TRUNCATE replay_touched_jobs, replay_touched_runs")
+        self.log(f"Computed the stats of {computed} jobs")
+
+    def load_stats(self, chunk: ComputedJobStats):
+        stats = quote(self.shadows[JobStats])
+        with connection.cursor() as cursor:
+            self.copy(cursor, "replay_stats", chunk.stats)
+            self.copy(cursor, "replay_labels", chunk.labels)
+            cursor.execute(
+                f"INSERT INTO {stats} (id, {column_list(JOB_STATS_FIELDS)}) "
+                f"SELECT COALESCE(l.id, nextval(%s)), "
+                f"{column_list(JOB_STATS_FIELDS, 's.')} FROM replay_stats s "
+                f"LEFT JOIN {quote(self.tables[JobStats])} l ON l.job_id = s.job_id "
+                "ON CONFLICT (job_id) DO UPDATE SET "
+                + update_list(JobStats, JOB_STATS_UPDATE_FIELDS),
+                [self.sequences[JobStats]],
+            )
+            cursor.execute(
+                f"INSERT INTO {quote(self.shadows[JobStatsLabel])} "
+                "(job_stats_id, label) "
+                f"SELECT s.id, l.label FROM replay_labels l JOIN {stats} s "
+                "ON s.job_id = l.job_id ON CONFLICT DO NOTHING"
+            )
+        self.failed += chunk.failed
+
+    def count_rows(self) -> dict[str, tuple[int, int]]:
+        counts = {}
+        with connection.cursor() as cursor:
+            for model, table in self.tables.items():
+                cursor.execute(
+                    f"SELECT (SELECT count(*) FROM {quote(table)}), "
+                    f"(SELECT count(*) FROM {quote(self.shadows[model])})"
+                )
+                counts[table] = cursor.fetchone()
+        return counts
+
+    def rekey_runs(self, cursor):
+        """
+        Gives the shadow runs the ids of the live runs that were created for the
+        same run attempt since they were replayed, and that other tables reference.
+        """
+        run, live_run = quote(self.shadows[WorkflowRun]), quote(
+            self.tables[WorkflowRun]
+        )
+        cursor.execute(
+            "CREATE TEMPORARY TABLE replay_rekeyed ON COMMIT DROP AS "
+            f"SELECT s.id AS shadow_id, l.id FROM {run} s JOIN {live_run} l "
+            "ON l.run_id = s.run_id AND l.run_attempt = s.run_attempt "
+            "WHERE l.id <> s.id"
+        )
+        for model in (Job, JobStats):
+            cursor.execute(
+                f"UPDATE {quote(self.shadows[model])} t SET workflow_run_id = k.id "
+                "FROM replay_rekeyed k WHERE t.workflow_run_id = k.shadow_id"
+            )
+        cursor.execute(
+            f"UPDATE {run} r SET id = k.id FROM replay_rekeyed k "
+            "WHERE r.id = k.shadow_id"
+        )
+
+    def swap(self, after: int):
+        """
+        Replaces the live tables with the shadow ones, once the events with ids
+        greater than `after` are replayed too, while the live tables are locked.
+        Foreign keys are validated afterwards, without locking the tables.
+        """
+        tables = [quote(table) for table in self.tables.values()]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(tables)} IN EXCLUSIVE MODE")
+            self.rekey_runs(cursor)
+            self.replay_events(None, after=after, until=None, touched=True)
+            self.compute_stats(None, touched=True)
+
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid), "
+                "conrelid::regclass::text = ANY(%s) FROM pg_constraint "
+                "WHERE contype = 'f' AND (conrelid::regclass::text = ANY(%s) "
+                "OR confrelid::regclass::text = ANY(%s))",
+                [list(self.tables.values())] * 3,
+            )
+            foreign_keys = cursor.fetchall()
+            # Tables with deferred constraint checks pending can't be altered
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            for table, name, _, replayed in foreign_keys:
+                if not replayed:
+                    cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {quote(name)}")
+            shadow_sequences = {}
+            for model, sequence in self.sequences.items():
+                if sequence is None:
+                    continue
+                shadow = quote(self.shadows[model])
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [shadow])
+                [shadow_sequences[model]] = cursor.fetchone()
+                cursor.execute(
+                    "SELECT setval(%s, GREATEST("
+                    f"(SELECT max(id) FROM {shadow}), "
+                    f"(SELECT last_value FROM {sequence}), 1))",
+                    [shadow_sequences[model]],
+                )
+            cursor.execute(f"DROP TABLE {', '.join(tables)}")
+
+            for model, table in self.tables.items():
+                cursor.execute(
+                    f"ALTER TABLE {quote(self.shadows[model])} RENAME TO {quote(table)}"
+                )
+                if model in shadow_sequences:
+                    name = self.sequences[model].rsplit(".", 1)[-1]
+                    cursor.execute(
+                        f"ALTER SEQUENCE {shadow_sequences[model]} RENAME TO {name}"
+                    )
+            for kind, table, shadow_name, name in self.renames:
+                if kind == "CONSTRAINT":
+                    cursor.execute(
+                        f"ALTER TABLE {quote(table)} "
+                        f"RENAME CONSTRAINT {shadow_name} TO {quote(name)}"
+                    )
+                else:
+                    cursor.execute(f"ALTER INDEX {shadow_name} RENAME TO {quote(name)}")
+            for table, name, definition, _ in foreign_keys:
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {quote(name)} "
+                    f"{definition} NOT VALID"
+                )
+        self.log("Swapped the tables, validating their foreign keys")
+        with connection.cursor() as cursor:
+            for table, name, _, _ in foreign_keys:
+                cursor.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {quote(name)}")
@@ -0,0 +1,68 @@
+"""
+Attempts of the webhook events that failed to process. Each failed attempt is
+counted on the event, and the next one is scheduled after an exponential backoff,
+until WEBHOOK_MAX_ATTEMPTS attempts failed and the event is dead-lettered: it is
+left out of the backlog and only processed again when replayed, so that poison
+events don't take worker time forever.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils.timezone import now
+
+from actions_data.metrics import WEBHOOK_EVENTS_DEAD_LETTERED
+from actions_data.models import WebhookEvent
+
+logger = logging.getLogger("celery")
+
+ATTEMPT_FIELDS = ["attempts", "next_attempt_at", "dead_lettered_at", "last_error"]
+
+
+def backoff_delay(attempts: int) -> int:
+    """Seconds to wait before the next attempt, after `attempts` failed ones."""
+    return min(
+        settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.WEBHOOK_RETRY_MAX_DELAY,
+    )
+
+
+def record_failed_attempts(events: list[WebhookEvent]) -> dict[int, int]:
+    """
+    Counts a failed attempt for each event, dead-lettering the ones that have no
+    attempt left. Returns the delay in seconds before the next attempt of the
+    others, by event id.
+    """
+    retried_at = now()
+    delays = {}
+    for event in events:
+        event.attempts += 1
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            event.next_attempt_at = None
+            event.dead_lettered_at = retried_at
+            WEBHOOK_EVENTS_DEAD_LETTERED.inc(event=event.event)
+            logger.error(
+                f"Dead-lettered event {event} after {event.attempts} failed "
+                f"attempts. Last error: {event.last_error}"
+            )
+        else:
+            delays[event.id] = backoff_delay(event.attempts)
+            event.next_attempt_at = retried_at + timedelta(seconds=delays[event.id])
+    WebhookEvent.objects.bulk_update(events, ATTEMPT_FIELDS)
+    return delays
+
+
+def replay_dead_letters(events: QuerySet) -> list[int]:
+    """
+    Gives the dead-lettered `events` their attempts back, returning their ids, to
+    be processed again.
+    """
+    event_ids = list(
+        events.filter(dead_lettered_at__isnull=False).values_list("id", flat=True)
+    )
+    WebhookEvent.objects.filter(id__in=event_ids).update(
+        attempts=0, next_attempt_at=None, dead_lettered_at=None
+    )
+    return event_ids
@@ -0,0 +1,49 @@
+"""
+Routing of webhook events to WEBHOOK_QUEUES Celery queues by repository, so that
+the events of a repository are always published to the same queue. With a single
+worker process consuming each queue, the events of a repository are processed
+one at a time and don't wait for each other's locks, while other repositories are
+processed in parallel.
+"""
+
+import re
+import zlib
+
+from django.conf import settings
+
+from actions_data.models import WebhookEvent
+
+WEBHOOK_QUEUE_PREFIX = "webhooks"
+
+# Repositories start with their id, and the first one of a workflow_run payload is
+# the repository of the run. Doesn't match "head_repository", which may be a fork.
+REPOSITORY_ID_PATTERN = re.compile(rb'"repository"\s*:\s*\{\s*"id"\s*:\s*(\d+)')
+
+
+def repository_id_from_body(body: bytes) -> int | None:
+    """Reads the repository id of a delivery, without parsing the body."""
+    match = REPOSITORY_ID_PATTERN.search(body)
+    return int(match.group(1)) if match else None
+
+
+def webhook_queue(repository_id: int | None) -> str | None:
+    """
+    The queue of the events of the repository, or None to use the task routes
+    (the webhooks queue) when events aren't routed by repository.
+    """
+    if settings.WEBHOOK_QUEUES <= 1 or repository_id is None:
+        return None
+    return f"{WEBHOOK_QUEUE_PREFIX}.{repository_id % settings.WEBHOOK_QUEUES}"
+
+
+def event_webhook_queue(event: WebhookEvent) -> str | None:
+    """
+    The queue of a stored event, from the repository of its payload, so that
+    events published again, like retries, stay on the queue of their repository.
+    """
+    try:
+        repository = event.parsed_payload.get("repository") or {}
+    except (ValueError, zlib.error):
+        # Payloads that can't be parsed fail wherever they are processed
+        return None
+    return webhook_queue(repository.get("id"))
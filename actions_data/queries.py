@@ -290,6 +290,65 @@ def convert_label_results_to_metrics(
     ]
 
 
+def get_step_hotspots_raw_sql(
+    workflow_id: int, start_date: datetime, end_date: datetime, limit: int = 10
+) -> list[dict]:
+    """
+    Get the steps of the jobs of a workflow taking the most time in total, and the
+    ones with the highest 95th percentile, each ranked in `rank_total` and
+    `rank_p95`. Skipped steps are left out.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH step_times AS (
+                SELECT
+                    s.name_id,
+                    COUNT(*) AS runs,
+                    SUM(s.duration_seconds) AS total_seconds,
+                    AVG(s.duration_seconds) AS avg_seconds,
+                    PERCENTILE_CONT(0.95) WITHIN GROUP (
+                        ORDER BY s.duration_seconds
+                    ) AS p95_seconds
+                FROM actions_data_jobstats js
+                INNER JOIN actions_data_step s
+                    ON s.job_id = js.job_id
+                WHERE
+                    js.workflow_id = %s
+                    AND js.started_at BETWEEN %s AND %s
+                    AND s.duration_seconds IS NOT NULL
+                    AND s.conclusion IS DISTINCT FROM 'skipped'
+                GROUP BY s.name_id
+            ),
+            ranked_steps AS (
+                SELECT
+                    *,
+                    ROW_NUMBER() OVER (ORDER BY total_seconds DESC, name_id)
+                        AS rank_total,
+                    ROW_NUMBER() OVER (ORDER BY p95_seconds DESC, name_id)
+                        AS rank_p95
+                FROM step_times
+            )
+            SELECT
+                sn.name,
+                rs.runs,
+                rs.total_seconds * INTERVAL '1 second' AS total_time,
+                rs.avg_seconds * INTERVAL '1 second' AS avg_time,
+                rs.p95_seconds * INTERVAL '1 second' AS p95_time,
+                rs.rank_total,
+                rs.rank_p95
+            FROM ranked_steps rs
+            INNER JOIN actions_data_stepname sn
+                ON sn.id = rs.name_id
+            WHERE rs.rank_total <= %s OR rs.rank_p95 <= %s;
+            """,
+            [workflow_id, start_date, end_date, limit, limit],
+        )
+
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
 def get_org_metrics_raw_sql(owner: User, start_date: datetime) -> list[dict]:
     """
     Get organization metrics using optimized raw SQL query with CTEs.
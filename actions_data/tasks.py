@@ -1,4 +1,5 @@
 import logging
+from collections import defaultdict
 from datetime import timedelta
 
 import redis
@@ -14,7 +15,15 @@ from actions_data.operations.demo_data_pusher import (
     DemoDataPusher,
     link_demo_repos_to_demo_user,
 )
+from actions_data.operations.repository_heartbeat import flush_recorded_heartbeats
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+from actions_data.operations.webhook_partitions import maintain_partitions
 from actions_data.operations.webhook_processor import process_webhook_event_instance
+from actions_data.operations.webhook_retry import record_failed_attempts
+from actions_data.operations.webhook_routing import event_webhook_queue
 
 logger = logging.getLogger("celery")
 
@@ -23,7 +32,61 @@ logger = logging.getLogger("celery")
 def process_webhook_event(event_id: int):
     logger.debug(f"Processing webhook event with id: {event_id}")
     wh_event = WebhookEvent.objects.get(id=event_id)
-    process_webhook_event_instance(wh_event)
+    if process_webhook_event_instance(wh_event) == OperationResult.FAILURE:
+        retry_failed_events([wh_event])
+
+
+@shared_task
+def process_webhook_events(event_ids: list[int]):
+    """Process a batch of webhook events published by the webhook buffer."""
+    logger.debug(f"Processing {len(event_ids)} webhook events")
+    events = list(WebhookEvent.objects.filter(id__in=event_ids).order_by("id"))
+    results = process_webhook_event_batch(events)
+    retry_failed_events(
+        [event for event in events if results.get(event.id) == OperationResult.FAILURE]
+    )
+
+
+def retry_failed_events(events: list[WebhookEvent]):
+    """
+    Schedules the next attempt of the failed events after their backoff, in one
+    batch per delay and queue, on the queue of their repository.
+    """
+    if not events:
+        return
+    queues = {event.id: event_webhook_queue(event) for event in events}
+    retries = defaultdict(list)
+    for event_id, delay in record_failed_attempts(events).items():
+        retries[delay, queues[event_id]].append(event_id)
+    for (delay, queue), event_ids in retries.items():
+        process_webhook_events.apply_async((event_ids,), countdown=delay, queue=queue)
+
+
+@shared_task
+def drain_webhook_overflow():
+    """Ingest the deliveries that were over the rate limit, in batches."""
+    # webhook_buffer publishes with the tasks of this module
+    from actions_data.operations.webhook_buffer import get_overflow_buffer
+
+    flushed = get_overflow_buffer().drain(limit=settings.WEBHOOK_OVERFLOW_DRAIN_LIMIT)
+    if flushed:
+        logger.info(f"Ingested {flushed} webhook deliveries from the overflow buffer")
+
+
+@shared_task
+def flush_repository_heartbeats():
+    """Write the recorded heartbeats to their repositories."""
+    flushed = flush_recorded_heartbeats()
+    logger.debug(f"Flushed the heartbeats of {flushed} repositories")
+
+
+@shared_task
+def maintain_webhook_partitions():
+    """Create upcoming webhook event partitions and drop expired ones."""
+    created, dropped = maintain_partitions()
+    logger.info(
+        f"Created {len(created)} and dropped {len(dropped)} webhook event partitions"
+    )
 
 
 @shared_task(time_limit=5700)
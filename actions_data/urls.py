@@ -2,13 +2,15 @@ from django.contrib.auth.views import LoginView
 from django.urls import path
 from django.views.generic import RedirectView
 
-from actions_insider.settings import WEBHOOK_RELATIVE_URL
+from actions_insider.settings import WEBHOOK_RELATIVE_URL, WEBHOOK_ASYNC_VIEW
 from .views import (
     LandingPageView,
     StatsByJobView,
     StatsByRepoView,
     StatsByOrgView,
     WebhookView,
+    AsyncWebhookView,
+    MetricsView,
     DemoStatsByJobView,
     DemoStatsByRepoView,
     DemoStatsByOrgView,
@@ -35,7 +37,12 @@ from .views import (
 from .views.stats import StatsByLabelsView, DemoStatsByLabelsView
 
 urlpatterns = [
-    path(WEBHOOK_RELATIVE_URL, WebhookView.as_view(), name="webhook"),
+    path(
+        WEBHOOK_RELATIVE_URL,
+        (AsyncWebhookView if WEBHOOK_ASYNC_VIEW else WebhookView).as_view(),
+        name="webhook",
+    ),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("", LandingPageView.as_view(), name="landing_page"),
     path("about/", AboutPageView.as_view(), name="about"),
     path("stats/by-job/", StatsByJobView.as_view(), name="stats_by_job"),
@@ -1,4 +1,5 @@
-from .webhook import WebhookView
+from .webhook import WebhookView, AsyncWebhookView
+from .metrics import MetricsView
 from .landing_page import LandingPageView, AboutPageView
 from .stats import (
     StatsByJobView,
@@ -3,6 +3,7 @@ from django.conf import settings
 from django.views.generic import TemplateView
 
 from actions_data.github_client import get_github_orgs_and_repos_with_app_installed
+from actions_data.operations.repository_heartbeat import last_webhooks_received
 
 
 class GithubComWebhookSettingsView(LoginRequiredMixin, TemplateView):
@@ -13,6 +14,10 @@ class GithubComWebhookSettingsView(LoginRequiredMixin, TemplateView):
         user = self.request.user
         user_profile = user.userprofile
         github_orgs = user_profile.update_github_orgs_and_repos_with_app_installed()
+        last_received = last_webhooks_received(list(user_profile.repositories.all()))
+        for github_org in github_orgs:
+            for user_repo in github_org.user_repos:
+                user_repo.last_webhook_received = last_received.get(user_repo.repo.id)
         context["github_orgs"] = github_orgs
 
         if user.social_auth.exists():
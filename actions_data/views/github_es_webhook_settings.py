@@ -1,8 +1,12 @@
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import F
 from django.utils import timezone
 from django.views.generic import TemplateView
 
+from actions_data.models import Repository
+from actions_data.operations.repository_heartbeat import last_webhooks_received
+
 
 class GithubESWebhookSettingsView(LoginRequiredMixin, TemplateView):
     template_name = "actions_data/webhooks/github_es.html"
@@ -23,6 +27,22 @@ class GithubESWebhookSettingsView(LoginRequiredMixin, TemplateView):
                 }
                 for installation in existing_installations
             ]
+            repositories = list(
+                Repository.objects.filter(
+                    workflows_as_repository__installation__in=existing_installations
+                )
+                .select_related("owner")
+                .distinct()
+                .order_by(F("last_webhook_received").desc(nulls_last=True))[:20]
+            )
+            last_received = last_webhooks_received(repositories)
+            context["repositories"] = [
+                {
+                    "name": f"{repository.owner.login}/{repository.name}",
+                    "last_webhook_received": last_received[repository.id],
+                }
+                for repository in repositories
+            ]
 
         # Add current timestamp
         context["current_timestamp"] = timezone.now().isoformat()
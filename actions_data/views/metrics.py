@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.generic import View
+
+from actions_data.metrics import render_metrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@method_decorator(never_cache, name="dispatch")
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        if not settings.METRICS_TOKEN:
+            raise Http404
+        authorization = request.headers.get("Authorization", "")
+        if not constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse(status=401)
+        return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
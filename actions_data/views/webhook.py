@@ -1,22 +1,29 @@
-import json
-
 from django.http import HttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
-from actions_data.models import WebhookEvent, UserProfile
-from actions_data.tasks import process_webhook_event
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_ingestion import aingest_webhook, ingest_webhook
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class WebhookView(View):
     def post(self, request, *args, **kwargs):
-        payload = json.loads(request.body)
-        headers = request.headers
         user_id = request.GET.get("user")
-        created_event = WebhookEvent.objects.create_from_headers_and_payload(
-            headers=headers, payload=payload, user_id=user_id
-        )
-        process_webhook_event.delay(created_event.id)
+        result = ingest_webhook(request.body, request.headers, user_id)
+        if result == OperationResult.FAILURE:
+            return HttpResponse(status=503)
+        return HttpResponse(status=200)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncWebhookView(View):
+    """Webhook view for ASGI servers, used with WEBHOOK_ASYNC_VIEW."""
+
+    async def post(self, request, *args, **kwargs):
+        user_id = request.GET.get("user")
+        result = await aingest_webhook(request.body, request.headers, user_id)
+        if result == OperationResult.FAILURE:
+            return HttpResponse(status=503)
         return HttpResponse(status=200)
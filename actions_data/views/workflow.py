@@ -16,8 +16,12 @@ from actions_data.models import (
     RunnerCostConfig,
     Repository,
 )
+from actions_data.queries import get_step_hotspots_raw_sql
 from utils import round_duration_to_seconds
 
+# Steps listed in each ranking of the step hotspots
+STEP_HOTSPOTS_LIMIT = 10
+
 
 class BaseWorkflowView(DetailView):
     model = Workflow
@@ -132,6 +136,26 @@ class BaseWorkflowView(DetailView):
             workflow_id=self.object.id, start_date=start_date, end_date=end_date
         )
 
+        # Steps taking the most time
+        step_hotspots = get_step_hotspots_raw_sql(
+            workflow_id=self.object.id,
+            start_date=start_date,
+            end_date=end_date,
+            limit=STEP_HOTSPOTS_LIMIT,
+        )
+        steps_by_total_time = sorted(
+            (
+                step
+                for step in step_hotspots
+                if step["rank_total"] <= STEP_HOTSPOTS_LIMIT
+            ),
+            key=lambda step: step["rank_total"],
+        )
+        steps_by_p95_time = sorted(
+            (step for step in step_hotspots if step["rank_p95"] <= STEP_HOTSPOTS_LIMIT),
+            key=lambda step: step["rank_p95"],
+        )
+
         # Recent runs
         recent_runs = user_cost_config.calculate_recent_runs_for_workflow(
             workflow_id=self.object.id
@@ -149,6 +173,8 @@ class BaseWorkflowView(DetailView):
                 "avg_billable_time": avg_billable_time,
                 "trigger_distribution": trigger_distribution,
                 "jobs_analysis": jobs_analysis,
+                "steps_by_total_time": steps_by_total_time,
+                "steps_by_p95_time": steps_by_p95_time,
                 "recent_runs": recent_runs,
             }
         )
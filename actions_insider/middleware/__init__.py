@@ -1,2 +1,7 @@
 from .requests_blocker import SecurityScanBlockerMiddleware
-from .field_validator import check_field_limits
+from .static_files import WhiteNoiseMiddleware
+from .field_validator import (
+    check_field_limits,
+    compile_validation_plans,
+    validate_field_limits,
+)
@@ -1,7 +1,8 @@
 from django.db import models
 import logging
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, List, Tuple, Type
+from functools import lru_cache
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple, Type
 
 logger = logging.getLogger(__name__)
 
@@ -122,6 +123,86 @@ def debug_field_limits(model_instance: models.Model) -> List[ValidationProblem]:
     return problems
 
 
+FieldCheck = Callable[[models.Model], Optional[ValidationProblem]]
+
+
+def compile_field_check(field: models.Field) -> Optional[FieldCheck]:
+    """
+    Closure validating `field` as debug_field_limits() does, or None when the field
+    has no limit. Values of the common type within the limits return right away.
+    Deferred fields aren't read, saving a query for each of them.
+    """
+    name = field.name
+    attname = field.attname
+    field_type = type(field)
+    if field_type in FieldValidator.INTEGER_FIELD_LIMITS:
+        min_limit, max_limit = FieldValidator.INTEGER_FIELD_LIMITS[field_type]
+
+        def check_integer(instance: models.Model) -> Optional[ValidationProblem]:
+            value = instance.__dict__.get(attname)
+            if value is None or (
+                type(value) is int and min_limit <= value <= max_limit
+            ):
+                return None
+            return FieldValidator.validate_integer_field(name, value, field_type)
+
+        return check_integer
+
+    if isinstance(field, (models.CharField, models.TextField)):
+        max_length = field.max_length
+        if max_length is None:
+            return None
+
+        def check_string(instance: models.Model) -> Optional[ValidationProblem]:
+            value = instance.__dict__.get(attname)
+            if value is None or (type(value) is str and len(value) <= max_length):
+                return None
+            return FieldValidator.validate_string_field(name, value, field)
+
+        return check_string
+
+    return None
+
+
+class ValidationPlan:
+    """Checks of the fields of a model that have a limit, compiled once."""
+
+    def __init__(self, model: Type[models.Model]):
+        self.model_name = model.__name__
+        self.checks = [
+            check
+            for check in map(compile_field_check, model._meta.fields)
+            if check is not None
+        ]
+
+    def problems(self, instance: models.Model) -> List[ValidationProblem]:
+        return [
+            problem
+            for problem in (check(instance) for check in self.checks)
+            if problem is not None
+        ]
+
+    def validate(self, instances: Iterable[models.Model]):
+        """Raises a ValueError for the first instance with validation problems."""
+        for instance in instances:
+            problems = self.problems(instance)
+            if problems:
+                error_msg = format_validation_error(self.model_name, problems)
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+
+
+@lru_cache(maxsize=None)
+def get_validation_plan(model: Type[models.Model]) -> ValidationPlan:
+    return ValidationPlan(model)
+
+
+def compile_validation_plans(models_to_validate: Iterable[Type[models.Model]]):
+    """Compiles the plans of the models upfront, instead of on their first save."""
+    for model in models_to_validate:
+        get_validation_plan(model)
+
+
 def format_validation_error(model_name: str, problems: List[ValidationProblem]) -> str:
     """Format validation problems into a readable error message."""
     error_msg = f"Field validation failed in {model_name}:"
@@ -149,8 +230,13 @@ def format_validation_error(model_name: str, problems: List[ValidationProblem])
 
 def check_field_limits(sender, instance, **kwargs):
     """Signal receiver that checks for potential field limit violations before saving."""
-    problems = debug_field_limits(instance)
-    if problems:
-        error_msg = format_validation_error(instance.__class__.__name__, problems)
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+    get_validation_plan(instance.__class__).validate([instance])
+
+
+def validate_field_limits(instances: list[models.Model]):
+    """
+    check_field_limits() for instances written without sending pre_save, by
+    bulk_create(), bulk_update() or upsert(). The instances must be of one model.
+    """
+    if instances:
+        get_validation_plan(instances[0].__class__).validate(instances)
@@ -1,10 +1,11 @@
 from django.http import HttpResponseForbidden
+from django.utils.deprecation import MiddlewareMixin
 import re
 
 
-class SecurityScanBlockerMiddleware:
+class SecurityScanBlockerMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
 
         # Common scan patterns
         patterns = [
@@ -25,9 +26,7 @@ class SecurityScanBlockerMiddleware:
         # Compile pattern - case insensitive
         self.pattern = re.compile("(?i)" + "|".join(patterns))
 
-    def __call__(self, request):
+    def process_request(self, request):
         # Let Django handle path normalization, then check the normalized path
         if self.pattern.search(request.path):
             return HttpResponseForbidden("Access Denied")
-
-        return self.get_response(request)
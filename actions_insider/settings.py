@@ -62,7 +62,7 @@ MIDDLEWARE = [
     "django.middleware.cache.UpdateCacheMiddleware",
     "actions_insider.middleware.SecurityScanBlockerMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "actions_insider.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -267,12 +267,104 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_WORKER_MAX_MEMORY_PER_CHILD = 300_000
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 3
 CELERY_BROKER_USE_SSL = {"ssl_cert_reqs": ssl.CERT_NONE}
+# Processes of the workers started with --profile webhooks and --profile demo (see
+# actions_data.celery), unless --concurrency is given.
+WEBHOOK_WORKER_CONCURRENCY = int(os.getenv("WEBHOOK_WORKER_CONCURRENCY", 8))
+DEMO_WORKER_CONCURRENCY = int(os.getenv("DEMO_WORKER_CONCURRENCY", 2))
 
 
 MAIN_URL = os.getenv("MAIN_URL")
 WEBHOOK_RELATIVE_URL = "webhook"
 WEBHOOK_URL = MAIN_URL + "/" + WEBHOOK_RELATIVE_URL
 
+# Webhook ingestion
+# "direct" stores and enqueues every delivery in the request thread, "buffered"
+# appends deliveries to a buffer that is flushed in batches.
+WEBHOOK_INGESTION_MODE = os.getenv("WEBHOOK_INGESTION_MODE", "direct")
+# "redis" shares the buffer between web processes, "local" keeps it in memory.
+WEBHOOK_BUFFER_BACKEND = os.getenv("WEBHOOK_BUFFER_BACKEND", "redis")
+WEBHOOK_BUFFER_KEY = "webhook_buffer"
+WEBHOOK_BUFFER_FLUSH_SIZE = int(os.getenv("WEBHOOK_BUFFER_FLUSH_SIZE", 100))
+WEBHOOK_BUFFER_FLUSH_INTERVAL_MS = int(
+    os.getenv("WEBHOOK_BUFFER_FLUSH_INTERVAL_MS", 500)
+)
+# "before_flush" answers GitHub once the delivery is buffered, "after_flush"
+# only once it has been written to the database.
+WEBHOOK_BUFFER_ACK = os.getenv("WEBHOOK_BUFFER_ACK", "before_flush")
+# "json" parses deliveries in the request thread, "raw" and "compressed" (zlib)
+# store the request body as is and leave parsing to the worker.
+WEBHOOK_PAYLOAD_STORAGE = os.getenv("WEBHOOK_PAYLOAD_STORAGE", "json")
+# Keep only the payload fields read by the processors in WebhookEvent.payload, and
+# archive the full payload, compressed, in WebhookEventArchive.
+WEBHOOK_PAYLOAD_PROJECTION = os.getenv("WEBHOOK_PAYLOAD_PROJECTION") == "True"
+# "accept" ingests every delivery, "count" also counts them by event type and
+# action, and "drop" counts them but skips the ones the processor would discard.
+WEBHOOK_INGRESS_POLICY = os.getenv("WEBHOOK_INGRESS_POLICY", "accept")
+# Serve the webhook with an async view, for processes running the ASGI application
+# (actions_insider.asgi). Sync workers should keep the default sync view.
+WEBHOOK_ASYNC_VIEW = os.getenv("WEBHOOK_ASYNC_VIEW") == "True"
+# Threads writing the deliveries received by the async view, in each ASGI worker.
+# Each of them keeps a database connection open.
+WEBHOOK_ASYNC_WRITE_THREADS = int(os.getenv("WEBHOOK_ASYNC_WRITE_THREADS", 8))
+# Rate limit deliveries per installation target with token buckets holding up to
+# WEBHOOK_RATE_LIMIT_BURST deliveries, refilled with WEBHOOK_RATE_LIMIT_RATE per
+# second. "off" disables it, "reject" answers 503 to deliveries over the limit and
+# "shed" parks them in an overflow buffer, drained every minute.
+WEBHOOK_RATE_LIMIT = os.getenv("WEBHOOK_RATE_LIMIT", "off")
+WEBHOOK_RATE_LIMIT_RATE = float(os.getenv("WEBHOOK_RATE_LIMIT_RATE", 20))
+WEBHOOK_RATE_LIMIT_BURST = int(os.getenv("WEBHOOK_RATE_LIMIT_BURST", 200))
+# "redis" shares buckets and the overflow buffer between web processes, "local"
+# keeps them in each process. Buckets fall back to "local" while Redis fails.
+WEBHOOK_RATE_LIMIT_BACKEND = os.getenv("WEBHOOK_RATE_LIMIT_BACKEND", "redis")
+WEBHOOK_OVERFLOW_KEY = "webhook_overflow"
+# Maximum number of overflow deliveries ingested per minute
+WEBHOOK_OVERFLOW_DRAIN_LIMIT = int(os.getenv("WEBHOOK_OVERFLOW_DRAIN_LIMIT", 6000))
+# Events are published to WEBHOOK_QUEUES queues named webhooks.0, webhooks.1... by
+# repository, so that each repository is always processed by the same worker. With
+# 1, they are published to the webhooks queue.
+WEBHOOK_QUEUES = int(os.getenv("WEBHOOK_QUEUES", 1))
+
+# Webhook senders are resolved to installations from a cache kept for this many
+# seconds, or not cached at all with 0. "local" keeps it in each process, "shared"
+# also keeps it in the default cache so that changes to installations are seen by
+# every process immediately.
+INSTALLATION_CACHE_TTL = int(os.getenv("INSTALLATION_CACHE_TTL", 300))
+INSTALLATION_CACHE_BACKEND = os.getenv("INSTALLATION_CACHE_BACKEND", "local")
+
+# Each process remembers the owners, repositories, pull requests and workflows it
+# wrote, up to this many, and skips writing them again while they are unchanged.
+# 0 disables it.
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", 10000))
+# Each process remembers the ids of up to this many step names, so that the steps
+# of a job are written without looking their names up. 0 disables it.
+STEP_NAME_CACHE_SIZE = int(os.getenv("STEP_NAME_CACHE_SIZE", 10000))
+
+# Webhook events that fail to process are retried after WEBHOOK_RETRY_BASE_DELAY
+# seconds, doubled after every failed attempt up to WEBHOOK_RETRY_MAX_DELAY, and
+# dead-lettered after WEBHOOK_MAX_ATTEMPTS attempts. Keep the max delay under the
+# visibility timeout of the Redis broker (1 hour), or retries are delivered twice.
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5))
+WEBHOOK_RETRY_BASE_DELAY = int(os.getenv("WEBHOOK_RETRY_BASE_DELAY", 30))
+WEBHOOK_RETRY_MAX_DELAY = int(os.getenv("WEBHOOK_RETRY_MAX_DELAY", 1800))
+
+# Times webhook events are processed for each repository are recorded in Redis and
+# written to the repositories every minute. "local" records them in each process,
+# which writes them at most every minute. Falls back to "local" while Redis fails.
+REPOSITORY_HEARTBEAT_BACKEND = os.getenv("REPOSITORY_HEARTBEAT_BACKEND", "redis")
+
+# Metrics are served in the Prometheus format on /metrics to requests with the
+# "Authorization: Bearer <METRICS_TOKEN>" header, and not served at all without a
+# token. Processes add their counter increments and histogram observations to the
+# shared cache at most every METRICS_FLUSH_INTERVAL seconds.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+
+# WebhookEvent is partitioned by month of created_at. Partitions are created this
+# many months ahead, and partitions whose events are all processed are dropped
+# once they are older than the retention period, in days.
+WEBHOOK_EVENT_PARTITIONS_AHEAD = int(os.getenv("WEBHOOK_EVENT_PARTITIONS_AHEAD", 3))
+WEBHOOK_EVENT_RETENTION_DAYS = int(os.getenv("WEBHOOK_EVENT_RETENTION_DAYS", 90))
+
 DEMO_USERNAME = "demo_machine"
 DEMO_WEBHOOK_ID = 1
 DEMO_INSTALLATION_ID = 1
@@ -297,6 +389,9 @@ if TESTS_RUNNING:
     PASSWORD_HASHERS = [
         "django.contrib.auth.hashers.MD5PasswordHasher",
     ]
+    REFERENCE_CACHE_SIZE = 0
+    STEP_NAME_CACHE_SIZE = 0
+    REPOSITORY_HEARTBEAT_BACKEND = "local"
 
 # Fixed costs per minute for GitHub-hosted runners
 GITHUB_HOSTED_RUNNER_COSTS = {
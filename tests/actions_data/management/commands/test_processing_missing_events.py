@@ -1,8 +1,11 @@
+from datetime import timedelta
 from unittest.mock import patch
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.core.management import call_command
+from io import StringIO
 from django.utils import timezone
 from actions_data.models import WebhookEvent
+from actions_data.operations.schemas import OperationResult
 
 
 class ProcessWebhookEventsCommandTest(TestCase):
@@ -67,3 +70,51 @@ class ProcessWebhookEventsCommandTest(TestCase):
         # Assert process_webhook_event_instance was called only once
         mock_process.assert_called_once()
         self.assertEqual(mock_process.call_count, 1)
+
+    @patch(
+        "actions_data.management.commands.process_missing_events.process_webhook_event_instance"
+    )
+    def test_skips_events_waiting_for_their_next_attempt(self, mock_process):
+        """
+        Test that dead-lettered events and events backing off are not processed
+        """
+        WebhookEvent.objects.filter(id=1).update(dead_lettered_at=timezone.now())
+        WebhookEvent.objects.filter(id=2).update(
+            next_attempt_at=timezone.now() + timedelta(minutes=1)
+        )
+
+        call_command("process_missing_events")
+
+        self.assertEqual(mock_process.call_count, 1)
+
+    @patch(
+        "actions_data.management.commands.process_missing_events.process_webhook_event_instance"
+    )
+    def test_counts_failed_attempts(self, mock_process):
+        """
+        Test that failed events are scheduled for a later attempt
+        """
+        mock_process.return_value = OperationResult.FAILURE
+
+        call_command("process_missing_events", limit=1)
+
+        event = WebhookEvent.objects.get(attempts=1)
+        self.assertIsNotNone(event.next_attempt_at)
+
+
+class ProcessWebhookEventsInParallelTest(TransactionTestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def test_workers_drain_the_backlog(self):
+        """
+        Test that the workers process every unprocessed event once, and report it
+        """
+        out = StringIO()
+        call_command("process_missing_events", workers=2, batch_size=1, stdout=out)
+
+        self.assertFalse(WebhookEvent.objects.filter(processed_at=None).exists())
+        self.assertIn("3/3 events processed, 0 failed", out.getvalue())
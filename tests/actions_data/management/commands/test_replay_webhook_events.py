@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from actions_data.models import Job, JobStats, WebhookEvent, WorkflowRun
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+
+
+class ReplayWebhookEventsCommandTest(TransactionTestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def setUp(self):
+        WorkflowRun.objects.all().delete()
+        process_webhook_event_batch(list(WebhookEvent.objects.order_by("id")))
+
+    def test_workers_rebuild_the_tables(self):
+        """
+        Test that the events transformed by the workers rebuild the same rows
+        """
+        jobs = list(Job.objects.order_by("id").values("id", "started_at", "name"))
+        stats = list(JobStats.objects.order_by("id").values("id", "job_id"))
+        JobStats.objects.update(job_name="stale")
+
+        out = StringIO()
+        call_command("replay_webhook_events", workers=2, chunk_size=1, stdout=out)
+
+        self.assertEqual(
+            list(Job.objects.order_by("id").values("id", "started_at", "name")), jobs
+        )
+        self.assertEqual(
+            list(JobStats.objects.order_by("id").values("id", "job_id")), stats
+        )
+        self.assertFalse(JobStats.objects.filter(job_name="stale").exists())
+        self.assertIn("Replayed 4 events", out.getvalue())
+
+    def test_dry_run(self):
+        """
+        Test that a dry run reports the rows of the live and shadow tables
+        """
+        out = StringIO()
+        call_command("replay_webhook_events", dry_run=True, stdout=out)
+
+        self.assertIn(f"{Job._meta.db_table:<32}{2:>12} live rows", out.getvalue())
+        self.assertIn("Dry run", out.getvalue())
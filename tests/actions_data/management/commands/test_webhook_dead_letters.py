@@ -0,0 +1,53 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from actions_data.models import WebhookEvent
+
+
+class WebhookDeadLettersCommandTest(TestCase):
+
+    fixtures = ["tests/fixtures/webhook_events.yaml"]
+
+    def setUp(self):
+        WebhookEvent.objects.filter(id__in=[1, 2]).update(
+            attempts=5, dead_lettered_at=timezone.now(), last_error="KeyError('id')"
+        )
+
+    def test_dead_letters_are_listed_by_error(self):
+        out = StringIO()
+        call_command("webhook_dead_letters", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all("KeyError('id')" in line for line in lines))
+
+    @patch(
+        "actions_data.management.commands.webhook_dead_letters.process_webhook_events"
+    )
+    def test_dead_letters_are_replayed_in_batches(self, mock_task):
+        out = StringIO()
+        call_command("webhook_dead_letters", replay=True, batch_size=1, stdout=out)
+        self.assertEqual(
+            [call.args[0][0] for call in mock_task.apply_async.call_args_list],
+            [[1], [2]],
+        )
+        self.assertFalse(WebhookEvent.objects.filter(attempts__gt=0).exists())
+        self.assertIn("Replaying 2", out.getvalue())
+
+    @patch(
+        "actions_data.management.commands.webhook_dead_letters.process_webhook_events"
+    )
+    def test_replay_is_filtered(self, mock_task):
+        call_command("webhook_dead_letters", replay=True, event="workflow_job")
+        mock_task.apply_async.assert_called_once_with(([2],), queue=None)
+
+    @override_settings(WEBHOOK_QUEUES=4)
+    @patch(
+        "actions_data.management.commands.webhook_dead_letters.process_webhook_events"
+    )
+    def test_replays_are_published_to_the_queue_of_their_repository(self, mock_task):
+        call_command("webhook_dead_letters", replay=True)
+        mock_task.apply_async.assert_called_once_with(([1, 2],), queue="webhooks.3")
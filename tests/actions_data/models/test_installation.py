@@ -0,0 +1,87 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+
+from actions_data.models import Installation, WebhookEvent
+from actions_data.models.installation import INSTALLATION_CACHE
+
+
+@override_settings(INSTALLATION_CACHE_TTL=300, INSTALLATION_CACHE_BACKEND="local")
+class InstallationCacheTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        cache.clear()
+        INSTALLATION_CACHE.entries.clear()
+        self.addCleanup(INSTALLATION_CACHE.entries.clear)
+        with open("tests/resources/sample_webhook_payload.json") as f:
+            self.payload = json.load(f) | {"installation": {"id": 123}}
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = CaseInsensitiveMapping(json.load(f))
+
+    def build_event(self, user_id=2, payload=None) -> WebhookEvent:
+        return WebhookEvent.objects.build_from_headers_and_payload(
+            headers=self.headers, payload=payload or self.payload, user_id=user_id
+        )
+
+    def associate(self, user_id=2, payload=None) -> int:
+        # Installations are cached once the transaction that resolved them commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.build_event(user_id, payload).associate_installation()
+
+    def test_repeat_sender_is_resolved_without_queries(self):
+        installation_id = self.associate()
+        installation = Installation.objects.get(id=installation_id)
+        self.assertEqual(installation.installation_id, 123)
+        self.assertEqual(list(installation.users.values_list("id", flat=True)), [2])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.associate(), installation_id)
+
+    def test_new_user_is_added_once(self):
+        installation_id = self.associate()
+        self.associate(user_id=4)
+        with self.assertNumQueries(0):
+            self.associate(user_id=4)
+        users = Installation.objects.get(id=installation_id).users
+        self.assertEqual(set(users.values_list("id", flat=True)), {2, 4})
+
+    def test_artificial_installation_is_cached_by_webhook_id(self):
+        payload = {k: v for k, v in self.payload.items() if k != "installation"}
+        installation_id = self.associate(payload=payload)
+        self.assertTrue(Installation.objects.get(id=installation_id).is_artificial)
+        with self.assertNumQueries(0):
+            self.associate(payload=payload)
+
+    def test_rolled_back_installation_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.build_event().associate_installation()
+        self.assertEqual(INSTALLATION_CACHE.entries, {})
+
+    def test_deleted_installation_is_invalidated(self):
+        installation_id = self.associate()
+        Installation.objects.get(id=installation_id).delete()
+        self.assertNotEqual(self.associate(), installation_id)
+
+    def test_removed_user_is_added_again(self):
+        installation_id = self.associate()
+        Installation.objects.get(id=installation_id).users.clear()
+        self.associate()
+        self.assertTrue(
+            Installation.objects.get(id=installation_id).users.filter(id=2).exists()
+        )
+
+    @override_settings(INSTALLATION_CACHE_BACKEND="shared")
+    def test_shared_backend_is_invalidated_in_every_process(self):
+        installation_id = self.associate()
+        INSTALLATION_CACHE.entries.clear()
+        with self.assertNumQueries(0):
+            self.associate()
+
+        # Invalidation from another process
+        cache.set(INSTALLATION_CACHE.GENERATION_KEY, 1)
+        Installation.objects.filter(id=installation_id).delete()
+        self.assertNotEqual(self.associate(), installation_id)
@@ -2,7 +2,7 @@ from datetime import timedelta
 
 from django.test import TestCase
 
-from actions_data.models import Job
+from actions_data.models import Job, JobStats, PendingJob
 
 
 class JobStatsTest(TestCase):
@@ -32,3 +32,63 @@ class JobStatsTest(TestCase):
         self.assertEqual(job_stats.started_at, job_stats.completed_at)
         self.assertEqual(job_stats.execution_time, timedelta(0))
         self.assertEqual(job_stats.billable_time, timedelta(minutes=1))
+
+    def test_updated_job_stats_keep_derived_fields(self):
+        job = Job.objects.first()
+        job.save_job_stats_entry()
+        job.name = "renamed"
+        job.completed_at += timedelta(minutes=5)
+        job.save()
+        job_stats = job.save_job_stats_entry()
+        job_stats.refresh_from_db()
+        self.assertEqual(job_stats.job_name, "renamed")
+        self.assertEqual(job_stats.execution_time, timedelta(seconds=389))
+        self.assertEqual(job_stats.billable_time, timedelta(minutes=7))
+
+    def test_stats_of_many_jobs_are_saved_in_constant_queries(self):
+        run = Job.objects.first().workflow_run
+        jobs = list(run.jobs.all())
+        self.assertGreater(len(jobs), 1)
+        # Reading the jobs, upserting the stats and inserting the labels
+        with self.assertNumQueries(3):
+            JobStats.objects.save_for_jobs(run.jobs.all())
+
+        for job in jobs:
+            stats = JobStats.objects.get(job=job)
+            expected = job.save_job_stats_entry()
+            self.assertEqual(stats.execution_time, expected.execution_time)
+            self.assertEqual(stats.billable_time, expected.billable_time)
+            self.assertEqual(stats.job_name, job.name)
+            self.assertEqual(
+                sorted(stats.labels.values_list("label", flat=True)),
+                sorted(job.labels),
+            )
+        self.assertEqual(JobStats.objects.count(), len(jobs))
+
+    def test_run_saves_the_stats_of_pending_jobs(self):
+        run = Job.objects.first().workflow_run
+        jobs = list(run.jobs.all())
+        pending, saved = jobs[:2], jobs[2:]
+        JobStats.objects.save_for_jobs(run.jobs.filter(id__in=[j.id for j in saved]))
+        PendingJob.objects.bulk_create(
+            [PendingJob(job=job, workflow_run=run) for job in pending]
+        )
+        run.save_redundant_data_to_jobs()
+        self.assertEqual(
+            set(JobStats.objects.values_list("job_id", flat=True)),
+            {job.id for job in jobs},
+        )
+        self.assertFalse(PendingJob.objects.exists())
+
+        # Without pending jobs nor jobs missing stats, nothing is written
+        with self.assertNumQueries(2):
+            run.save_redundant_data_to_jobs()
+
+    def test_run_saves_the_stats_of_jobs_stored_without_staging(self):
+        # Jobs written before PendingJob existed were neither staged nor saved
+        run = Job.objects.first().workflow_run
+        run.save_redundant_data_to_jobs()
+        self.assertEqual(
+            set(JobStats.objects.values_list("job_id", flat=True)),
+            set(run.jobs.values_list("id", flat=True)),
+        )
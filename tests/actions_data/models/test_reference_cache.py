@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from actions_data.metrics import REFERENCE_CACHE_LOOKUPS, flush_metrics
+from actions_data.models import OwnerEntity, Repository
+from actions_data.models.reference_cache import REFERENCE_CACHE
+
+
+@override_settings(REFERENCE_CACHE_SIZE=100)
+class ReferenceCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.reset_cache()
+        self.addCleanup(self.reset_cache)
+
+    @staticmethod
+    def reset_cache():
+        REFERENCE_CACHE.entries.clear()
+        REFERENCE_CACHE.synced_at = 0
+        REFERENCE_CACHE.take_lookups()
+
+    @staticmethod
+    def repository_data(name: str = "hello", login: str = "octo") -> dict:
+        return {
+            "id": 2,
+            "name": name,
+            "owner": {
+                "id": 1,
+                "login": login,
+                "type": "User",
+                "avatar_url": "https://avatars/1",
+            },
+        }
+
+    def write_repository(self, data: dict, commit: bool = True) -> Repository:
+        with self.captureOnCommitCallbacks(execute=commit):
+            return Repository.objects.get_or_create_from_dict(data)
+
+    def test_unchanged_entities_are_not_written_again(self):
+        self.write_repository(self.repository_data())
+        with self.assertNumQueries(0):
+            repository = self.write_repository(self.repository_data())
+        self.assertEqual(repository.pk, 2)
+        self.assertEqual(repository.owner.pk, 1)
+        self.assertFalse(repository._state.adding)
+
+        # Only the changed repository is written
+        with self.assertNumQueries(1):
+            self.write_repository(self.repository_data(name="renamed"))
+        self.assertEqual(Repository.objects.get(id=2).name, "renamed")
+
+    def test_rolled_back_writes_are_not_cached(self):
+        self.write_repository(self.repository_data(), commit=False)
+        with self.assertNumQueries(2):
+            self.write_repository(self.repository_data())
+
+    def test_saved_entities_are_written_again(self):
+        self.write_repository(self.repository_data())
+        owner = OwnerEntity.objects.get(id=1)
+        owner.login = "edited"
+        owner.save()
+        with self.assertNumQueries(1):
+            self.write_repository(self.repository_data())
+        self.assertEqual(OwnerEntity.objects.get(id=1).login, "octo")
+
+    def test_invalidations_of_other_processes_clear_the_cache(self):
+        self.write_repository(self.repository_data())
+        cache.set(REFERENCE_CACHE.GENERATION_KEY, 1)
+        REFERENCE_CACHE.synced_at = 0
+        with self.assertNumQueries(2):
+            self.write_repository(self.repository_data())
+
+    @override_settings(REFERENCE_CACHE_SIZE=1)
+    def test_least_recently_used_entities_are_evicted(self):
+        self.write_repository(self.repository_data())
+        self.assertEqual(
+            list(REFERENCE_CACHE.entries), [("actions_data.Repository", 2)]
+        )
+
+    def test_lookups_are_counted(self):
+        self.write_repository(self.repository_data())
+        self.write_repository(self.repository_data(name="renamed"))
+        self.assertEqual(
+            REFERENCE_CACHE.take_lookups(),
+            {
+                ("actions_data.OwnerEntity", "miss"): 1,
+                ("actions_data.OwnerEntity", "hit"): 1,
+                ("actions_data.Repository", "miss"): 2,
+            },
+        )
+
+        self.write_repository(self.repository_data())
+        flush_metrics()
+        self.assertEqual(
+            REFERENCE_CACHE_LOOKUPS.samples(),
+            {
+                ("actions_data.OwnerEntity", "hit"): 1,
+                ("actions_data.Repository", "miss"): 1,
+            },
+        )
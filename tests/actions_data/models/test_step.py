@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.test import TestCase
+
+from actions_data.models import Job, JobStats, Step, StepName, WebhookEvent
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+from actions_data.queries import get_step_hotspots_raw_sql
+
+
+class StepTest(TestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def setUp(self):
+        process_webhook_event_batch(list(WebhookEvent.objects.order_by("id")))
+        payload = WebhookEvent.objects.get(id=2).parsed_payload["workflow_job"]
+        self.job = Job.objects.get(id=payload["id"])
+
+    def test_steps_are_written_with_interned_names(self):
+        steps = Step.objects.filter(job=self.job).order_by("number")
+        self.assertEqual(
+            [step.number for step in steps],
+            [step["number"] for step in self.job.steps],
+        )
+        step = steps.get(name__name="Set up Docker Buildx")
+        self.assertEqual(step.duration_seconds, 13)
+        self.assertEqual(step.conclusion, "success")
+        names = {step["name"] for job in Job.objects.all() for step in job.steps}
+        self.assertEqual(StepName.objects.count(), len(names))
+
+    def test_removed_steps_are_deleted(self):
+        self.job.steps = self.job.steps[:2]
+
+        Step.objects.save_for_jobs([self.job])
+
+        self.assertEqual(
+            list(Step.objects.filter(job=self.job).values_list("number", flat=True)),
+            [1, 2],
+        )
+
+    def test_jobs_in_progress_are_skipped(self):
+        Step.objects.all().delete()
+        self.job.status = "in_progress"
+
+        self.assertEqual(Step.objects.save_for_jobs([self.job]), [])
+        self.assertFalse(Step.objects.exists())
+
+    def test_step_hotspots(self):
+        stats = JobStats.objects.get(job=self.job)
+
+        hotspots = get_step_hotspots_raw_sql(
+            workflow_id=stats.workflow_id,
+            start_date=stats.started_at - timedelta(days=1),
+            end_date=stats.started_at + timedelta(days=1),
+            limit=2,
+        )
+
+        by_total = sorted(
+            (step for step in hotspots if step["rank_total"] <= 2),
+            key=lambda step: step["rank_total"],
+        )
+        self.assertEqual(by_total[0]["name"], "Set up Docker Buildx")
+        self.assertEqual(by_total[0]["total_time"], timedelta(seconds=13))
+        self.assertEqual(by_total[0]["p95_time"], timedelta(seconds=13))
+        self.assertEqual(by_total[0]["runs"], 1)
@@ -0,0 +1,108 @@
+from django.db import connection
+from django.test import TestCase
+from freezegun import freeze_time
+
+from actions_data.models import OwnerEntity, PullRequest, Repository, WorkflowRun
+from actions_data.models.upsert import upsert
+
+
+class UpsertTest(TestCase):
+
+    def setUp(self):
+        self.owner = OwnerEntity.objects.create(
+            id=1, login="octo", entity_type="User", webhook_enabled=True
+        )
+        self.repository = Repository.objects.create(
+            id=2, name="hello", owner=self.owner
+        )
+
+    @staticmethod
+    def row_version(model, pk) -> str:
+        """Location of the current version of the row, which any update changes."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT ctid::text FROM {model._meta.db_table} WHERE id = %s", [pk]
+            )
+            return cursor.fetchone()[0]
+
+    def upsert_owner(self, login: str):
+        return upsert(
+            [OwnerEntity(id=1, login=login, entity_type="User")],
+            unique_fields=["id"],
+            update_fields=["login", "entity_type"],
+        )[0]
+
+    def test_changed_rows_are_updated(self):
+        self.upsert_owner("renamed")
+        owner = OwnerEntity.objects.get(id=1)
+        self.assertEqual(owner.login, "renamed")
+        # Fields that aren't updated keep their stored values
+        self.assertTrue(owner.webhook_enabled)
+
+    def test_unchanged_rows_are_not_rewritten(self):
+        version = self.row_version(OwnerEntity, 1)
+        with self.assertNumQueries(1):
+            owner = self.upsert_owner("octo")
+        self.assertEqual(owner.pk, 1)
+        self.assertEqual(self.row_version(OwnerEntity, 1), version)
+
+        self.upsert_owner("renamed")
+        self.assertNotEqual(self.row_version(OwnerEntity, 1), version)
+
+    def test_auto_now_fields_are_only_updated_with_changes(self):
+        with freeze_time("2024-01-01"):
+            upsert(
+                [PullRequest(id=3, number=1, url="https://a")],
+                unique_fields=["id"],
+                update_fields=["number", "url"],
+            )
+        with freeze_time("2024-02-01"):
+            upsert(
+                [PullRequest(id=3, number=1, url="https://a")],
+                unique_fields=["id"],
+                update_fields=["number", "url"],
+            )
+            pull_request = PullRequest.objects.get(id=3)
+            self.assertEqual(pull_request.updated_at.month, 1)
+            upsert(
+                [PullRequest(id=3, number=2, url="https://a")],
+                unique_fields=["id"],
+                update_fields=["number", "url"],
+            )
+        pull_request = PullRequest.objects.get(id=3)
+        self.assertEqual(pull_request.number, 2)
+        self.assertEqual(pull_request.created_at.month, 1)
+        self.assertEqual(pull_request.updated_at.month, 2)
+
+    def test_primary_keys_are_set_for_every_row(self):
+        stored = WorkflowRun.objects.create(
+            run_id=10, run_attempt=1, name="build", repository=self.repository
+        )
+        runs = upsert(
+            [
+                WorkflowRun(
+                    run_id=10, run_attempt=1, name="build", repository=self.repository
+                ),
+                WorkflowRun(
+                    run_id=10, run_attempt=2, name="build", repository=self.repository
+                ),
+            ],
+            unique_fields=["run_id", "run_attempt"],
+            update_fields=["name", "repository"],
+        )
+        self.assertEqual(runs[0].pk, stored.pk)
+        self.assertEqual(
+            runs[1].pk, WorkflowRun.objects.get(run_id=10, run_attempt=2).pk
+        )
+
+    def test_conflicting_rows_are_kept_without_update_fields(self):
+        stored = WorkflowRun.objects.create(
+            run_id=10, run_attempt=1, name="build", repository=self.repository
+        )
+        [run] = upsert(
+            [WorkflowRun(run_id=10, run_attempt=1, repository=self.repository)],
+            unique_fields=["run_id", "run_attempt"],
+            update_fields=[],
+        )
+        self.assertEqual(run.pk, stored.pk)
+        self.assertEqual(WorkflowRun.objects.get(pk=stored.pk).name, "build")
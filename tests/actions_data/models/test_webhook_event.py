@@ -0,0 +1,83 @@
+import json
+
+from django.forms.models import model_to_dict
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+
+from actions_data.models import Job, WebhookEvent, WebhookEventArchive, WorkflowRun
+from actions_data.models.payload_projection import CURRENT_PROJECTION_VERSION
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_processor import process_webhook_event_instance
+
+
+@override_settings(WEBHOOK_PAYLOAD_PROJECTION=True)
+class WebhookEventProjectionTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+
+    def create_event(self, resource: str, event: str, delivery: str) -> WebhookEvent:
+        with open(f"tests/resources/{resource}", "rb") as f:
+            body = f.read()
+        headers = CaseInsensitiveMapping(
+            self.headers | {"X-GitHub-Delivery": delivery, "X-GitHub-Event": event}
+        )
+        return WebhookEvent.objects.create_from_headers_and_body(
+            headers=headers, body=body, user_id=2
+        )
+
+    def test_payload_is_projected_and_archived(self):
+        event = self.create_event(
+            "sample_webhook_payload.json", "workflow_run", "projected"
+        )
+        event = WebhookEvent.objects.get(id=event.id)
+        with open("tests/resources/sample_webhook_payload.json") as f:
+            full_payload = json.load(f)
+        self.assertEqual(event.projection_version, CURRENT_PROJECTION_VERSION)
+        self.assertNotIn("sender", event.payload)
+        self.assertNotIn("organization", event.payload)
+        self.assertLess(len(json.dumps(event.payload)), len(json.dumps(full_payload)))
+        self.assertEqual(event.full_payload, full_payload)
+
+    @override_settings(WEBHOOK_PAYLOAD_STORAGE="compressed")
+    def test_raw_payload_is_projected_by_the_worker(self):
+        event = self.create_event(
+            "sample_job_webhook_payload.json", "workflow_job", "raw"
+        )
+        self.assertFalse(WebhookEventArchive.objects.filter(event=event).exists())
+        event = WebhookEvent.objects.get(id=event.id)
+        self.assertEqual(process_webhook_event_instance(event), OperationResult.SUCCESS)
+
+        event = WebhookEvent.objects.get(id=event.id)
+        self.assertIsNone(event.raw_payload)
+        self.assertEqual(event.projection_version, CURRENT_PROJECTION_VERSION)
+        with open("tests/resources/sample_job_webhook_payload.json") as f:
+            self.assertEqual(event.full_payload, json.load(f))
+
+    def test_projected_events_are_processed_like_full_ones(self):
+        results = {}
+        for projection in (False, True):
+            with override_settings(WEBHOOK_PAYLOAD_PROJECTION=projection):
+                run_event = self.create_event(
+                    "sample_webhook_payload.json", "workflow_run", f"run-{projection}"
+                )
+                job_event = self.create_event(
+                    "sample_job_webhook_payload.json",
+                    "workflow_job",
+                    f"job-{projection}",
+                )
+                process_webhook_event_instance(run_event)
+                process_webhook_event_instance(job_event)
+            results[projection] = [
+                model_to_dict(run, exclude=["id", "webhook_events"])
+                for run in WorkflowRun.objects.order_by("run_id")
+            ] + [
+                model_to_dict(job, exclude=["webhook_events", "workflow_run"])
+                for job in Job.objects.all()
+            ]
+            WorkflowRun.objects.all().delete()
+            Job.objects.all().delete()
+        self.assertEqual(results[False], results[True])
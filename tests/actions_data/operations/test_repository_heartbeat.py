@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import redis
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+
+from actions_data.models import OwnerEntity, Repository
+from actions_data.operations import repository_heartbeat
+from actions_data.operations.repository_heartbeat import (
+    LOCAL_HEARTBEATS,
+    flush_recorded_heartbeats,
+    last_webhooks_received,
+    record_heartbeats,
+)
+
+NOW = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+@freeze_time(NOW)
+class RepositoryHeartbeatTest(TestCase):
+
+    def setUp(self):
+        LOCAL_HEARTBEATS.pop_all()
+        self.addCleanup(LOCAL_HEARTBEATS.pop_all)
+        owner = OwnerEntity.objects.create(id=1, login="octo", entity_type="User")
+        self.repositories = [
+            Repository.objects.create(id=i, name=f"repo{i}", owner=owner)
+            for i in (1, 2, 3)
+        ]
+
+    def test_heartbeats_are_written_with_one_query(self):
+        with self.assertNumQueries(0):
+            record_heartbeats([1, 2])
+            record_heartbeats([2])
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_recorded_heartbeats(), 2)
+        self.assertEqual(
+            dict(Repository.objects.values_list("id", "last_webhook_received")),
+            {1: NOW, 2: NOW, 3: None},
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_recorded_heartbeats(), 0)
+
+    @patch.object(repository_heartbeat, "LOCAL_FLUSH_INTERVAL", 0)
+    def test_local_heartbeats_are_written_when_due(self):
+        record_heartbeats([3])
+        self.assertEqual(Repository.objects.get(id=3).last_webhook_received, NOW)
+
+    def test_last_webhooks_received_include_pending_heartbeats(self):
+        Repository.objects.filter(id__in=[1, 2]).update(
+            last_webhook_received=datetime(2025, 1, 1, tzinfo=timezone.utc)
+        )
+        record_heartbeats([2])
+        repositories = list(Repository.objects.order_by("id"))
+        self.assertEqual(
+            last_webhooks_received(repositories),
+            {1: datetime(2025, 1, 1, tzinfo=timezone.utc), 2: NOW, 3: None},
+        )
+
+    @override_settings(REPOSITORY_HEARTBEAT_BACKEND="redis")
+    @patch("actions_data.operations.repository_heartbeat.get_redis_heartbeats")
+    def test_redis_heartbeats_are_merged(self, mock_heartbeats):
+        mock_heartbeats.return_value.pop_all.return_value = {
+            1: NOW.timestamp(),
+            2: NOW.timestamp() - 60,
+        }
+        record_heartbeats([1])
+        mock_heartbeats.return_value.record.assert_called_once_with(
+            {1: NOW.timestamp()}
+        )
+
+        LOCAL_HEARTBEATS.record({2: NOW.timestamp()})
+        self.assertEqual(flush_recorded_heartbeats(), 2)
+        self.assertEqual(
+            dict(Repository.objects.values_list("id", "last_webhook_received")),
+            {1: NOW, 2: NOW, 3: None},
+        )
+
+    @override_settings(REPOSITORY_HEARTBEAT_BACKEND="redis")
+    @patch("actions_data.operations.repository_heartbeat.get_redis_heartbeats")
+    def test_local_heartbeats_are_used_when_redis_fails(self, mock_heartbeats):
+        mock_heartbeats.return_value.record.side_effect = redis.ConnectionError()
+        mock_heartbeats.return_value.get.side_effect = redis.ConnectionError()
+        with self.assertLogs(repository_heartbeat.logger, "WARNING"):
+            record_heartbeats([1])
+        with self.assertLogs(repository_heartbeat.logger, "WARNING"):
+            self.assertEqual(last_webhooks_received(self.repositories)[1], NOW)
@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from freezegun import freeze_time
+
+from actions_data.models import WebhookEvent, WorkflowRun
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_backlog import drain_backlog_batch
+
+
+@freeze_time("2024-10-08")
+class WebhookBacklogTest(TestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def setUp(self):
+        WorkflowRun.objects.all().delete()
+
+    def test_batches_are_claimed_in_id_order(self):
+        results = drain_backlog_batch(batch_size=1)
+        self.assertEqual(results, {1: OperationResult.SUCCESS})
+        results = drain_backlog_batch(batch_size=10, after_id=1)
+        self.assertEqual(min(results), 2)
+        self.assertFalse(WebhookEvent.objects.due_for_processing().exists())
+        self.assertEqual(drain_backlog_batch(batch_size=10), {})
+
+    @patch("actions_data.operations.webhook_backlog.process_webhook_event_batch")
+    def test_failed_events_are_left_for_a_later_attempt(self, mock_process):
+        mock_process.return_value = {1: OperationResult.FAILURE}
+        drain_backlog_batch(batch_size=1)
+        event = WebhookEvent.objects.get(id=1)
+        self.assertEqual(event.attempts, 1)
+        self.assertNotIn(event, WebhookEvent.objects.due_for_processing())
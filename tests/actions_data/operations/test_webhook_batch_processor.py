@@ -0,0 +1,207 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from freezegun import freeze_time
+
+from actions_data.models import (
+    Job,
+    JobStats,
+    JobStatsLabel,
+    OwnerEntity,
+    PendingJob,
+    PullRequest,
+    Repository,
+    WebhookEvent,
+    Workflow,
+    WorkflowRun,
+)
+from actions_data.operations.repository_heartbeat import LOCAL_HEARTBEATS
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+from actions_data.operations.webhook_processor import process_webhook_event_instance
+from actions_data.tasks import process_webhook_events
+
+
+def without_keys(rows, *keys):
+    return sorted(
+        ({k: v for k, v in row.items() if k not in keys} for row in rows), key=str
+    )
+
+
+@freeze_time("2024-10-08")
+class TestWebhookBatchProcessor(TestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def setUp(self):
+        WorkflowRun.objects.all().delete()
+        cache.clear()
+        # Heartbeats written by the process when due are not part of the budget
+        LOCAL_HEARTBEATS.pop_all()
+        # Installations are created on first sight, outside of the compared writes
+        for event in WebhookEvent.objects.all():
+            event.associate_installation()
+            event.save(update_fields=["installation"])
+
+    def snapshot(self) -> dict:
+        """Processed rows, with rows of generated ids identified by their key."""
+        return {
+            "owners": without_keys(OwnerEntity.objects.values()),
+            "repositories": without_keys(Repository.objects.values()),
+            "pull_requests": without_keys(PullRequest.objects.values()),
+            "workflows": without_keys(Workflow.objects.values()),
+            "runs": without_keys(WorkflowRun.objects.values(), "id"),
+            "run_pull_requests": sorted(
+                WorkflowRun.pull_requests.through.objects.values_list(
+                    "workflowrun__run_id", "pullrequest_id"
+                )
+            ),
+            "run_events": sorted(
+                WorkflowRun.webhook_events.through.objects.values_list(
+                    "workflowrun__run_id", "webhookevent_id"
+                )
+            ),
+            "jobs": without_keys(
+                Job.objects.values("workflow_run__run_id", *JOB_FIELDS)
+            ),
+            "job_events": sorted(
+                Job.webhook_events.through.objects.values_list(
+                    "job_id", "webhookevent_id"
+                )
+            ),
+            "stats": without_keys(
+                JobStats.objects.values("workflow_run__run_id", *JOB_STATS_FIELDS)
+            ),
+            "labels": sorted(
+                JobStatsLabel.objects.values_list("job_stats__job_id", "label")
+            ),
+            "pending_jobs": sorted(
+                PendingJob.objects.values_list("job_id", "workflow_run__run_id")
+            ),
+            "events": sorted(
+                WebhookEvent.objects.values_list("id", "processed_at", "installation")
+            ),
+        }
+
+    def assert_same_as_one_by_one(self, event_ids: list[int]):
+        with transaction.atomic():
+            for event in WebhookEvent.objects.filter(id__in=event_ids).order_by("id"):
+                process_webhook_event_instance(event)
+            expected = self.snapshot()
+            transaction.set_rollback(True)
+        cache.clear()
+
+        events = list(WebhookEvent.objects.filter(id__in=event_ids).order_by("id"))
+        results = process_webhook_event_batch(events)
+        self.assertEqual(
+            results, {event_id: OperationResult.SUCCESS for event_id in event_ids}
+        )
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_runs_and_jobs(self):
+        self.assert_same_as_one_by_one([1, 2, 3, 4])
+        self.assertEqual(JobStats.objects.count(), 2)
+
+    def test_jobs_before_their_runs(self):
+        self.assert_same_as_one_by_one([2, 4])
+        self.assertEqual(WorkflowRun.objects.filter(name=None).count(), 2)
+        self.assertEqual(PendingJob.objects.count(), 2)
+
+    def test_runs_of_stored_jobs(self):
+        for event_id in [2, 4]:
+            process_webhook_event_instance(WebhookEvent.objects.get(id=event_id))
+        self.assert_same_as_one_by_one([1, 3])
+        self.assertEqual(JobStats.objects.count(), 2)
+        self.assertFalse(PendingJob.objects.exists())
+
+    def test_runs_of_jobs_stored_without_staging(self):
+        for event_id in [2, 4]:
+            process_webhook_event_instance(WebhookEvent.objects.get(id=event_id))
+        # Jobs written before PendingJob existed were neither staged nor saved
+        PendingJob.objects.all().delete()
+        self.assert_same_as_one_by_one([1, 3])
+        self.assertEqual(JobStats.objects.count(), 2)
+
+    def test_jobs_of_stored_runs(self):
+        process_webhook_event_instance(WebhookEvent.objects.get(id=1))
+        self.assert_same_as_one_by_one([2, 3, 4])
+
+    def test_events_processed_again(self):
+        for event_id in [1, 2, 3, 4]:
+            process_webhook_event_instance(WebhookEvent.objects.get(id=event_id))
+        self.assert_same_as_one_by_one([1, 2, 3, 4])
+
+    def test_invalid_and_non_processable_events(self):
+        invalid = WebhookEvent.objects.get(id=3)
+        invalid.payload = {"action": "completed", "repository": {"name": "x"}}
+        invalid.save()
+        ignored = WebhookEvent.objects.get(id=4)
+        ignored.payload["action"] = "queued"
+        ignored.save()
+
+        events = list(WebhookEvent.objects.order_by("id"))
+        results = process_webhook_event_batch(events)
+        self.assertEqual(
+            results,
+            {
+                1: OperationResult.SUCCESS,
+                2: OperationResult.SUCCESS,
+                3: OperationResult.FAILURE,
+                4: OperationResult.NOOP,
+            },
+        )
+        self.assertFalse(WebhookEvent.objects.filter(id=4).exists())
+        self.assertFalse(WorkflowRun.objects.filter(run_id=11569338149).exists())
+        self.assertEqual(JobStats.objects.get().job_id, 30264097335)
+
+    def test_failed_batch_is_processed_one_by_one(self):
+        event = WebhookEvent.objects.get(id=4)
+        job = event.payload["workflow_job"]
+        # Completed long before starting, which the job stats reject
+        job["completed_at"] = "2020-01-01T00:00:00Z"
+        job["steps"] = []
+        event.save()
+        process_webhook_event_instance(WebhookEvent.objects.get(id=3))
+
+        events = list(WebhookEvent.objects.order_by("id"))
+        results = process_webhook_event_batch(events)
+        self.assertEqual(results[4], OperationResult.FAILURE)
+        # The run of event 3 was already written from the same content
+        self.assertEqual(
+            [results[event_id] for event_id in [1, 2, 3]],
+            [OperationResult.SUCCESS, OperationResult.SUCCESS, OperationResult.NOOP],
+        )
+        self.assertTrue(JobStats.objects.filter(job_id=30264097335).exists())
+
+    def test_batch_queries_do_not_grow_with_events(self):
+        events = list(WebhookEvent.objects.order_by("id"))
+        # Prefetching the runs, resolving the installation of the 2 run events,
+        # one statement per table written in a savepoint, and locking the runs
+        # of the jobs in another one. Steps take 3 more, to intern their names,
+        # upsert them and delete the ones their jobs no longer have
+        with self.assertNumQueries(25):
+            process_webhook_event_batch(events)
+
+    def test_task_processes_the_batch(self):
+        process_webhook_events([1, 2])
+        self.assertTrue(JobStats.objects.filter(job_id=30264097335).exists())
+        self.assertFalse(
+            WebhookEvent.objects.filter(id__in=[1, 2], processed_at=None).exists()
+        )
+
+
+JOB_FIELDS = [
+    field.attname
+    for field in Job._meta.concrete_fields
+    if field.attname not in ("workflow_run_id",)
+]
+JOB_STATS_FIELDS = [
+    field.attname
+    for field in JobStats._meta.concrete_fields
+    if field.attname not in ("id", "workflow_run_id")
+]
@@ -0,0 +1,149 @@
+import json
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+
+from actions_data.models import WebhookEvent
+from actions_data.models.installation import INSTALLATION_CACHE
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_buffer import LOCAL_STORE, get_webhook_buffer
+from actions_data.operations.webhook_ingestion import ingest_webhook
+
+
+@override_settings(
+    WEBHOOK_INGESTION_MODE="buffered",
+    WEBHOOK_BUFFER_BACKEND="local",
+    WEBHOOK_BUFFER_FLUSH_SIZE=2,
+    WEBHOOK_BUFFER_ACK="before_flush",
+)
+@patch("actions_data.operations.webhook_buffer.process_webhook_events")
+class WebhookBufferTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        # Installations cached by committed callbacks are rolled back with the test
+        self.addCleanup(INSTALLATION_CACHE.entries.clear)
+        LOCAL_STORE.clear()
+        with open("tests/resources/sample_webhook_payload.json", "rb") as f:
+            self.body = f.read()
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+
+    def ingest(self, delivery: str) -> OperationResult:
+        headers = CaseInsensitiveMapping(self.headers | {"X-GitHub-Delivery": delivery})
+        return ingest_webhook(self.body, headers, user_id=2)
+
+    def test_buffers_until_flush_size(self, mock_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.ingest("first"), OperationResult.IN_PROGRESS)
+        self.assertFalse(WebhookEvent.objects.exists())
+        mock_task.apply_async.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.ingest("second"), OperationResult.IN_PROGRESS)
+        events = WebhookEvent.objects.order_by("id")
+        self.assertEqual([e.delivery for e in events], ["first", "second"])
+        self.assertEqual(events[0].payload, json.loads(self.body))
+        self.assertEqual(events[0].user_id, 2)
+        self.assertIsNotNone(events[0].installation)
+        mock_task.apply_async.assert_called_once_with(
+            ([e.id for e in events],), queue=None
+        )
+
+    @override_settings(WEBHOOK_BUFFER_ACK="after_flush")
+    def test_after_flush_ack_writes_before_returning(self, mock_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.ingest("first"), OperationResult.SUCCESS)
+        event = WebhookEvent.objects.get(delivery="first")
+        mock_task.apply_async.assert_called_once_with(([event.id],), queue=None)
+        self.assertEqual(get_webhook_buffer().length(), 0)
+
+    def test_flush_command_drains_buffer(self, mock_task):
+        self.ingest("first")
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("flush_webhook_buffer", once=True)
+        self.assertTrue(WebhookEvent.objects.filter(delivery="first").exists())
+        self.assertEqual(get_webhook_buffer().length(), 0)
+
+    def test_failed_flush_requeues_deliveries(self, mock_task):
+        self.ingest("first")
+        buffer = get_webhook_buffer()
+        with patch.object(
+            WebhookEvent.objects,
+            "bulk_insert_or_ignore",
+            side_effect=Exception("Database unavailable"),
+        ):
+            with self.assertRaises(Exception):
+                buffer.flush()
+        self.assertEqual(buffer.length(), 1)
+        buffer.flush()
+        self.assertTrue(WebhookEvent.objects.filter(delivery="first").exists())
+
+    @override_settings(WEBHOOK_PAYLOAD_STORAGE="compressed")
+    def test_compressed_storage_defers_parsing(self, mock_task):
+        self.ingest("first")
+        self.ingest("second")
+        event = WebhookEvent.objects.get(delivery="first")
+        self.assertIsNone(event.payload)
+        self.assertIsNone(event.installation)
+        self.assertTrue(event.raw_payload_compressed)
+        self.assertEqual(event.parsed_payload, json.loads(self.body))
+
+    def test_duplicate_deliveries_are_dropped(self, mock_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingest("first")
+            self.ingest("first")
+        self.ingest("second")
+        self.ingest("first")
+        events = WebhookEvent.objects.order_by("id")
+        self.assertEqual([e.delivery for e in events], ["first", "second"])
+        mock_task.apply_async.assert_called_once_with(([events[0].id],), queue=None)
+
+    def test_invalid_json_is_dropped(self, mock_task):
+        ingest_webhook(b"not json", CaseInsensitiveMapping(self.headers), user_id=2)
+        self.ingest("second")
+        self.assertEqual(
+            list(WebhookEvent.objects.values_list("delivery", flat=True)), ["second"]
+        )
+
+    @override_settings(WEBHOOK_BUFFER_ACK="after_flush")
+    def test_after_flush_ack_fails_for_dropped_deliveries(self, mock_task):
+        with self.assertLogs("actions_data.operations.webhook_buffer", "ERROR"):
+            result = ingest_webhook(
+                b"not json", CaseInsensitiveMapping(self.headers), user_id=2
+            )
+        self.assertEqual(result, OperationResult.FAILURE)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_malformed_entry_does_not_lose_the_batch(self, mock_task):
+        LOCAL_STORE.push("{not an entry")
+        with self.assertLogs("actions_data.operations.webhook_buffer", "ERROR"):
+            self.ingest("first")
+        self.assertTrue(WebhookEvent.objects.filter(delivery="first").exists())
+
+    @patch("actions_data.management.commands.flush_webhook_buffer.time.sleep")
+    def test_flusher_survives_failed_flushes(self, mock_sleep, mock_task):
+        buffer = get_webhook_buffer()
+        for _ in range(2):
+            buffer.append(body=self.body.decode(), headers=self.headers, user_id=2)
+        # Stops the flusher at its third wait
+        mock_sleep.side_effect = [None, None, KeyboardInterrupt]
+        with (
+            patch.object(
+                WebhookEvent.objects,
+                "bulk_insert_or_ignore",
+                side_effect=Exception("Database unavailable"),
+            ),
+            self.assertLogs(
+                "actions_data.management.commands.flush_webhook_buffer", "ERROR"
+            ) as logs,
+            self.assertRaises(KeyboardInterrupt),
+        ):
+            call_command("flush_webhook_buffer")
+        self.assertEqual(len(logs.output), 3)
+        backoffs = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(backoffs, [1.0, 2.0, 4.0])
+        self.assertEqual(buffer.length(), 2)
@@ -0,0 +1,91 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+
+from actions_data.metrics import WEBHOOK_DELIVERIES, flush_metrics
+from actions_data.models import WebhookEvent
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_ingestion import ingest_webhook, peek_action
+
+
+@patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+class IngressPolicyTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        flush_metrics()
+        cache.clear()
+        with open("tests/resources/sample_webhook_payload.json", "rb") as f:
+            self.payload = json.load(f)
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+
+    def ingest(self, action: str, event: str = "workflow_run") -> OperationResult:
+        body = json.dumps(self.payload | {"action": action}).encode()
+        headers = CaseInsensitiveMapping(
+            self.headers | {"X-GitHub-Delivery": action, "X-GitHub-Event": event}
+        )
+        return ingest_webhook(body, headers, user_id=2)
+
+    @override_settings(WEBHOOK_INGRESS_POLICY="drop")
+    def test_drop_policy_skips_non_processable_events(self, mock_task):
+        self.assertEqual(self.ingest("queued"), OperationResult.NOOP)
+        self.assertEqual(self.ingest("completed"), OperationResult.SUCCESS)
+        self.assertEqual(
+            list(WebhookEvent.objects.values_list("delivery", flat=True)),
+            ["completed"],
+        )
+        mock_task.apply_async.assert_called_once()
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_DELIVERIES.samples(),
+            {
+                ("workflow_run", "queued", "dropped"): 1,
+                ("workflow_run", "completed", "accepted"): 1,
+            },
+        )
+
+    @override_settings(WEBHOOK_INGRESS_POLICY="drop")
+    def test_drop_policy_skips_other_event_types(self, mock_task):
+        self.assertEqual(self.ingest("completed", event="push"), OperationResult.NOOP)
+        self.assertFalse(WebhookEvent.objects.exists())
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_DELIVERIES.value(event="push", outcome="dropped"),
+            1,
+        )
+
+    @override_settings(WEBHOOK_INGRESS_POLICY="count")
+    def test_count_policy_ingests_every_event(self, mock_task):
+        self.assertEqual(self.ingest("in_progress"), OperationResult.SUCCESS)
+        self.assertTrue(WebhookEvent.objects.filter(delivery="in_progress").exists())
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_DELIVERIES.value(
+                event="workflow_run", action="in_progress", outcome="accepted"
+            ),
+            1,
+        )
+        out = StringIO()
+        call_command("show_webhook_counters", stdout=out)
+        self.assertIn(
+            "event=workflow_run, action=in_progress, outcome=accepted: 1",
+            out.getvalue(),
+        )
+
+    def test_accept_policy_does_not_count(self, mock_task):
+        self.assertEqual(self.ingest("queued"), OperationResult.SUCCESS)
+        flush_metrics()
+        self.assertEqual(WEBHOOK_DELIVERIES.samples(), {})
+
+    def test_peek_action(self, mock_task):
+        self.assertEqual(peek_action(b'{"action": "queued", "id": 1}'), "queued")
+        self.assertEqual(peek_action(b'{"id": 1, "action": "queued"}'), "queued")
+        self.assertIsNone(peek_action(b'{"id": 1}'))
+        self.assertIsNone(peek_action(b"not json"))
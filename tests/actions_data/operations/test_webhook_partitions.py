@@ -0,0 +1,144 @@
+import json
+from datetime import date, datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils.datastructures import CaseInsensitiveMapping
+from freezegun import freeze_time
+
+from actions_data.models import WebhookDelivery, WebhookEvent, WebhookEventArchive
+from actions_data.operations.webhook_partitions import (
+    DEFAULT_PARTITION,
+    Partition,
+    create_partition,
+    list_partitions,
+    maintain_partitions,
+)
+
+
+class WebhookPartitionsTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+        with open("tests/resources/sample_webhook_payload.json", "rb") as f:
+            self.body = f.read()
+
+    def create_event(self, delivery: str) -> WebhookEvent:
+        headers = CaseInsensitiveMapping(self.headers | {"X-GitHub-Delivery": delivery})
+        return WebhookEvent.objects.create_from_headers_and_body(
+            headers=headers, body=self.body, user_id=2
+        )
+
+    def partition_of(self, event: WebhookEvent) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM actions_data_webhookevent WHERE id = %s",
+                [event.id],
+            )
+            return cursor.fetchone()[0]
+
+    def create_old_event(self, delivery: str, processed: bool) -> WebhookEvent:
+        with freeze_time("2020-01-15"):
+            event = self.create_event(delivery)
+            if processed:
+                event.processed_at = datetime(2020, 1, 16, tzinfo=timezone.utc)
+                event.save(update_fields=["processed_at"])
+        return event
+
+    def test_partitions_are_created_ahead(self):
+        with freeze_time("2040-05-20"):
+            created, _ = maintain_partitions(months_ahead=2, retention_days=36500)
+            self.assertEqual(
+                [partition.name for partition in created],
+                [
+                    "actions_data_webhookevent_p204005",
+                    "actions_data_webhookevent_p204006",
+                    "actions_data_webhookevent_p204007",
+                ],
+            )
+            self.assertEqual(maintain_partitions(2, 36500), ([], []))
+            event = self.create_event("future")
+        self.assertEqual(self.partition_of(event), "actions_data_webhookevent_p204005")
+
+    def test_events_are_moved_out_of_the_default_partition(self):
+        with freeze_time("2041-02-03"):
+            event = self.create_event("early")
+            self.assertEqual(self.partition_of(event), DEFAULT_PARTITION)
+            maintain_partitions(months_ahead=0, retention_days=90)
+        self.assertEqual(self.partition_of(event), "actions_data_webhookevent_p204102")
+        self.assertEqual(WebhookEvent.objects.get(id=event.id).delivery, "early")
+
+    def test_expired_processed_partition_is_dropped(self):
+        create_partition(Partition.for_month(date(2020, 1, 1)))
+        event = self.create_old_event("old", processed=True)
+        WebhookEventArchive.objects.create(event_id=event.id, payload=b"")
+        self.assertEqual(self.partition_of(event), "actions_data_webhookevent_p202001")
+
+        created, dropped = maintain_partitions(months_ahead=0, retention_days=90)
+        self.assertEqual(dropped, [Partition.for_month(date(2020, 1, 1))])
+        self.assertNotIn(dropped[0], list_partitions())
+        self.assertFalse(WebhookEvent.objects.filter(id=event.id).exists())
+        self.assertFalse(WebhookEventArchive.objects.filter(event_id=event.id).exists())
+        self.assertFalse(WebhookDelivery.objects.filter(delivery="old").exists())
+
+    def test_expired_partition_with_unprocessed_events_is_kept(self):
+        create_partition(Partition.for_month(date(2020, 1, 1)))
+        self.create_old_event("processed", processed=True)
+        self.create_old_event("unprocessed", processed=False)
+
+        out = StringIO()
+        call_command("maintain_webhook_partitions", "--months-ahead=0", stdout=out)
+        self.assertNotIn("actions_data_webhookevent_p202001", out.getvalue())
+        self.assertIn(Partition.for_month(date(2020, 1, 1)), list_partitions())
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+
+    def test_dangling_references_are_reported(self):
+        event = self.create_event("archived")
+        WebhookEventArchive.objects.create(event_id=event.id, payload=b"")
+        WebhookEventArchive.objects.create(event_id=event.id + 1, payload=b"")
+
+        out, err = StringIO(), StringIO()
+        call_command(
+            "maintain_webhook_partitions",
+            "--dry-run",
+            "--check-references",
+            stdout=out,
+            stderr=err,
+        )
+        self.assertIn(
+            "1 rows of actions_data_webhookeventarchive reference no event",
+            err.getvalue(),
+        )
+        self.assertIn(
+            "All rows of actions_data_job_webhook_events reference an event",
+            out.getvalue(),
+        )
+
+    def test_dry_run_changes_nothing(self):
+        with freeze_time("2042-07-01"):
+            out = StringIO()
+            call_command(
+                "maintain_webhook_partitions",
+                "--months-ahead=0",
+                "--dry-run",
+                stdout=out,
+            )
+            self.assertIn(
+                "Would create partition actions_data_webhookevent_p204207",
+                out.getvalue(),
+            )
+            self.assertNotIn(
+                Partition.for_month(date(2042, 7, 1)),
+                list_partitions(),
+            )
+
+    def test_redeliveries_are_dropped_across_partitions(self):
+        self.assertIsNotNone(self.create_event("redelivered"))
+        with freeze_time("2043-01-01"):
+            self.assertIsNone(self.create_event("redelivered"))
+        self.assertEqual(WebhookEvent.objects.filter(delivery="redelivered").count(), 1)
@@ -1,3 +1,5 @@
+import json
+import zlib
 from datetime import timedelta
 from unittest import skipIf
 
@@ -5,7 +7,8 @@ from django.contrib.auth.models import User
 from django.test import TestCase
 from freezegun import freeze_time
 
-from actions_data.models import WebhookEvent, WorkflowRun, Job
+from actions_data.models import WebhookEvent, WorkflowRun, Job, PendingJob
+from actions_data.operations.repository_heartbeat import LOCAL_HEARTBEATS
 from actions_data.operations.schemas import OperationResult
 from actions_data.operations.webhook_processor import (
     process_webhook_event_instance,
@@ -44,9 +47,26 @@ class TestWebhookProcessor(TestCase):
         result = process_webhook_event_instance(event)
         self.assertEqual(result, OperationResult.SUCCESS)
         result = process_webhook_event_instance(event)
-        self.assertEqual(result, OperationResult.SUCCESS)
+        self.assertEqual(result, OperationResult.NOOP)
         wf_run = WorkflowRun.objects.get(run_id=10905389638)
         self.assertEqual(wf_run.name, "Docker")
+        self.assertIsNotNone(event.processed_at)
+
+    def test_changed_events_are_processed_again(self):
+        process_webhook_event_instance(WebhookEvent.objects.get(id=1))
+        process_webhook_event_instance(WebhookEvent.objects.get(id=2))
+        self.assertEqual(
+            process_webhook_event_instance(WebhookEvent.objects.get(id=2)),
+            OperationResult.NOOP,
+        )
+
+        event = WebhookEvent.objects.get(id=2)
+        event.payload["workflow_job"]["runner_name"] = "another runner"
+        event.save()
+        result = process_webhook_event_instance(event)
+
+        self.assertEqual(result, OperationResult.SUCCESS)
+        self.assertEqual(Job.objects.get(id=30264097335).runner_name, "another runner")
 
     @freeze_time("2024-10-08")
     def test_process_workflow_job_event_before_wf_run(self):
@@ -59,6 +79,14 @@ class TestWebhookProcessor(TestCase):
         self.assertEqual(job.workflow_run.run_id, 10905389638)
         self.assertEqual(job.workflow_run.name, None)
         self.assertEqual(str(event.processed_at), "2024-10-08 00:00:00+00:00")
+        # The job waits for its run to save its stats
+        self.assertEqual(job.pending.workflow_run, job.workflow_run)
+        self.assertFalse(job.stats.exists())
+
+        result = process_webhook_event_instance(WebhookEvent.objects.get(id=1))
+        self.assertEqual(result, OperationResult.SUCCESS)
+        self.assertEqual(job.stats.get().workflow_name, "Docker")
+        self.assertFalse(PendingJob.objects.exists())
 
     def test_process_workflow_job_event_after_wf_run(self):
         event = WebhookEvent.objects.get(id=1)
@@ -110,3 +138,108 @@ class TestWebhookProcessor(TestCase):
         event.event = "workflow_jam"
         event.save()
         self.assertEqual(process_webhook_event_instance(event), OperationResult.NOOP)
+
+    def store_as_raw(self, event_id: int, compressed: bool = False) -> WebhookEvent:
+        event = WebhookEvent.objects.get(id=event_id)
+        body = json.dumps(event.payload).encode()
+        event.raw_payload = zlib.compress(body) if compressed else body
+        event.raw_payload_compressed = compressed
+        event.payload = None
+        event.installation = None
+        event.save()
+        return WebhookEvent.objects.get(id=event_id)
+
+    def test_process_raw_webhook_event(self):
+        event = self.store_as_raw(1)
+        self.assertFalse(event.is_payload_parsed)
+        result = process_webhook_event_instance(event)
+        self.assertEqual(result, OperationResult.SUCCESS)
+        self.assertTrue(WorkflowRun.objects.filter(run_id=10905389638).exists())
+        event.refresh_from_db()
+        self.assertIsNotNone(event.installation)
+        self.assertIsNone(event.payload)
+
+    def test_process_compressed_webhook_event(self):
+        event = self.store_as_raw(2, compressed=True)
+        result = process_webhook_event_instance(event)
+        self.assertEqual(result, OperationResult.SUCCESS)
+        self.assertTrue(Job.objects.filter(id=30264097335).exists())
+
+    def test_process_invalid_raw_webhook_event(self):
+        event = self.store_as_raw(1)
+        event.raw_payload = b"not json"
+        event.save()
+        result = process_webhook_event_instance(event)
+        self.assertEqual(result, OperationResult.FAILURE)
+        self.assertTrue(WebhookEvent.objects.filter(id=1).exists())
+
+
+class TestWebhookProcessorQueryBudget(TestCase):
+    """
+    Queries taken to process a single event, including reading it. Lower the
+    budget when a change saves queries, and don't raise it without a reason.
+    """
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    # Events first look up the fingerprint of their run or job. Runs look up their
+    # jobs that are pending or missing stats, and delete the pending ones
+    RUN_EVENT_BUDGET = 18
+    RUN_EVENT_WITH_STORED_JOB_BUDGET = 20
+    # Completed jobs also intern their step names, upsert their steps and delete
+    # the ones they no longer have. Step names aren't cached in tests. Jobs are
+    # written in a transaction, a savepoint in tests.
+    JOB_EVENT_BUDGET = 20
+    JOB_EVENT_BEFORE_RUN_BUDGET = 24
+    # Unchanged events are only marked as processed
+    REPROCESSED_RUN_EVENT_BUDGET = 5
+    REPROCESSED_JOB_EVENT_BUDGET = 4
+
+    def setUp(self):
+        WorkflowRun.objects.all().delete()
+        # Heartbeats written by the process when due are not part of the budget
+        LOCAL_HEARTBEATS.pop_all()
+        # Installations are resolved once per installation, outside of the budget
+        for event in WebhookEvent.objects.all():
+            event.associate_installation()
+            event.save(update_fields=["installation"])
+
+    def process(
+        self,
+        event_id: int,
+        budget: int | None = None,
+        expected: OperationResult = OperationResult.SUCCESS,
+    ):
+        if budget is None:
+            process_webhook_event_instance(WebhookEvent.objects.get(id=event_id))
+            return
+        with self.assertNumQueries(budget):
+            result = process_webhook_event_instance(
+                WebhookEvent.objects.get(id=event_id)
+            )
+        self.assertEqual(result, expected)
+
+    def test_run_event(self):
+        self.process(1, self.RUN_EVENT_BUDGET)
+
+    def test_run_event_with_stored_job(self):
+        self.process(2)
+        self.process(1, self.RUN_EVENT_WITH_STORED_JOB_BUDGET)
+        self.assertTrue(Job.objects.get(id=30264097335).stats.exists())
+
+    def test_job_event(self):
+        self.process(1)
+        self.process(2, self.JOB_EVENT_BUDGET)
+        self.assertTrue(Job.objects.get(id=30264097335).stats.exists())
+
+    def test_job_event_before_run(self):
+        self.process(2, self.JOB_EVENT_BEFORE_RUN_BUDGET)
+
+    def test_reprocessed_events(self):
+        self.process(1)
+        self.process(2)
+        self.process(1, self.REPROCESSED_RUN_EVENT_BUDGET, OperationResult.NOOP)
+        self.process(2, self.REPROCESSED_JOB_EVENT_BUDGET, OperationResult.NOOP)
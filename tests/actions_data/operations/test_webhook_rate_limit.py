@@ -0,0 +1,120 @@
+import json
+from unittest.mock import patch
+
+import redis
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+from freezegun import freeze_time
+
+from actions_data.metrics import WEBHOOK_RATE_LIMITED, flush_metrics
+from actions_data.models import WebhookEvent
+from actions_data.models.installation import INSTALLATION_CACHE
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_buffer import LOCAL_OVERFLOW_STORE
+from actions_data.operations.webhook_ingestion import ingest_webhook
+from actions_data.operations.webhook_rate_limit import LOCAL_BUCKETS, take_token
+from actions_data.tasks import drain_webhook_overflow
+
+
+@override_settings(
+    WEBHOOK_RATE_LIMIT="reject",
+    WEBHOOK_RATE_LIMIT_BACKEND="local",
+    WEBHOOK_RATE_LIMIT_RATE=1,
+    WEBHOOK_RATE_LIMIT_BURST=2,
+)
+@patch("actions_data.operations.webhook_buffer.process_webhook_events")
+@patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+class WebhookRateLimitTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        # Installations cached by committed callbacks are rolled back with the test
+        self.addCleanup(INSTALLATION_CACHE.entries.clear)
+        flush_metrics()
+        cache.clear()
+        LOCAL_BUCKETS.clear()
+        LOCAL_OVERFLOW_STORE.clear()
+        with open("tests/resources/sample_webhook_payload.json", "rb") as f:
+            self.body = f.read()
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+
+    def ingest(self, delivery: str, target_id: str = "1") -> OperationResult:
+        headers = CaseInsensitiveMapping(
+            self.headers
+            | {
+                "X-GitHub-Delivery": delivery,
+                "X-GitHub-Hook-Installation-Target-ID": target_id,
+            }
+        )
+        return ingest_webhook(self.body, headers, user_id=2)
+
+    def test_bucket_is_refilled_over_time(self, mock_task, mock_batch_task):
+        with freeze_time("2024-01-01 00:00:00") as frozen_time:
+            self.assertEqual(
+                [take_token("github.com", "1") for _ in range(3)], [True, True, False]
+            )
+            frozen_time.tick(1.5)
+            self.assertEqual(
+                [take_token("github.com", "1") for _ in range(2)], [True, False]
+            )
+
+    def test_deliveries_over_the_limit_are_rejected(self, mock_task, mock_batch_task):
+        with self.assertLogs(
+            "actions_data.operations.webhook_ingestion", "INFO"
+        ) as logs:
+            results = [self.ingest(f"delivery-{i}") for i in range(3)]
+        self.assertEqual(
+            results,
+            [OperationResult.SUCCESS, OperationResult.SUCCESS, OperationResult.FAILURE],
+        )
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_RATE_LIMITED.samples(), {("github.com", "rejected"): 1}
+        )
+        self.assertIn("rate limit of github.com:1 rejected", logs.output[-1])
+
+        # Other installation targets have their own bucket
+        self.assertEqual(self.ingest("other", target_id="2"), OperationResult.SUCCESS)
+
+    @override_settings(WEBHOOK_RATE_LIMIT="shed")
+    def test_deliveries_over_the_limit_are_shed(self, mock_task, mock_batch_task):
+        results = [self.ingest(f"delivery-{i}") for i in range(4)]
+        self.assertEqual(results[2:], [OperationResult.IN_PROGRESS] * 2)
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+        self.assertEqual(LOCAL_OVERFLOW_STORE.length(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            drain_webhook_overflow()
+        self.assertEqual(WebhookEvent.objects.count(), 4)
+        self.assertEqual(LOCAL_OVERFLOW_STORE.length(), 0)
+        shed_ids = set(
+            WebhookEvent.objects.filter(
+                delivery__in=["delivery-2", "delivery-3"]
+            ).values_list("id", flat=True)
+        )
+        self.assertEqual(
+            set(mock_batch_task.apply_async.call_args.args[0][0]), shed_ids
+        )
+
+    @override_settings(WEBHOOK_RATE_LIMIT_BACKEND="redis")
+    @patch("actions_data.operations.webhook_rate_limit.get_redis_buckets")
+    def test_local_buckets_are_used_when_redis_fails(
+        self, mock_buckets, mock_task, mock_batch_task
+    ):
+        mock_buckets.return_value.take.side_effect = redis.ConnectionError()
+        results = [self.ingest(f"delivery-{i}") for i in range(3)]
+        self.assertEqual(results[-1], OperationResult.FAILURE)
+
+    def test_rejected_deliveries_get_a_503(self, mock_task, mock_batch_task):
+        for i in range(3):
+            response = self.client.post(
+                "/webhook?user=2",
+                data=self.body,
+                content_type="application/json",
+                headers=self.headers | {"X-GitHub-Delivery": f"delivery-{i}"},
+            )
+        self.assertEqual(response.status_code, 503)
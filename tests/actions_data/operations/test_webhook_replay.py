@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from freezegun import freeze_time
+
+from actions_data.models import (
+    Job,
+    JobStats,
+    JobStatsLabel,
+    PendingJob,
+    WebhookEvent,
+    WorkflowRun,
+)
+from actions_data.models.job import get_started_at
+from actions_data.operations.webhook_batch_processor import (
+    process_webhook_event_batch,
+)
+from actions_data.operations.webhook_replay import WebhookEventReplay
+
+
+def shadow_tables() -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE tablename LIKE '%%_replay'"
+        )
+        return [table for (table,) in cursor.fetchall()]
+
+
+@freeze_time("2024-10-08")
+class WebhookEventReplayTest(TestCase):
+
+    fixtures = [
+        "tests/fixtures/webhook_events.yaml",
+        "tests/fixtures/authusers.yaml",
+    ]
+
+    def setUp(self):
+        WorkflowRun.objects.all().delete()
+        process_webhook_event_batch(list(WebhookEvent.objects.order_by("id")))
+        self.payload = WebhookEvent.objects.get(id=2).parsed_payload["workflow_job"]
+        self.job = Job.objects.get(id=self.payload["id"])
+        self.stats = JobStats.objects.get(job=self.job)
+
+    def test_rebuilds_the_derived_tables(self):
+        """
+        Test that the rows written by the events are written again, keeping their ids
+        """
+        run_ids = dict(WorkflowRun.objects.values_list("run_id", "id"))
+        Job.objects.update(started_at=self.job.started_at - timedelta(hours=1))
+        JobStats.objects.update(job_name="stale")
+        JobStatsLabel.objects.all().delete()
+
+        WebhookEventReplay().run()
+
+        self.assertEqual(dict(WorkflowRun.objects.values_list("run_id", "id")), run_ids)
+        job = Job.objects.get(id=self.job.id)
+        self.assertEqual(job.started_at, get_started_at(self.payload))
+        self.assertEqual(job.workflow_run_id, self.job.workflow_run_id)
+        stats = JobStats.objects.get(job=job)
+        self.assertEqual(stats.id, self.stats.id)
+        self.assertEqual(stats.job_name, job.name)
+        self.assertEqual(
+            set(stats.labels.values_list("label", flat=True)), set(job.labels)
+        )
+        self.assertEqual(shadow_tables(), [])
+
+    def test_carries_over_the_rows_without_events(self):
+        """
+        Test that rows whose events are gone are kept, along with the rows that
+        reference them
+        """
+        jobs = Job.objects.count()
+        run = WorkflowRun.objects.create(
+            run_id=1, run_attempt=1, repository_id=self.stats.repository_id
+        )
+        job = Job.objects.create(
+            id=1,
+            workflow_run=run,
+            name="build",
+            status="completed",
+            conclusion="success",
+            created_at=self.job.created_at,
+        )
+        PendingJob.objects.create(job=job, workflow_run=run)
+
+        WebhookEventReplay().run()
+
+        self.assertTrue(WorkflowRun.objects.filter(id=run.id, run_id=1).exists())
+        self.assertEqual(PendingJob.objects.get().job, job)
+        self.assertEqual(Job.objects.count(), jobs + 1)
+
+    def test_replays_events_received_during_the_replay(self):
+        """
+        Test that runs written by the live processing in the meantime keep their ids
+        """
+        replay = WebhookEventReplay()
+        replay.create_shadow_tables()
+        replay.replay_events(None, after=0, until=None)
+        WorkflowRun.objects.all().delete()
+        process_webhook_event_batch(list(WebhookEvent.objects.order_by("id")))
+        run_ids = set(WorkflowRun.objects.values_list("id", flat=True))
+        job_run_id = Job.objects.get(id=self.job.id).workflow_run_id
+
+        replay.create_deferred_indexes()
+        replay.swap(after=WebhookEvent.objects.order_by("id").last().id)
+
+        self.assertEqual(set(WorkflowRun.objects.values_list("id", flat=True)), run_ids)
+        self.assertEqual(Job.objects.get(id=self.job.id).workflow_run_id, job_run_id)
+
+    def test_dry_run_leaves_the_tables_as_they_are(self):
+        """
+        Test that a dry run only counts the rows of the live and shadow tables
+        """
+        Job.objects.update(name="stale")
+
+        counts = WebhookEventReplay().run(dry_run=True)
+
+        self.assertEqual(set(Job.objects.values_list("name", flat=True)), {"stale"})
+        self.assertEqual(counts[Job._meta.db_table], (Job.objects.count(),) * 2)
+        self.assertEqual(
+            counts[WorkflowRun._meta.db_table], (WorkflowRun.objects.count(),) * 2
+        )
+        self.assertEqual(shadow_tables(), [])
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+
+from actions_data.metrics import WEBHOOK_EVENTS_DEAD_LETTERED, flush_metrics
+from actions_data.models import WebhookEvent
+from actions_data.operations.schemas import OperationResult
+from actions_data.operations.webhook_retry import (
+    backoff_delay,
+    record_failed_attempts,
+    replay_dead_letters,
+)
+from actions_data.tasks import process_webhook_event, process_webhook_events
+
+NOW = datetime(2024, 10, 8, tzinfo=timezone.utc)
+
+
+@freeze_time(NOW)
+@override_settings(
+    WEBHOOK_MAX_ATTEMPTS=3, WEBHOOK_RETRY_BASE_DELAY=10, WEBHOOK_RETRY_MAX_DELAY=15
+)
+class WebhookRetryTest(TestCase):
+
+    fixtures = ["tests/fixtures/webhook_events.yaml"]
+
+    def setUp(self):
+        flush_metrics()
+        cache.clear()
+
+    def test_backoff_doubles_up_to_the_max_delay(self):
+        self.assertEqual([backoff_delay(n) for n in (1, 2, 3)], [10, 15, 15])
+
+    def test_events_are_dead_lettered_after_the_last_attempt(self):
+        event = WebhookEvent.objects.get(id=1)
+        event.last_error = "KeyError('repository')"
+        self.assertEqual(record_failed_attempts([event]), {1: 10})
+        self.assertEqual(record_failed_attempts([event]), {1: 15})
+        stored = WebhookEvent.objects.get(id=1)
+        self.assertEqual(stored.attempts, 2)
+        self.assertEqual(stored.next_attempt_at, NOW + timedelta(seconds=15))
+        self.assertEqual(stored.last_error, "KeyError('repository')")
+
+        with self.assertLogs("celery", "ERROR"):
+            self.assertEqual(record_failed_attempts([event]), {})
+        stored = WebhookEvent.objects.get(id=1)
+        self.assertEqual(stored.dead_lettered_at, NOW)
+        self.assertIsNone(stored.next_attempt_at)
+        flush_metrics()
+        self.assertEqual(WEBHOOK_EVENTS_DEAD_LETTERED.value(event="workflow_run"), 1)
+
+        self.assertEqual(replay_dead_letters(WebhookEvent.objects.all()), [1])
+        stored = WebhookEvent.objects.get(id=1)
+        self.assertEqual(stored.attempts, 0)
+        self.assertIsNone(stored.dead_lettered_at)
+
+    @patch("actions_data.tasks.process_webhook_events.apply_async")
+    @patch("actions_data.tasks.process_webhook_event_instance")
+    def test_failed_events_are_retried_with_a_countdown(self, mock_process, mock_retry):
+        mock_process.return_value = OperationResult.FAILURE
+        process_webhook_event(event_id=1)
+        mock_retry.assert_called_once_with(([1],), countdown=10, queue=None)
+        self.assertEqual(WebhookEvent.objects.get(id=1).attempts, 1)
+
+        mock_process.return_value = OperationResult.SUCCESS
+        process_webhook_event(event_id=2)
+        mock_retry.assert_called_once()
+
+    @override_settings(WEBHOOK_PAYLOAD_PROJECTION=True)
+    @patch("actions_data.tasks.process_webhook_events.apply_async")
+    @patch.object(WebhookEvent, "compact", side_effect=OSError("Compaction failed"))
+    def test_events_failing_to_be_prepared_are_retried(self, mock_compact, mock_retry):
+        with self.assertLogs("celery", "ERROR"):
+            process_webhook_event(event_id=1)
+        mock_retry.assert_called_once_with(([1],), countdown=10, queue=None)
+        event = WebhookEvent.objects.get(id=1)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, "OSError('Compaction failed')")
+        self.assertIsNone(event.processed_at)
+
+    @patch("actions_data.tasks.process_webhook_events.apply_async")
+    @patch("actions_data.tasks.process_webhook_event_batch")
+    def test_failed_batch_events_are_retried_by_delay(self, mock_process, mock_retry):
+        WebhookEvent.objects.filter(id=2).update(attempts=1)
+        mock_process.return_value = {
+            1: OperationResult.FAILURE,
+            2: OperationResult.FAILURE,
+            3: OperationResult.SUCCESS,
+        }
+        process_webhook_events([1, 2, 3])
+        self.assertEqual(
+            sorted(call.kwargs["countdown"] for call in mock_retry.call_args_list),
+            [10, 15],
+        )
+        self.assertEqual(
+            sorted(call.args[0][0] for call in mock_retry.call_args_list), [[1], [2]]
+        )
+
+    @override_settings(WEBHOOK_QUEUES=4)
+    @patch("actions_data.tasks.process_webhook_events.apply_async")
+    @patch("actions_data.tasks.process_webhook_event_batch")
+    def test_retries_keep_the_queue_of_their_repository(self, mock_process, mock_retry):
+        mock_process.return_value = {
+            1: OperationResult.FAILURE,
+            2: OperationResult.FAILURE,
+        }
+        process_webhook_events([1, 2])
+        mock_retry.assert_called_once_with(([1, 2],), countdown=10, queue="webhooks.3")
@@ -0,0 +1,82 @@
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils.datastructures import CaseInsensitiveMapping
+
+from actions_data.models.installation import INSTALLATION_CACHE
+from actions_data.operations.webhook_buffer import LOCAL_STORE
+from actions_data.operations.webhook_ingestion import ingest_webhook
+from actions_data.operations.webhook_routing import (
+    repository_id_from_body,
+    webhook_queue,
+)
+
+
+class WebhookRoutingTest(TestCase):
+
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        # Installations cached by committed callbacks are rolled back with the test
+        self.addCleanup(INSTALLATION_CACHE.entries.clear)
+        LOCAL_STORE.clear()
+        with open("tests/resources/sample_webhook_payload.json", "rb") as f:
+            self.run_body = f.read()
+        with open("tests/resources/sample_job_webhook_payload.json", "rb") as f:
+            self.job_body = f.read()
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+
+    def ingest(self, body: bytes, delivery: str):
+        headers = CaseInsensitiveMapping(self.headers | {"X-GitHub-Delivery": delivery})
+        return ingest_webhook(body, headers, user_id=2)
+
+    def test_repository_id_is_read_from_the_body(self):
+        for body in (self.run_body, self.job_body):
+            self.assertEqual(
+                repository_id_from_body(body), json.loads(body)["repository"]["id"]
+            )
+        self.assertEqual(
+            repository_id_from_body(b'{"head_repository": {"id": 1}}'), None
+        )
+
+    @override_settings(WEBHOOK_QUEUES=4)
+    def test_repositories_are_routed_to_the_same_queue(self):
+        self.assertEqual(webhook_queue(852842159), "webhooks.3")
+        self.assertEqual(webhook_queue(852842163), "webhooks.3")
+        self.assertEqual(webhook_queue(852842160), "webhooks.0")
+        self.assertIsNone(webhook_queue(None))
+
+    def test_single_queue_is_the_default_queue(self):
+        self.assertIsNone(webhook_queue(852842159))
+
+    @override_settings(WEBHOOK_QUEUES=4, WEBHOOK_INGESTION_MODE="direct")
+    @patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+    def test_events_are_published_to_the_queue_of_their_repository(self, mock_task):
+        self.ingest(self.job_body, "job")
+        self.assertEqual(
+            mock_task.apply_async.call_args.kwargs, {"queue": "webhooks.3"}
+        )
+
+    @override_settings(
+        WEBHOOK_QUEUES=4,
+        WEBHOOK_INGESTION_MODE="buffered",
+        WEBHOOK_BUFFER_BACKEND="local",
+        WEBHOOK_BUFFER_FLUSH_SIZE=3,
+    )
+    @patch("actions_data.operations.webhook_buffer.process_webhook_events")
+    def test_batches_are_split_by_queue(self, mock_task):
+        other_body = self.run_body.replace(b"852842159", b"852842160")
+        with self.captureOnCommitCallbacks(execute=True):
+            for delivery, body in [
+                ("run", self.run_body),
+                ("other", other_body),
+                ("job", self.job_body),
+            ]:
+                self.ingest(body, delivery)
+        batches = {
+            call.kwargs["queue"]: len(call.args[0][0])
+            for call in mock_task.apply_async.call_args_list
+        }
+        self.assertEqual(batches, {"webhooks.3": 2, "webhooks.0": 1})
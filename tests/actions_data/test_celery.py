@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from celery import Celery
+from django.db import connection
+from django.test import SimpleTestCase
+
+from actions_data.celery import WORKER_PROFILES, apply_worker_profile, app
+
+
+def routed_queue(task_name: str) -> str:
+    return app.amqp.router.route({}, task_name)["queue"].name
+
+
+class CeleryRoutingTest(SimpleTestCase):
+
+    def test_tasks_are_routed_to_their_queues(self):
+        self.assertEqual(
+            routed_queue("actions_data.tasks.process_webhook_event"), "webhooks"
+        )
+        self.assertEqual(
+            routed_queue("actions_data.tasks.process_organization_data"), "demo"
+        )
+        self.assertEqual(
+            routed_queue("actions_data.tasks.maintain_webhook_partitions"), "celery"
+        )
+
+    def test_workers_consume_every_queue_by_default(self):
+        self.assertEqual(
+            set(app.amqp.queues.consume_from), {"celery", "webhooks", "demo"}
+        )
+
+
+class WorkerProfileTest(SimpleTestCase):
+
+    def setUp(self):
+        worker_app = Celery(set_as_current=False)
+        worker_app.conf.task_queues = app.conf.task_queues
+        self.instance = SimpleNamespace(app=worker_app)
+        self.health_checks = connection.settings_dict["CONN_HEALTH_CHECKS"]
+
+    def tearDown(self):
+        connection.settings_dict["CONN_HEALTH_CHECKS"] = self.health_checks
+
+    def consumed_queues(self) -> set[str]:
+        return set(self.instance.app.amqp.queues.consume_from)
+
+    def test_webhooks_profile(self):
+        conf = {}
+        apply_worker_profile(
+            instance=self.instance, conf=conf, options={"profile": "webhooks"}
+        )
+
+        self.assertEqual(self.consumed_queues(), {"webhooks"})
+        self.assertIsNone(conf["worker_max_tasks_per_child"])
+        self.assertEqual(
+            conf["worker_concurrency"],
+            WORKER_PROFILES["webhooks"]["worker_concurrency"],
+        )
+        self.assertTrue(connection.settings_dict["CONN_HEALTH_CHECKS"])
+
+    def test_demo_profile(self):
+        conf = {}
+        apply_worker_profile(
+            instance=self.instance, conf=conf, options={"profile": "demo"}
+        )
+
+        self.assertEqual(self.consumed_queues(), {"demo", "celery"})
+        self.assertEqual(conf["worker_max_tasks_per_child"], 3)
+        self.assertEqual(conf["worker_prefetch_multiplier"], 1)
+
+    def test_queues_given_on_the_command_line_are_kept(self):
+        conf = {}
+        apply_worker_profile(
+            instance=self.instance,
+            conf=conf,
+            options={"profile": "webhooks", "queues": ["webhooks.0"]},
+        )
+
+        self.assertEqual(self.consumed_queues(), {"celery", "webhooks", "demo"})
+        self.assertIsNone(conf["worker_max_tasks_per_child"])
+
+    def test_without_profile(self):
+        conf = {}
+        apply_worker_profile(instance=self.instance, conf=conf, options={})
+
+        self.assertEqual(conf, {})
+        self.assertEqual(self.consumed_queues(), {"celery", "webhooks", "demo"})
@@ -0,0 +1,192 @@
+import json
+import threading
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.test import TestCase, override_settings
+
+from actions_data.metrics import (
+    Counter,
+    Histogram,
+    WEBHOOK_EVENTS_PROCESSED,
+    WEBHOOK_EVENT_PROCESSING_DURATION,
+    WEBHOOK_INGESTION_DURATION,
+    flush_metrics,
+    render_metrics,
+)
+from actions_data.operations.webhook_processor import process_webhook_event_instance
+from actions_data.models import WebhookEvent
+
+
+class MetricsTest(TestCase):
+
+    fixtures = ["tests/fixtures/webhook_events.yaml"]
+
+    def setUp(self):
+        flush_metrics()
+        cache.clear()
+
+    def test_histogram_observations_are_flushed_to_the_cache(self):
+        histogram = Histogram("test_seconds", "Test", ("stage",), buckets=(0.1, 1))
+        histogram.observe(0.05, stage="parse")
+        histogram.observe(0.5, stage="parse")
+        histogram.observe(5, stage="parse")
+        self.assertEqual(histogram.samples(), {})
+
+        histogram.flush()
+        self.assertEqual(
+            histogram.samples(),
+            {("parse",): ([("0.1", 1), ("1", 2), ("+Inf", 3)], 5.55, 3)},
+        )
+
+    def test_counter_increments_are_flushed_to_the_cache(self):
+        counter = Counter("test_total", "Test", ("stage",))
+        counter.inc(stage="parse")
+        counter.inc(2, stage="parse")
+        self.assertEqual(counter.samples(), {})
+
+        counter.flush()
+        self.assertEqual(counter.samples(), {("parse",): 3})
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_counter_is_flushed_every_interval(self):
+        counter = Counter("test_total", "Test")
+        counter.inc()
+        self.assertEqual(counter.value(), 1)
+
+    def test_labels_added_concurrently_are_all_listed(self):
+        counter = Counter("test_total", "Test", ("worker",))
+
+        def inc_and_flush(worker):
+            counter.inc(worker=worker)
+            counter.flush()
+
+        threads = [
+            threading.Thread(target=inc_and_flush, args=(worker,))
+            for worker in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.samples(), {(str(worker),): 1 for worker in range(8)})
+
+    def test_labels_are_indexed_in_a_redis_set(self):
+        backend = RedisCache("redis://localhost:6379", {})
+        counter = Counter("test_total", "Test", ("stage",))
+        key = backend.make_and_validate_key("metrics:test_total:parse\\:json")
+        with (
+            patch("actions_data.metrics.caches", {"default": backend}),
+            patch("actions_data.metrics.cache", backend),
+            patch("actions_data.metrics.get_redis_connection") as mock_connection,
+        ):
+            counter.inc(stage="parse:json")
+            counter.inc(stage="parse:json")
+            counter.flush()
+            pipeline = mock_connection.return_value.pipeline.return_value
+            pipeline.incrby.assert_called_once_with(key, 2)
+            pipeline.sadd.assert_called_once_with(
+                backend.make_and_validate_key("metrics:test_total:label_set"),
+                '["parse:json"]',
+            )
+            pipeline.execute.assert_called_once_with()
+
+            mock_connection.return_value.smembers.return_value = {b'["parse:json"]'}
+            with patch.object(
+                backend,
+                "get_many",
+                return_value={"metrics:test_total:parse\\:json": 2},
+            ):
+                self.assertEqual(counter.samples(), {("parse:json",): 2})
+
+    def test_label_values_containing_the_separator_dont_collide(self):
+        counter = Counter("test_total", "Test", ("event", "action"))
+        counter.inc(event="a:b", action="c")
+        counter.inc(2, event="a", action="b:c")
+        counter.flush()
+        self.assertEqual(counter.samples(), {("a:b", "c"): 1, ("a", "b:c"): 2})
+        self.assertEqual(counter.value(event="a", action="b:c"), 2)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_histogram_is_flushed_every_interval(self):
+        histogram = Histogram("test_seconds", "Test")
+        histogram.observe(0.2)
+        self.assertEqual(histogram.samples()[()][2], 1)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    async def test_async_metrics_are_flushed_outside_the_event_loop(self):
+        counter = Counter("test_total", "Test")
+        histogram = Histogram("test_seconds", "Test")
+        flush_threads = []
+
+        def record_flush_thread():
+            flush_threads.append(threading.get_ident())
+
+        with (
+            patch.object(counter, "flush", side_effect=record_flush_thread),
+            patch.object(histogram, "flush", side_effect=record_flush_thread),
+        ):
+            await counter.ainc()
+            async with histogram.atime():
+                pass
+        self.assertEqual(len(flush_threads), 2)
+        self.assertNotIn(threading.get_ident(), flush_threads)
+
+    def test_processing_is_measured(self):
+        process_webhook_event_instance(WebhookEvent.objects.get(id=1))
+        process_webhook_event_instance(WebhookEvent.objects.get(id=4))
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_EVENTS_PROCESSED.samples(),
+            {("workflow_run", "success"): 1, ("workflow_job", "success"): 1},
+        )
+        samples = WEBHOOK_EVENT_PROCESSING_DURATION.samples()
+        self.assertEqual(samples[("workflow_run",)][2], 1)
+        self.assertEqual(samples[("workflow_job",)][2], 1)
+
+    @patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+    def test_ingestion_stages_are_measured(self, mock_task):
+        with open("tests/resources/sample_webhook_payload.json") as f:
+            body = f.read()
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            headers = json.load(f)
+        self.client.post(
+            "/webhook",
+            data=body,
+            content_type="application/json",
+            headers=headers | {"X-GitHub-Delivery": "measured"},
+        )
+        flush_metrics()
+        samples = WEBHOOK_INGESTION_DURATION.samples()
+        self.assertEqual(set(samples), {("parse",), ("insert",), ("enqueue",)})
+
+    def test_render_metrics(self):
+        WEBHOOK_EVENTS_PROCESSED.inc(event='a"b', result="success")
+        metrics = render_metrics()
+        self.assertIn("# TYPE webhook_events_processed_total counter", metrics)
+        self.assertIn(
+            'webhook_events_processed_total{event="a\\"b",result="success"} 1',
+            metrics,
+        )
+        self.assertIn("# TYPE webhook_events_backlog gauge", metrics)
+        self.assertIn(
+            f"webhook_events_backlog "
+            f"{WebhookEvent.objects.filter(processed_at__isnull=True).count()}",
+            metrics,
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_view_requires_the_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get(
+            "/metrics", headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            b"# TYPE webhook_ingestion_duration_seconds histogram", response.content
+        )
+
+    def test_metrics_view_is_disabled_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
@@ -0,0 +1,58 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+
+from actions_data.models import WebhookEvent
+from actions_data.models.webhook_event import close_webhook_writer_connections
+from actions_data.views import AsyncWebhookView
+
+
+@patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+class AsyncWebhookViewTest(TransactionTestCase):
+    # Events are written from other threads, which can't see a test transaction
+    fixtures = ["tests/fixtures/authusers.yaml"]
+
+    def setUp(self):
+        cache.clear()
+        with open("tests/resources/sample_webhook_payload.json") as f:
+            self.payload = json.load(f)
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            self.headers = json.load(f)
+        # Otherwise the test database can't be dropped
+        self.addCleanup(close_webhook_writer_connections)
+
+    async def post(self, delivery: str, payload: dict | None = None):
+        request = AsyncRequestFactory().post(
+            "/webhook?user=2",
+            data=json.dumps(payload or self.payload),
+            content_type="application/json",
+            headers=self.headers | {"X-GitHub-Delivery": delivery},
+        )
+        return await AsyncWebhookView.as_view()(request)
+
+    async def test_webhook_is_stored_and_published(self, mock_task):
+        response = await self.post("async-delivery")
+        self.assertEqual(response.status_code, 200)
+        event = await WebhookEvent.objects.aget(delivery="async-delivery")
+        self.assertEqual(event.payload, self.payload)
+        self.assertEqual(event.user_id, 2)
+        self.assertIsNotNone(event.installation_id)
+        mock_task.apply_async.assert_called_once_with((event.id,), queue=None)
+
+    async def test_redelivery_is_dropped(self, mock_task):
+        for _ in range(2):
+            response = await self.post("async-redelivery")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            await WebhookEvent.objects.filter(delivery="async-redelivery").acount(), 1
+        )
+        mock_task.apply_async.assert_called_once()
+
+    @override_settings(WEBHOOK_INGRESS_POLICY="drop")
+    async def test_ingress_policy_is_applied(self, mock_task):
+        response = await self.post("async-queued", self.payload | {"action": "queued"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await WebhookEvent.objects.aexists())
+        mock_task.apply_async.assert_not_called()
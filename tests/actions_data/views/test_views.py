@@ -1,4 +1,5 @@
 import json
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -6,6 +7,8 @@ from django.test import TestCase, Client
 from django.utils.http import urlencode
 from django.utils.timezone import now
 from social_django.models import UserSocialAuth
+
+from actions_data.metrics import WEBHOOK_DUPLICATE_DELIVERIES, flush_metrics
 from actions_data.models import (
     WebhookEvent,
     JobStats,
@@ -73,6 +76,32 @@ class TestViews(TestCase):
         user = User.objects.get(id=2)
         self.assertEqual(saved_webhook.user_id, 2)
 
+    @patch("actions_data.operations.webhook_ingestion.process_webhook_event")
+    def test_webhook_redelivery_is_dropped(self, mock_task):
+        with open("tests/resources/sample_webhook_payload.json") as f:
+            sample_webhook_payload = f.read()
+        with open("tests/resources/sample_webhook_headers.json") as f:
+            headers = json.load(f)
+        flush_metrics()
+        duplicates = WEBHOOK_DUPLICATE_DELIVERIES.value(event="workflow_run")
+
+        for _ in range(2):
+            response = self.client.post(
+                "/webhook?user=2",
+                data=sample_webhook_payload,
+                headers=headers,
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        delivery_header = headers.get("X-GitHub-Delivery")
+        saved_webhook = WebhookEvent.objects.get(delivery=delivery_header)
+        mock_task.apply_async.assert_called_once_with((saved_webhook.id,), queue=None)
+        flush_metrics()
+        self.assertEqual(
+            WEBHOOK_DUPLICATE_DELIVERIES.value(event="workflow_run"), duplicates + 1
+        )
+
     def test_stats_pages_unauthenticated(self):
         stats_urls = [
             "/stats/by-job/",
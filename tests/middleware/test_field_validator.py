@@ -2,6 +2,11 @@ from django.test import TestCase
 from django.db import models
 from django.db.models.signals import pre_save
 
+from actions_data.models import Job, WebhookEvent, WorkflowRun
+from actions_data.operations.webhook_processor import process_webhook_event_instance
+from actions_insider.middleware import validate_field_limits
+from actions_insider.middleware.field_validator import get_validation_plan
+
 
 # Test Model
 class ValidationModel(models.Model):
@@ -285,3 +290,27 @@ class FieldValidatorSignalTest(TestCase):
         error_msg = str(context.exception)
         self.assertIn("small_int", error_msg)  # Should mention integer overflow
         self.assertIn("short_text", error_msg)  # Should mention string length
+
+
+class ValidationPlanTest(TestCase):
+    fixtures = ["tests/fixtures/webhook_events.yaml", "tests/fixtures/authusers.yaml"]
+
+    def test_only_fields_with_limits_are_checked(self):
+        # 5 integer fields and 2 char fields, the id and the unlimited text aren't
+        self.assertEqual(len(get_validation_plan(ValidationModel).checks), 7)
+
+    def test_related_and_deferred_fields_are_not_loaded(self):
+        WorkflowRun.objects.all().delete()
+        process_webhook_event_instance(WebhookEvent.objects.get(id=2))
+        job = Job.objects.defer("name", "runner_name").get(id=30264097335)
+        with self.assertNumQueries(0):
+            validate_field_limits([job])
+
+    def test_bulk_instances_are_validated(self):
+        valid = ValidationModel(small_int=1, short_text="Hello")
+        invalid = ValidationModel(small_int=1, short_text="Too long")
+        validate_field_limits([valid, valid])
+        validate_field_limits([])
+        with self.assertRaises(ValueError) as context:
+            validate_field_limits([valid, invalid])
+        self.assertIn("short_text", str(context.exception))